@@ -0,0 +1,86 @@
+"""
+Batch endpoints for answering files of questions offline
+"""
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+import json
+
+from app.config import settings
+from app.services.batch_service import BatchFormatError, batch_id_for, batch_processor, parse_batch
+from app.utils.logger import logger
+
+router = APIRouter(prefix="/api/v1/batch", tags=["batch"])
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def _stream_batch(batch_id: str, text: str, fmt: Optional[str]) -> StreamingResponse:
+    try:
+        rows = parse_batch(text, fmt)
+    except BatchFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not rows:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(rows) > settings.BATCH_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.BATCH_MAX_ROWS} rows")
+
+    batch_processor.save_input(batch_id, text, fmt or "")
+    logger.info(f"Batch {batch_id}: {len(rows)} rows")
+
+    async def results() -> AsyncIterator[str]:
+        counts = {"ok": 0, "rejected": 0, "degraded": 0, "error": 0, "resumed": 0}
+        async for result in batch_processor.run(rows, batch_processor.results_path(batch_id)):
+            counts["resumed" if result.get("resumed") else result["status"]] += 1
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+        yield json.dumps({"batch_id": batch_id, "done": True, "total": len(rows), **counts}) + "\n"
+
+    return StreamingResponse(results(), media_type=NDJSON_MEDIA_TYPE, headers={"X-Batch-Id": batch_id})
+
+
+@router.post("")
+async def submit_batch(request: Request, format: Optional[str] = None):
+    """
+    Answer a batch of questions, streaming one NDJSON result per row
+
+    The body is NDJSON (one object per line) or CSV with a header row; each
+    row needs a message (or question) and may set id, language,
+    literacy_level, location and channel. Re-submitting the same file, or
+    calling /{batch_id}/resume, skips rows that already finished.
+    """
+    text = (await request.body()).decode("utf-8", errors="replace")
+    if not format and "csv" in request.headers.get("content-type", ""):
+        format = "csv"
+    return await _stream_batch(batch_id_for(text), text, format)
+
+
+@router.post("/{batch_id}/resume")
+async def resume_batch(batch_id: str):
+    """Continue a stored batch, streaming finished rows first and then the rest"""
+    stored = batch_processor.load_input(batch_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return await _stream_batch(batch_id, stored["text"], stored["format"] or None)
+
+
+@router.get("/{batch_id}")
+async def get_batch_progress(batch_id: str):
+    """Completed and total rows for a batch"""
+    progress = batch_processor.progress(batch_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return progress
+
+
+@router.get("/{batch_id}/results")
+async def get_batch_results(batch_id: str):
+    """Download the finished rows of a batch as NDJSON"""
+    path = batch_processor.results_path(batch_id)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    def lines():
+        with open(path, encoding="utf-8") as f:
+            yield from f
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
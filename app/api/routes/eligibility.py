@@ -0,0 +1,33 @@
+"""
+Eligibility endpoints, answered from the compiled eligibility rules
+"""
+from fastapi import APIRouter, HTTPException
+
+from app.services.action_planner import action_planner
+from app.services.eligibility_engine import eligibility_engine
+from app.utils.validation import EligibilityRequest
+
+router = APIRouter(prefix="/api/v1/eligibility", tags=["eligibility"])
+
+# Request fields that are not user attributes
+REQUEST_FIELDS = {"domain", "scheme", "language", "explain"}
+
+
+@router.post("")
+async def check_eligibility(request: EligibilityRequest):
+    """
+    Which schemes is the user likely eligible for
+
+    Returns the eligible schemes, the schemes that need more information
+    and the questions that would settle them. With scheme set, checks that
+    one scheme instead, and with explain set the LLM words the result.
+    """
+    attributes = request.dict(exclude=REQUEST_FIELDS, exclude_none=True)
+    if request.scheme:
+        result = await action_planner.get_eligibility_check(
+            request.scheme, attributes, request.language, explain=request.explain
+        )
+        if result["status"] == "unknown":
+            raise HTTPException(status_code=404, detail="Scheme not found")
+        return result
+    return eligibility_engine.eligible_schemes(attributes, request.domain)
@@ -3,6 +3,23 @@ from datetime import datetime
 import psutil
 import os
 
+from app.services.ai_service import ai_service
+from app.services.cache_service import response_cache
+from app.services.message_pipeline import message_pipeline
+from app.services.intent_classifier import intent_classifier
+from app.services.conversation_memory import conversation_memory
+from app.services.prompt_registry import prompt_registry
+from app.services.model_router import model_router
+from app.services.llm_metrics import llm_metrics
+from app.services.batch_service import batch_processor
+from app.services.scheme_library import scheme_library
+from app.services.faq_service import faq_service
+from app.services.degraded_mode import degraded_mode
+from app.services.retrieval_service import knowledge_retriever
+from app.services.vector_index import vector_index
+from app.services.eligibility_engine import eligibility_engine
+from app.utils.llm_json import llm_output_parser
+
 router = APIRouter(tags=["health"])
 
 @router.get("/health")
@@ -41,7 +58,21 @@ async def get_metrics():
                 "used_gb": disk.used / (1024 * 1024 * 1024),
                 "free_gb": disk.free / (1024 * 1024 * 1024),
                 "percent_used": disk.percent
-            }
+            },
+            "ai_service": ai_service.get_stats(),
+            "cache": response_cache.get_stats(),
+            "pipeline": message_pipeline.get_stats(),
+            "intent_classifier": intent_classifier.get_stats(),
+            "conversation_memory": conversation_memory.get_stats(),
+            "prompts": prompt_registry.get_stats(),
+            "model_routing": model_router.get_stats(),
+            "batch": batch_processor.get_stats(),
+            "scheme_library": scheme_library.get_stats(),
+            "faq": faq_service.get_stats(),
+            "degraded_mode": degraded_mode.get_stats(),
+            "retrieval": knowledge_retriever.get_stats(),
+            "vector_index": vector_index.get_stats(),
+            "eligibility": eligibility_engine.get_stats()
         }
     except Exception as e:
         return {
@@ -49,6 +80,19 @@ async def get_metrics():
             "error": str(e)
         }
 
+@router.get("/metrics/llm")
+async def get_llm_metrics():
+    """
+    Get LLM usage metrics
+    Prompt/output tokens, latency percentiles and cache or classifier
+    avoidance per task, channel and language, plus JSON parse outcomes per task
+    """
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        **llm_metrics.get_stats(),
+        "parsing": llm_output_parser.get_stats()
+    }
+
 @router.get("/ready")
 async def readiness_check():
     """
@@ -63,8 +107,11 @@ async def readiness_check():
     
     all_ready = all(checks.values())
     
+    # A degraded instance stays ready: it keeps answering from the cache,
+    # FAQ store and knowledge base while the LLM is down
     return {
         "ready": all_ready,
+        "mode": degraded_mode.mode,
         "checks": checks,
         "timestamp": datetime.utcnow().isoformat()
     }
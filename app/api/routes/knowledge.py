@@ -0,0 +1,50 @@
+"""
+Knowledge search endpoints
+"""
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+
+from app.services import knowledge_catalog
+from app.services.retrieval_service import knowledge_retriever
+from app.services.vector_index import vector_index
+from app.utils.validation import sanitize_input
+
+router = APIRouter(prefix="/api/v1/knowledge", tags=["knowledge"])
+
+
+@router.get("/search")
+async def search_knowledge(
+    q: str = Query(..., min_length=1, max_length=500),
+    k: int = Query(5, ge=1, le=20),
+    mode: str = Query("hybrid", pattern="^(hybrid|dense)$")
+):
+    """
+    Knowledge passages most relevant to a query, best first
+
+    hybrid fuses BM25 and the dense vector index (the passages prompts are
+    grounded in); dense searches only the vector index, which also matches
+    queries written in Indic scripts.
+    """
+    query = sanitize_input(q)
+    if not query:
+        raise HTTPException(status_code=400, detail="Query is empty")
+
+    if mode == "dense":
+        passages = vector_index.search(query, k)
+    else:
+        passages = knowledge_retriever.search(query, k)
+    return {"query": query, "mode": mode, "passages": passages}
+
+
+@router.get("/catalog")
+async def search_catalog(
+    q: str = Query(..., min_length=1, max_length=500),
+    k: int = Query(10, ge=1, le=50),
+    domain: Optional[str] = None,
+    language: str = "en"
+):
+    """Full-text search over the ingested scheme catalog (the knowledge_base table)"""
+    query = sanitize_input(q)
+    if not query:
+        raise HTTPException(status_code=400, detail="Query is empty")
+    return {"query": query, "results": knowledge_catalog.search(query, k, domain, language)}
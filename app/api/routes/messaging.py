@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Optional, Tuple
 from datetime import datetime
+import json
 
-from app.database import get_db, User, Conversation, Message, ActionPlan
+from app.database import get_db, SessionLocal, User, Conversation, Message, ActionPlan
 from app.database import Channel, MessageRole
-from app.services.ai_service import ai_service
+from app.services.conversation_memory import conversation_memory
 from app.services.translation_service import translation_service
 from app.services.action_planner import action_planner
+from app.services.message_pipeline import message_pipeline
 from app.services.multimodal_service import multimodal_service
 from app.services.twilio_service import twilio_service
 from app.utils.encryption import encryption_service
@@ -16,6 +20,16 @@ from app.utils.logger import logger
 
 router = APIRouter(prefix="/api/v1/message", tags=["messaging"])
 
+# Headers that keep proxies from buffering Server-Sent Events
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
+
+def _sse_event(event: str, data) -> str:
+    """Format a Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @router.post("/sms")
 async def handle_sms(request: MessageRequest, db: Session = Depends(get_db)):
     """
@@ -63,35 +77,25 @@ async def handle_sms(request: MessageRequest, db: Session = Depends(get_db)):
             language=detected_language
         )
         
-        # Extract intent
-        intent_data = await ai_service.extract_intent(user_message, detected_language)
-        
-        # Generate AI response
+        # Understand the message and generate the AI response in one call
         user_context = {
             "location": f"{user.location_district}, {user.location_state}" if user.location_district else None,
+            "conversation_summary": conversation_memory.get_summary(conversation),
             "literacy_level": user.literacy_level.value,
-            "language": detected_language,
-            "intent": intent_data
+            "channel": request.channel,
+            "language": detected_language
         }
         
-        ai_response = await ai_service.generate_response(
+        intent_data, response_text, action_plan_data = await understand_message(
             user_message=user_message,
-            context=user_context,
+            user_context=user_context,
             language=detected_language,
-            literacy_level=user.literacy_level.value
+            literacy_level=user.literacy_level.value,
+            current_plan=await get_current_plan(db, conversation.id)
         )
         
-        response_text = ai_response.get("response_text", "")
-        
-        # If intent suggests need for action plan, generate it
-        if intent_data.get("domain") != "general" and intent_data.get("confidence", 0) > 0.7:
-            action_plan_data = await action_planner.create_action_plan(
-                user_query=user_message,
-                domain=intent_data["domain"],
-                user_context=user_context,
-                language=detected_language
-            )
-            
+        # If intent suggests need for action plan, use the one drafted alongside the reply
+        if action_plan_data:
             # Save action plan
             await save_action_plan(db, conversation.id, action_plan_data)
             
@@ -104,9 +108,13 @@ async def handle_sms(request: MessageRequest, db: Session = Depends(get_db)):
             conversation_id=conversation.id,
             role=MessageRole.ASSISTANT,
             content=response_text,
-            language=detected_language
+            language=detected_language,
+            metadata={"intent": intent_data}
         )
         
+        # Fold this turn into the rolling conversation summary in the background
+        conversation_memory.schedule_update(conversation.id, user_message, response_text)
+        
         # Update user last active
         user.last_active = datetime.utcnow()
         db.commit()
@@ -200,39 +208,31 @@ async def handle_web_message(request: MessageRequest, db: Session = Depends(get_
             language=detected_language
         )
         
-        # Extract intent
-        intent_data = await ai_service.extract_intent(user_message, detected_language)
-        
-        # Generate AI response
+        # Understand the message and generate the AI response in one call
         user_context = {
             "location": f"{user.location_district}, {user.location_state}" if user.location_district else None,
+            "conversation_summary": conversation_memory.get_summary(conversation),
             "literacy_level": user.literacy_level.value,
-            "language": detected_language,
-            "intent": intent_data
+            "channel": "web",
+            "language": detected_language
         }
         
-        ai_response = await ai_service.generate_response(
+        intent_data, response_text, action_plan_data = await understand_message(
             user_message=user_message,
-            context=user_context,
+            user_context=user_context,
             language=detected_language,
-            literacy_level=user.literacy_level.value
+            literacy_level=user.literacy_level.value,
+            current_plan=await get_current_plan(db, conversation.id)
         )
         
         response_data = {
-            "text": ai_response.get("response_text", ""),
+            "text": response_text,
             "language": detected_language,
             "intent": intent_data
         }
         
-        # Generate action plan if needed
-        if intent_data.get("domain") != "general" and intent_data.get("confidence", 0) > 0.7:
-            action_plan_data = await action_planner.create_action_plan(
-                user_query=user_message,
-                domain=intent_data["domain"],
-                user_context=user_context,
-                language=detected_language
-            )
-            
+        # Attach the action plan if one was needed
+        if action_plan_data:
             # Save action plan
             await save_action_plan(db, conversation.id, action_plan_data)
             
@@ -271,6 +271,9 @@ async def handle_web_message(request: MessageRequest, db: Session = Depends(get_
             metadata=response_data
         )
         
+        # Fold this turn into the rolling conversation summary in the background
+        conversation_memory.schedule_update(conversation.id, user_message, response_data["text"])
+        
         # Update user last active
         user.last_active = datetime.utcnow()
         db.commit()
@@ -287,26 +290,233 @@ async def handle_web_message(request: MessageRequest, db: Session = Depends(get_
         logger.error(f"Error handling web message: {str(e)}")
         raise HTTPException(status_code=500, detail="Error processing message")
 
+@router.post("/web/stream")
+async def handle_web_message_stream(request: MessageRequest):
+    """
+    Handle web interface messages as a Server-Sent Events stream
+    
+    Emits "start", then "token" events as Gemini produces the reply,
+    followed by "intent", "action_plan", "visual_guide" and "audio" events
+    as each becomes ready, and finally "done" (or "error"). A message
+    answered without the LLM (from the FAQ store or in degraded mode)
+    arrives as a single "token" event. A reply cut short by a provider
+    error ends with the fallback text and is marked "partial" in "done".
+    """
+    # Sanitize input
+    user_message = sanitize_input(request.message)
+    
+    # Validate content - Guardrails
+    validation_result = validate_message_content(user_message)
+    if not validation_result["is_valid"]:
+        async def guardrail_stream() -> AsyncIterator[str]:
+            language = request.language or "en"
+            yield _sse_event("start", {"conversation_id": None, "language": language})
+            yield _sse_event("token", {"text": validation_result["message"]})
+            yield _sse_event("done", {
+                "conversation_id": None,
+                "response": {"text": validation_result["message"], "language": language}
+            })
+        
+        return StreamingResponse(guardrail_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+    
+    return StreamingResponse(
+        stream_web_message(request, user_message),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@router.get("/conversations/{conversation_id}/summary")
+async def get_conversation_summary(conversation_id: int, db: Session = Depends(get_db)):
+    """
+    Return the rolling summary of a conversation as a summary card
+
+    The card is built from the stored summary and the latest action plan,
+    so no LLM call is made.
+    """
+    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    return {
+        "conversation_id": conversation.id,
+        "summary_turns": conversation.summary_turns or 0,
+        "summary_updated_at": conversation.summary_updated_at.isoformat() if conversation.summary_updated_at else None,
+        "card": await conversation_memory.get_summary_card(db, conversation)
+    }
+
+async def stream_web_message(request: MessageRequest, user_message: str) -> AsyncIterator[str]:
+    """
+    Produce the SSE frames for a web message
+    
+    Owns its database session because the response body outlives the
+    request-scoped get_db dependency.
+    """
+    db = SessionLocal()
+    try:
+        # Detect language if not provided
+        if not request.language:
+            detected_language = translation_service.detect_language(user_message)
+        else:
+            detected_language = request.language
+        
+        user = await get_or_create_user(
+            db=db,
+            phone_number=request.phone_number,
+            language=detected_language,
+            channel="web"
+        )
+        conversation = await get_or_create_conversation(
+            db=db,
+            user_id=user.id,
+            channel=Channel.WEB
+        )
+        await save_message(
+            db=db,
+            conversation_id=conversation.id,
+            role=MessageRole.USER,
+            content=user_message,
+            language=detected_language
+        )
+        
+        yield _sse_event("start", {"conversation_id": conversation.id, "language": detected_language})
+        
+        user_context = {
+            "location": f"{user.location_district}, {user.location_state}" if user.location_district else None,
+            "conversation_summary": conversation_memory.get_summary(conversation),
+            "literacy_level": user.literacy_level.value,
+            "channel": "web",
+            "language": detected_language
+        }
+        
+        # The pipeline answers as run does (FAQ store, degraded mode, LLM) while relaying the reply
+        result = None
+        async for event in message_pipeline.stream(
+            user_message=user_message,
+            user_context=user_context,
+            language=detected_language,
+            literacy_level=user.literacy_level.value,
+            current_plan=await get_current_plan(db, conversation.id)
+        ):
+            if "token" in event:
+                yield _sse_event("token", {"text": event["token"]})
+            else:
+                result = event["result"]
+        
+        intent_data = result["intent"]
+        yield _sse_event("intent", intent_data)
+        
+        response_data = {
+            "text": result["response_text"],
+            "language": detected_language,
+            "intent": intent_data
+        }
+        if result.get("partial"):
+            # The reply was cut short and finished with the fallback text
+            response_data["partial"] = True
+        voice_text = response_data["text"]
+        
+        action_plan_data = result["action_plan"]
+        if action_plan_data:
+            await save_action_plan(db, conversation.id, action_plan_data)
+            response_data["action_plan"] = action_plan_data
+            yield _sse_event("action_plan", action_plan_data)
+            
+            visual_guide = multimodal_service.generate_icon_guide(action_plan_data)
+            response_data["visual_guide"] = visual_guide
+            yield _sse_event("visual_guide", visual_guide)
+            
+            voice_text = action_planner.format_action_plan_for_voice(action_plan_data)
+        
+        audio_path = await multimodal_service.text_to_speech(
+            voice_text,
+            language=detected_language,
+            slow=False
+        )
+        if audio_path:
+            response_data["audio_url"] = f"/audio/{audio_path.split('/')[-1]}"
+            yield _sse_event("audio", {"audio_url": response_data["audio_url"]})
+        
+        await save_message(
+            db=db,
+            conversation_id=conversation.id,
+            role=MessageRole.ASSISTANT,
+            content=response_data["text"],
+            language=detected_language,
+            metadata=response_data
+        )
+        
+        # Fold this turn into the rolling conversation summary in the background
+        conversation_memory.schedule_update(conversation.id, user_message, response_data["text"])
+        user.last_active = datetime.utcnow()
+        db.commit()
+        
+        logger.info(f"Streamed web message for user {user.id}")
+        yield _sse_event("done", {"conversation_id": conversation.id, "response": response_data})
+        
+    except Exception as e:
+        logger.error(f"Error streaming web message: {str(e)}")
+        yield _sse_event("error", {"detail": "Error processing message"})
+    finally:
+        db.close()
+
 # Helper functions
+async def understand_message(
+    user_message: str,
+    user_context: Dict,
+    language: str,
+    literacy_level: str,
+    current_plan: Optional[Dict] = None
+) -> Tuple[Dict, str, Optional[Dict]]:
+    """
+    Run the message pipeline (intent, reply and action plan) for a user message
+    
+    Adds the extracted intent to user_context and only returns an action
+    plan when the intent is specific and confident enough to need one. A
+    follow-up in the same domain as current_plan returns the patched plan.
+    
+    Returns:
+        Tuple of (intent data, response text, finalized action plan or None)
+    """
+    result = await message_pipeline.run(
+        user_message=user_message,
+        user_context=user_context,
+        language=language,
+        literacy_level=literacy_level,
+        current_plan=current_plan
+    )
+    
+    return result["intent"], result["response_text"], result["action_plan"]
+
 async def get_or_create_user(
     db: Session,
     phone_number: str,
     language: str,
     channel: str
 ) -> User:
-    """Get existing user or create new one"""
-    phone_encrypted = encryption_service.encrypt(phone_number)
+    """
+    Get existing user or create new one
+    
+    Users are found by the blind index of their phone number, since the
+    encrypted number differs on every encryption.
+    """
+    phone_hash = encryption_service.phone_index(phone_number)
     
-    user = db.query(User).filter(User.phone_number_encrypted == phone_encrypted).first()
+    user = db.query(User).filter(User.phone_number_hash == phone_hash).first()
     
     if not user:
         user = User(
-            phone_number_encrypted=phone_encrypted,
+            phone_number_encrypted=encryption_service.encrypt(encryption_service.normalize_phone(phone_number)),
+            phone_number_hash=phone_hash,
             preferred_language=language,
             consent_given=1  # Assumed consent for POC
         )
         db.add(user)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another request created the same user first
+            db.rollback()
+            return db.query(User).filter(User.phone_number_hash == phone_hash).one()
         db.refresh(user)
         logger.info(f"Created new user with ID: {user.id}")
     
@@ -354,15 +564,57 @@ async def save_message(
         role=role,
         content_encrypted=content_encrypted,
         language=language,
-        metadata=metadata
+        message_metadata=metadata
     )
     db.add(message)
     db.commit()
 
+async def get_current_plan(db: Session, conversation_id: int) -> Optional[Dict]:
+    """Latest action plan of a conversation, which follow-ups patch instead of replacing"""
+    action_plan = db.query(ActionPlan).filter(
+        ActionPlan.conversation_id == conversation_id
+    ).order_by(ActionPlan.id.desc()).first()
+    
+    # Plans saved before plan_data existed cannot be patched
+    if action_plan is None or not action_plan.plan_data:
+        return None
+    return {**action_plan.plan_data, "plan_id": action_plan.id, "version": action_plan.version or 1}
+
 async def save_action_plan(db: Session, conversation_id: int, action_plan_data: Dict):
-    """Save action plan to database"""
+    """
+    Save action plan to database
+    
+    A refined plan (one carrying the plan_id of an existing row) updates that
+    row and appends to its revisions; an unchanged one is not written again.
+    """
     from app.database import Domain
     
+    plan_data = {key: value for key, value in action_plan_data.items() if key not in ("plan_id", "changes")}
+    version = action_plan_data.get("version", 1)
+    
+    action_plan = None
+    if action_plan_data.get("plan_id"):
+        action_plan = db.query(ActionPlan).filter(ActionPlan.id == action_plan_data["plan_id"]).first()
+    
+    if action_plan is not None:
+        if version <= (action_plan.version or 1):
+            return
+        action_plan.plan_data = plan_data
+        action_plan.steps = action_plan_data.get("steps", [])
+        action_plan.documents_required = action_plan_data.get("documents_required", [])
+        action_plan.eligibility_status = action_plan_data.get("eligibility", {}).get("status")
+        action_plan.risk_alerts = action_plan_data.get("risk_alerts", [])
+        action_plan.version = version
+        action_plan.revisions = (action_plan.revisions or []) + [{
+            "version": version,
+            "changes": action_plan_data.get("changes", []),
+            "created_at": datetime.utcnow().isoformat()
+        }]
+        action_plan.updated_at = datetime.utcnow()
+        db.commit()
+        logger.info(f"Updated action plan {action_plan.id} to version {version}")
+        return
+    
     domain_str = action_plan_data.get("domain", "general")
     domain_enum = getattr(Domain, domain_str.upper(), Domain.HEALTH)
     
@@ -372,7 +624,9 @@ async def save_action_plan(db: Session, conversation_id: int, action_plan_data:
         steps=action_plan_data.get("steps", []),
         documents_required=action_plan_data.get("documents_required", []),
         eligibility_status=action_plan_data.get("eligibility", {}).get("status"),
-        risk_alerts=action_plan_data.get("risk_alerts", [])
+        risk_alerts=action_plan_data.get("risk_alerts", []),
+        plan_data=plan_data,
+        version=version
     )
     db.add(action_plan)
     db.commit()
@@ -5,6 +5,7 @@ from typing import Optional
 
 from app.database import get_db
 from app.services.ai_service import ai_service
+from app.services.conversation_memory import conversation_memory
 from app.services.multimodal_service import multimodal_service
 from app.api.routes.messaging import get_or_create_user, get_or_create_conversation, save_message
 from app.database import Channel, MessageRole
@@ -112,7 +113,9 @@ async def handle_voice_input(
         
         user_context = {
             "location": f"{user.location_district}, {user.location_state}" if user.location_district else None,
+            "conversation_summary": conversation_memory.get_summary(conversation),
             "literacy_level": user.literacy_level.value,
+            "channel": "voice",
             "language": "en",
             "intent": intent_data
         }
@@ -130,7 +133,8 @@ async def handle_voice_input(
         simplified_text = await ai_service.simplify_text(
             response_text,
             literacy_level=user.literacy_level.value,
-            language="en"
+            language="en",
+            channel="voice"
         )
         
         # Save assistant response
@@ -142,6 +146,9 @@ async def handle_voice_input(
             language="en"
         )
         
+        # Fold this turn into the rolling conversation summary in the background
+        conversation_memory.schedule_update(conversation.id, SpeechResult, simplified_text)
+        
         # Speak the response
         response.say(simplified_text, voice='alice', language='en-US')
         
@@ -14,12 +14,14 @@ from app.api.routes.messaging import (
     get_or_create_user,
     get_or_create_conversation,
     save_message,
-    save_action_plan
+    save_action_plan,
+    get_current_plan,
+    understand_message
 )
 from app.database import Channel, MessageRole
-from app.services.ai_service import ai_service
 from app.services.translation_service import translation_service
 from app.services.action_planner import action_planner
+from app.services.conversation_memory import conversation_memory
 from app.utils.logger import logger
 from app.utils.validation import sanitize_input
 
@@ -74,35 +76,25 @@ async def receive_sms(
             language=detected_language
         )
         
-        # Extract intent
-        intent_data = await ai_service.extract_intent(user_message, detected_language)
-        
-        # Generate AI response
+        # Understand the message and generate the AI response in one call
         user_context = {
             "location": f"{user.location_district}, {user.location_state}" if user.location_district else None,
+            "conversation_summary": conversation_memory.get_summary(conversation),
             "literacy_level": user.literacy_level.value,
-            "language": detected_language,
-            "intent": intent_data
+            "channel": "sms",
+            "language": detected_language
         }
         
-        ai_response = await ai_service.generate_response(
+        intent_data, response_text, action_plan_data = await understand_message(
             user_message=user_message,
-            context=user_context,
+            user_context=user_context,
             language=detected_language,
-            literacy_level=user.literacy_level.value
+            literacy_level=user.literacy_level.value,
+            current_plan=await get_current_plan(db, conversation.id)
         )
         
-        response_text = ai_response.get("response_text", "")
-        
-        # If intent suggests need for action plan, generate it
-        if intent_data.get("domain") != "general" and intent_data.get("confidence", 0) > 0.7:
-            action_plan_data = await action_planner.create_action_plan(
-                user_query=user_message,
-                domain=intent_data["domain"],
-                user_context=user_context,
-                language=detected_language
-            )
-            
+        # If intent suggests need for action plan, use the one drafted alongside the reply
+        if action_plan_data:
             # Save action plan
             await save_action_plan(db, conversation.id, action_plan_data)
             
@@ -115,9 +107,13 @@ async def receive_sms(
             conversation_id=conversation.id,
             role=MessageRole.ASSISTANT,
             content=response_text,
-            language=detected_language
+            language=detected_language,
+            metadata={"intent": intent_data}
         )
         
+        # Fold this turn into the rolling conversation summary in the background
+        conversation_memory.schedule_update(conversation.id, user_message, response_text)
+        
         # Create TwiML response
         twiml_response = MessagingResponse()
         twiml_response.message(response_text)
@@ -192,36 +188,26 @@ async def receive_whatsapp(
             language=detected_language
         )
         
-        # Extract intent
-        intent_data = await ai_service.extract_intent(user_message, detected_language)
-        
-        # Generate AI response
+        # Understand the message and generate the AI response in one call
         user_context = {
             "location": f"{user.location_district}, {user.location_state}" if user.location_district else None,
+            "conversation_summary": conversation_memory.get_summary(conversation),
             "literacy_level": user.literacy_level.value,
+            "channel": "whatsapp",
             "language": detected_language,
-            "intent": intent_data,
             "has_media": has_media
         }
         
-        ai_response = await ai_service.generate_response(
+        intent_data, response_text, action_plan_data = await understand_message(
             user_message=user_message,
-            context=user_context,
+            user_context=user_context,
             language=detected_language,
-            literacy_level=user.literacy_level.value
+            literacy_level=user.literacy_level.value,
+            current_plan=await get_current_plan(db, conversation.id)
         )
         
-        response_text = ai_response.get("response_text", "")
-        
-        # If intent suggests need for action plan, generate it
-        if intent_data.get("domain") != "general" and intent_data.get("confidence", 0) > 0.7:
-            action_plan_data = await action_planner.create_action_plan(
-                user_query=user_message,
-                domain=intent_data["domain"],
-                user_context=user_context,
-                language=detected_language
-            )
-            
+        # If intent suggests need for action plan, use the one drafted alongside the reply
+        if action_plan_data:
             # Save action plan
             await save_action_plan(db, conversation.id, action_plan_data)
             
@@ -234,9 +220,13 @@ async def receive_whatsapp(
             conversation_id=conversation.id,
             role=MessageRole.ASSISTANT,
             content=response_text,
-            language=detected_language
+            language=detected_language,
+            metadata={"intent": intent_data}
         )
         
+        # Fold this turn into the rolling conversation summary in the background
+        conversation_memory.schedule_update(conversation.id, user_message, response_text)
+        
         # Create TwiML response
         twiml_response = MessagingResponse()
         
@@ -10,7 +10,7 @@ class Settings(BaseSettings):
     DEBUG: bool = True
     
     # Gemini AI API
-    GEMINI_API_KEY: str
+    GEMINI_API_KEY: str = ""
     
     # Database
     DATABASE_URL: str = "sqlite:///./sahaayai.db"
@@ -20,12 +20,14 @@ class Settings(BaseSettings):
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     REDIS_PASSWORD: str = ""
+    REDIS_ENABLED: bool = False
     
     # Security
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     ENCRYPTION_KEY: str
+    BLIND_INDEX_KEY: str = ""  # HMAC key for phone number lookups; derived from ENCRYPTION_KEY when empty
     
     # Twilio (Optional - only needed for real SMS/Voice)
     TWILIO_ACCOUNT_SID: str = ""
@@ -67,6 +69,66 @@ class Settings(BaseSettings):
     MAX_WORKERS: int = 4
     REQUEST_TIMEOUT_SECONDS: int = 30
     CACHE_TTL_SECONDS: int = 3600
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_ENTRIES: int = 2048
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_SECONDS: int = 30
+    LLM_HEDGE_DELAY_SECONDS: float = 0.0  # 0 disables hedged requests
+    LLM_QUEUE_MAX: int = 64  # waiting LLM calls before the lowest-priority one is shed
+    LLM_QUEUE_DEGRADE_DEPTH: int = 16  # queue depth at which optional LLM work is skipped
+    LLM_DEADLINE_VOICE_SECONDS: float = 4.0
+    LLM_DEADLINE_WEB_SECONDS: float = 15.0
+    LLM_DEADLINE_WHATSAPP_SECONDS: float = 20.0
+    LLM_DEADLINE_SMS_SECONDS: float = 30.0
+    PIPELINE_MODE: str = "fused"  # "fused" (one LLM call) or "parallel" (concurrent calls)
+    BATCH_CONCURRENCY: int = 4  # batch rows in the pipeline at once
+    BATCH_MAX_ROWS: int = 10000
+    
+    # Local intent classifier
+    INTENT_CLASSIFIER_ENABLED: bool = True
+    INTENT_CLASSIFIER_THRESHOLD: float = 0.85
+    INTENT_CLASSIFIER_MODEL_PATH: str = "./storage/models/intent_classifier.json"
+    
+    # LLM provider: "gemini" or "local" (deterministic stand-in for tests and load tests)
+    LLM_PROVIDER: str = "gemini"
+    LLM_MODEL: str = "gemini-2.0-flash"
+    LLM_FAST_MODEL: str = "gemini-2.0-flash-lite"  # intent, simplification and summaries
+    LLM_LOCAL_LATENCY_MS: float = 0.0
+    LLM_LOCAL_LATENCY_SIGMA: float = 0.0  # log-normal shape; 0 gives a fixed latency
+    LLM_LOCAL_ERROR_RATE: float = 0.0
+    LLM_LOCAL_TIMEOUT_RATE: float = 0.0
+    LLM_LOCAL_SEED: int = 42
+    
+    # Precomputed action plans for known schemes
+    SCHEME_LIBRARY_ENABLED: bool = True
+    
+    # Offline FAQ answers (cosine similarity of character n-gram vectors)
+    FAQ_ENABLED: bool = True
+    FAQ_MATCH_THRESHOLD: float = 0.8
+    
+    # Serving without the LLM while its circuit breaker is open
+    DEGRADED_MODE_ENABLED: bool = True
+    DEGRADED_FAQ_THRESHOLD: float = 0.5
+    DEGRADED_MEMORY_TTL_SECONDS: int = 604800  # answers remembered for outages outlive the response cache
+    DEGRADED_MEMORY_MAX_ENTRIES: int = 4096
+    
+    # Knowledge base passages retrieved into prompts (BM25)
+    RETRIEVAL_ENABLED: bool = True
+    RETRIEVAL_TOP_K: int = 3
+    RETRIEVAL_MAX_TOKENS: int = 200
+    
+    # Dense vector index over knowledge passages (memory-mapped, built offline)
+    VECTOR_INDEX_ENABLED: bool = True
+    VECTOR_INDEX_PATH: str = "./storage/vector_index"
+    VECTOR_DIM: int = 512
+    VECTOR_MIN_SIMILARITY: float = 0.15
+    
+    # Scheme catalog ingestion into the knowledge_base table
+    KNOWLEDGE_INGEST_BATCH_SIZE: int = 500
+    
+    # Conversation memory
+    CONVERSATION_SUMMARY_ENABLED: bool = True
+    CONVERSATION_SUMMARY_MAX_WORDS: int = 120
     
     # Privacy
     DATA_RETENTION_DAYS: int = 90
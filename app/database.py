@@ -1,7 +1,9 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, JSON, ForeignKey, Enum
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, DateTime, Text, JSON, ForeignKey, Enum
+from sqlalchemy.exc import IntegrityError, OperationalError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, Session
 from datetime import datetime
+from typing import Dict, List
 import enum
 
 from app.config import settings
@@ -45,6 +47,7 @@ class User(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     phone_number_encrypted = Column(String, unique=True, index=True)
+    phone_number_hash = Column(String, unique=True, index=True)  # Blind index (HMAC) for lookups
     preferred_language = Column(String, default=settings.DEFAULT_LANGUAGE)
     literacy_level = Column(Enum(LiteracyLevel), default=LiteracyLevel.MEDIUM)
     location_district = Column(String, nullable=True)
@@ -64,6 +67,9 @@ class Conversation(Base):
     started_at = Column(DateTime, default=datetime.utcnow)
     ended_at = Column(DateTime, nullable=True)
     status = Column(String, default="active")
+    summary_encrypted = Column(Text, nullable=True)  # Rolling summary of the conversation so far
+    summary_turns = Column(Integer, default=0)  # Number of turns folded into the summary
+    summary_updated_at = Column(DateTime, nullable=True)
     
     user = relationship("User", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation")
@@ -92,7 +98,11 @@ class ActionPlan(Base):
     documents_required = Column(JSON)  # Array of document names
     eligibility_status = Column(String, nullable=True)
     risk_alerts = Column(JSON, nullable=True)
+    plan_data = Column(JSON, nullable=True)  # Full plan, patched in place by follow-ups
+    version = Column(Integer, default=1)
+    revisions = Column(JSON, nullable=True)  # [{version, changes, created_at}] per refinement
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=True)
     
     conversation = relationship("Conversation", back_populates="action_plans")
 
@@ -100,17 +110,207 @@ class KnowledgeBase(Base):
     __tablename__ = "knowledge_base"
     
     id = Column(Integer, primary_key=True, index=True)
+    external_id = Column(String, unique=True, index=True)  # Catalog id, e.g. scheme id
     domain = Column(Enum(Domain))
     category = Column(String)
     title = Column(String)
     content = Column(JSON)  # Multilingual content
     keywords = Column(Text)  # Searchable keywords
     language = Column(String)
+    content_hash = Column(String)  # Hash of the ingested record, to skip unchanged ones
     updated_at = Column(DateTime, default=datetime.utcnow)
 
+class DataMigration(Base):
+    """One-off data fixes init_db has applied, so each runs once per database"""
+    __tablename__ = "data_migrations"
+    
+    name = Column(String, primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+# Full-text index over knowledge_base (SQLite FTS5), kept in step by triggers.
+# content is flattened from its JSON so every language's text is searchable.
+KNOWLEDGE_FTS_TABLE = "knowledge_base_fts"
+_KNOWLEDGE_FTS_TEXT = "(SELECT group_concat(value, ' ') FROM json_each({row}.content))"
+_KNOWLEDGE_FTS_STATEMENTS = [
+    f"""CREATE TRIGGER IF NOT EXISTS {KNOWLEDGE_FTS_TABLE}_insert AFTER INSERT ON knowledge_base BEGIN
+        INSERT INTO {KNOWLEDGE_FTS_TABLE}(rowid, title, keywords, content)
+        VALUES (new.id, new.title, new.keywords, {_KNOWLEDGE_FTS_TEXT.format(row="new")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {KNOWLEDGE_FTS_TABLE}_update AFTER UPDATE ON knowledge_base BEGIN
+        DELETE FROM {KNOWLEDGE_FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {KNOWLEDGE_FTS_TABLE}(rowid, title, keywords, content)
+        VALUES (new.id, new.title, new.keywords, {_KNOWLEDGE_FTS_TEXT.format(row="new")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {KNOWLEDGE_FTS_TABLE}_delete AFTER DELETE ON knowledge_base BEGIN
+        DELETE FROM {KNOWLEDGE_FTS_TABLE} WHERE rowid = old.id;
+    END"""
+]
+
 # Database initialization
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+    _create_catalog_index()
+    _backfill_phone_hashes()
+    _create_knowledge_fts()
+
+def _add_missing_columns():
+    """
+    Add columns introduced after a table was first created
+    
+    create_all only creates missing tables, so existing databases would
+    otherwise lack newly added nullable columns.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+def _create_catalog_index(bind=None):
+    """
+    Create the unique index on knowledge_base.external_id
+
+    _add_missing_columns adds the column to existing databases but not its
+    index, which catalog upserts rely on to keep one row per record.
+    """
+    with (bind or engine).begin() as connection:
+        connection.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_knowledge_base_external_id ON knowledge_base (external_id)"
+        ))
+
+# data_migrations row marking the phone hash backfill as done
+PHONE_HASH_MIGRATION = "phone_number_hash_backfill"
+
+def _backfill_phone_hashes(bind=None):
+    """
+    Fill users.phone_number_hash and merge users that share a phone number
+
+    Users used to be looked up by comparing freshly encrypted phone numbers,
+    which never matched because Fernet output is randomized, so each message
+    created a new user. Duplicates are merged into the oldest user and the
+    unique index is created afterwards. The run is recorded in
+    data_migrations in the same transaction; the first worker to insert that
+    row holds the write lock until it commits, and every later start-up sees
+    the row and returns at once.
+    """
+    from app.utils.encryption import encryption_service
+    from app.utils.logger import logger
+
+    bind = bind or engine
+    db = Session(bind=bind)
+    try:
+        if db.get(DataMigration, PHONE_HASH_MIGRATION):
+            return
+        db.add(DataMigration(name=PHONE_HASH_MIGRATION))
+        try:
+            db.flush()
+        except (IntegrityError, OperationalError):
+            # Another worker ran the backfill while this one waited, or still holds the lock
+            db.rollback()
+            return
+
+        pending = db.query(User).filter(User.phone_number_hash.is_(None), User.phone_number_encrypted.isnot(None)).all()
+        hashes: Dict[int, str] = {}
+        for user in pending:
+            try:
+                hashes[user.id] = encryption_service.phone_index(encryption_service.decrypt(user.phone_number_encrypted))
+            except Exception as e:
+                logger.warning(f"Cannot index the phone number of user {user.id}: {str(e)}")
+
+        groups: Dict[str, List[User]] = {}
+        hashed = db.query(User).filter(User.phone_number_hash.in_(set(hashes.values()))).all() if hashes else []
+        for user in hashed + pending:
+            phone_hash = user.phone_number_hash or hashes.get(user.id)
+            if phone_hash:
+                groups.setdefault(phone_hash, []).append(user)
+
+        merged = 0
+        for phone_hash, users in groups.items():
+            users.sort(key=lambda user: user.id)
+            if len(users) > 1:
+                _merge_users(db, users[0], users[1:])
+                merged += len(users) - 1
+            users[0].phone_number_hash = phone_hash
+        db.flush()
+        db.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_phone_number_hash ON users (phone_number_hash)"))
+        db.commit()
+        if pending:
+            logger.info(f"Indexed {len(hashes)} phone numbers, merged {merged} duplicate users")
+    finally:
+        db.close()
+
+def _merge_users(db: Session, keeper: User, duplicates: List[User]):
+    """
+    Move the conversations of duplicate users to keeper and delete them
+
+    Active conversations on the same channel are folded into the oldest one,
+    keeping every message and action plan, and the newest summary.
+    """
+    for duplicate in sorted(duplicates, key=lambda user: user.last_active or datetime.min):
+        if (duplicate.last_active or datetime.min) >= (keeper.last_active or datetime.min):
+            keeper.preferred_language = duplicate.preferred_language or keeper.preferred_language
+            keeper.last_active = duplicate.last_active
+        keeper.location_district = keeper.location_district or duplicate.location_district
+        keeper.location_state = keeper.location_state or duplicate.location_state
+        keeper.consent_given = max(keeper.consent_given or 0, duplicate.consent_given or 0)
+        db.query(Conversation).filter(Conversation.user_id == duplicate.id).update(
+            {"user_id": keeper.id}, synchronize_session=False
+        )
+        db.delete(duplicate)
+    db.flush()
+
+    targets: Dict[Channel, Conversation] = {}
+    conversations = (
+        db.query(Conversation)
+        .filter(Conversation.user_id == keeper.id, Conversation.status == "active")
+        .order_by(Conversation.started_at, Conversation.id)
+    )
+    for conversation in conversations.all():
+        target = targets.setdefault(conversation.channel, conversation)
+        if target is conversation:
+            continue
+        for model in (Message, ActionPlan):
+            db.query(model).filter(model.conversation_id == conversation.id).update(
+                {"conversation_id": target.id}, synchronize_session=False
+            )
+        if conversation.summary_updated_at and (
+            not target.summary_updated_at or conversation.summary_updated_at > target.summary_updated_at
+        ):
+            target.summary_encrypted = conversation.summary_encrypted
+            target.summary_updated_at = conversation.summary_updated_at
+        target.summary_turns = (target.summary_turns or 0) + (conversation.summary_turns or 0)
+        db.delete(conversation)
+    db.flush()
+
+def _create_knowledge_fts(bind=None):
+    """
+    Create the knowledge_base FTS5 table and its triggers (SQLite only)
+
+    A newly created table is filled from the rows already present.
+    """
+    bind = bind or engine
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as connection:
+        if inspect(connection).has_table(KNOWLEDGE_FTS_TABLE):
+            return
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE {KNOWLEDGE_FTS_TABLE} USING fts5("
+            "title, keywords, content, tokenize=\"unicode61 remove_diacritics 2 categories 'L* N* Co M*'\")"
+        ))
+        for statement in _KNOWLEDGE_FTS_STATEMENTS:
+            connection.execute(text(statement))
+        connection.execute(text(
+            f"INSERT INTO {KNOWLEDGE_FTS_TABLE}(rowid, title, keywords, content) "
+            f"SELECT id, title, keywords, {_KNOWLEDGE_FTS_TEXT.format(row='knowledge_base')} FROM knowledge_base"
+        ))
 
 def get_db():
     db = SessionLocal()
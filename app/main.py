@@ -7,8 +7,10 @@ import os
 
 from app.config import settings
 from app.database import init_db
-from app.api.routes import messaging, health, voice, webhooks, send
+from app.api.routes import messaging, health, voice, webhooks, send, batch, knowledge, eligibility
 from app.api.middleware.rate_limit import RateLimitMiddleware
+from app.services.retrieval_service import knowledge_retriever
+from app.services.vector_index import vector_index
 from app.utils.logger import logger
 
 # Lifespan context manager for startup and shutdown events
@@ -21,6 +23,13 @@ async def lifespan(app: FastAPI):
     init_db()
     logger.info("Database initialized")
     
+    # Index the knowledge base for prompt grounding and keep it in step with row changes
+    knowledge_retriever.build_from_database()
+    knowledge_retriever.watch_database()
+    
+    # Build the dense vector index if it is missing or stale; workers memory-map the same files
+    vector_index.ensure_built()
+    
     # Create storage directories if they don't exist
     os.makedirs(settings.FILE_STORAGE_PATH, exist_ok=True)
     os.makedirs(os.path.join(settings.FILE_STORAGE_PATH, "audio"), exist_ok=True)
@@ -67,6 +76,9 @@ app.include_router(messaging.router)
 app.include_router(voice.router)
 app.include_router(webhooks.router)
 app.include_router(send.router)
+app.include_router(batch.router)
+app.include_router(knowledge.router)
+app.include_router(eligibility.router)
 
 # Root endpoint - Redirect to frontend
 @app.get("/")
@@ -1,6 +1,10 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import datetime
 from app.services.ai_service import ai_service
+from app.services.degraded_mode import degraded_mode
+from app.services.eligibility_engine import ATTRIBUTE_QUESTIONS, attributes_from_context, eligibility_engine
+from app.services.llm_metrics import llm_metrics
+from app.services.scheme_library import scheme_library
 from app.utils.logger import logger
 
 class ActionPlanner:
@@ -27,6 +31,18 @@ class ActionPlanner:
         Returns:
             Structured action plan with steps, documents, and resources
         """
+        # Known schemes are served from the precomputed library without an LLM call
+        library_plan = self.library_plan(user_query, domain, user_context, language)
+        if library_plan is not None:
+            llm_metrics.record_avoided("action_plan", user_context.get("channel"), language, reason="scheme_library")
+            return library_plan
+        
+        # Fail fast while Gemini is degraded instead of waiting on a doomed call,
+        # and skip this optional call while the LLM queue is backed up
+        if ai_service.is_degraded or ai_service.is_overloaded:
+            logger.warning(f"AI service degraded or overloaded, using fallback action plan for domain: {domain}")
+            return self.knowledge_base_plan(user_query, domain, user_context, language) or self._get_fallback_plan(domain)
+        
         try:
             # Get action plan from AI service
             action_plan = await ai_service.generate_action_plan(
@@ -36,24 +52,196 @@ class ActionPlanner:
                 language=language
             )
             
-            # Enhance action plan with additional metadata
-            enhanced_plan = {
-                **action_plan,
-                "created_at": datetime.utcnow().isoformat(),
-                "domain": domain,
-                "language": language,
-                "user_context": {
-                    "location": user_context.get("location"),
-                    "literacy_level": user_context.get("literacy_level")
-                }
-            }
-            
-            logger.info(f"Created action plan for domain: {domain}")
-            return enhanced_plan
+            return self.finalize_action_plan(action_plan, domain, user_context, language)
             
         except Exception as e:
             logger.error(f"Error creating action plan: {str(e)}")
-            return self._get_fallback_plan(domain)
+            return self.knowledge_base_plan(user_query, domain, user_context, language) or self._get_fallback_plan(domain)
+    
+    def finalize_action_plan(
+        self,
+        action_plan: Dict,
+        domain: str,
+        user_context: Dict,
+        language: str = "en"
+    ) -> Dict:
+        """
+        Enhance a generated action plan with request metadata
+        
+        Used for plans produced by generate_action_plan as well as plans
+        returned inline by the fused understand_and_respond call.
+        """
+        enhanced_plan = {
+            **action_plan,
+            "created_at": datetime.utcnow().isoformat(),
+            "domain": domain,
+            "language": language,
+            "user_context": {
+                "location": user_context.get("location"),
+                "literacy_level": user_context.get("literacy_level")
+            }
+        }
+        
+        logger.info(f"Created action plan for domain: {domain}")
+        return enhanced_plan
+    
+    def library_plan(
+        self,
+        user_query: str,
+        domain: Optional[str],
+        user_context: Dict,
+        language: str = "en"
+    ) -> Optional[Dict]:
+        """
+        Precomputed plan for a query that names a known scheme
+        
+        The plan is personalized with the user's location and finalized like
+        a generated one.
+        
+        Returns:
+            The plan, or None if the query names no scheme in domain (any
+            domain when None) or the library has no plan for the language
+        """
+        plan = scheme_library.find(user_query, language, user_context.get("literacy_level", "medium"), domain)
+        if plan is None:
+            return None
+        return self._personalize_library_plan(plan, user_context, language)
+    
+    def knowledge_base_plan(
+        self,
+        user_query: str,
+        domain: Optional[str],
+        user_context: Dict,
+        language: str = "en"
+    ) -> Optional[Dict]:
+        """
+        Precomputed plan for the scheme a query describes, used when the LLM is unavailable
+        
+        The scheme is matched by name, or failing that by keywords, and the
+        English plan stands in when the library has none for the language.
+        
+        Returns:
+            The plan, or None if no scheme in domain matches
+        """
+        scheme_id = scheme_library.match_scheme(user_query, domain)
+        if scheme_id is None:
+            scheme = degraded_mode.match_scheme(user_query, domain)
+            if scheme is None:
+                return None
+            scheme_id = scheme["id"]
+        literacy_level = user_context.get("literacy_level") or "medium"
+        plan = (
+            scheme_library.get_plan(scheme_id, language, literacy_level)
+            or scheme_library.get_plan(scheme_id, "en", literacy_level)
+        )
+        if plan is None:
+            return None
+        return self._personalize_library_plan(plan, user_context, language)
+    
+    def _personalize_library_plan(self, plan: Dict, user_context: Dict, language: str) -> Dict:
+        location = user_context.get("location")
+        if location:
+            plan["immediate_actions"] = [
+                f"{action} in {location}" if "nearest" in action.lower() else action
+                for action in plan["immediate_actions"]
+            ]
+        
+        logger.info(f"Serving precomputed action plan for scheme: {plan['scheme_id']}")
+        return self.finalize_action_plan(plan, plan["domain"], user_context, language)
+    
+    async def refine_action_plan(
+        self,
+        user_query: str,
+        current_plan: Dict,
+        user_context: Dict,
+        language: str = "en"
+    ) -> Dict:
+        """
+        Update an existing action plan for a follow-up message
+        
+        Only the changes are generated and applied to current_plan, which
+        cuts output tokens compared with create_action_plan.
+        
+        Returns:
+            The patched plan with version incremented, or current_plan
+            unchanged if nothing changed or the patch could not be generated
+        """
+        if ai_service.is_degraded or ai_service.is_overloaded:
+            logger.warning("AI service degraded or overloaded, keeping the current action plan")
+            return current_plan
+        
+        patch = await ai_service.generate_plan_patch(
+            user_message=user_query,
+            current_plan=current_plan,
+            user_context=user_context,
+            language=language
+        )
+        if not patch.get("changed"):
+            return current_plan
+        
+        refined = self.apply_plan_patch(current_plan, patch)
+        if not refined["changes"]:
+            return current_plan
+        
+        logger.info(f"Refined action plan to version {refined['version']}: {refined['changes']}")
+        return refined
+    
+    def apply_plan_patch(self, plan: Dict, patch: Dict) -> Dict:
+        """
+        Apply an ActionPlanPatch to a plan
+        
+        Returns:
+            A new plan with version incremented and "changes" listing what was changed
+        """
+        changes: List[str] = []
+        
+        removed = set(patch.get("remove_steps") or [])
+        updates = {step["step_number"]: step for step in patch.get("update_steps") or []}
+        steps = []
+        for step in plan.get("steps") or []:
+            number = step.get("step_number")
+            if number in removed:
+                changes.append(f"removed step: {step.get('action')}")
+                continue
+            if number in updates:
+                step = {**step, "action": updates[number]["action"], "details": updates[number]["details"]}
+                changes.append(f"updated step: {step['action']}")
+            steps.append(step)
+        for step in patch.get("add_steps") or []:
+            steps.append(step)
+            changes.append(f"added step: {step['action']}")
+        steps = [{**step, "step_number": number} for number, step in enumerate(steps, start=1)]
+        
+        documents = list(plan.get("documents_required") or [])
+        drop = {document.lower() for document in patch.get("remove_documents") or []}
+        if drop:
+            kept = [document for document in documents if document.lower() not in drop]
+            if len(kept) < len(documents):
+                changes.append(f"removed documents: {', '.join(d for d in documents if d not in kept)}")
+            documents = kept
+        for document in patch.get("add_documents") or []:
+            if document.lower() not in {d.lower() for d in documents}:
+                documents.append(document)
+                changes.append(f"added document: {document}")
+        
+        refined = {**plan, "steps": steps, "documents_required": documents}
+        if patch.get("summary") and patch["summary"] != plan.get("summary"):
+            refined["summary"] = patch["summary"]
+            changes.append("updated summary")
+        if patch.get("immediate_actions"):
+            refined["immediate_actions"] = patch["immediate_actions"]
+            changes.append("updated immediate actions")
+        if patch.get("eligibility") and patch["eligibility"] != plan.get("eligibility"):
+            refined["eligibility"] = {**(plan.get("eligibility") or {}), **patch["eligibility"]}
+            changes.append(f"eligibility: {refined['eligibility'].get('status', 'check_needed')}")
+        if patch.get("add_risk_alerts"):
+            refined["risk_alerts"] = list(plan.get("risk_alerts") or []) + patch["add_risk_alerts"]
+            changes.append("added risk alerts")
+        
+        refined["version"] = plan.get("version", 1) + 1
+        refined["changes"] = changes
+        refined["updated_at"] = datetime.utcnow().isoformat()
+        return refined
     
     def _get_fallback_plan(self, domain: str) -> Dict:
         """Return a generic fallback plan when AI generation fails"""
@@ -221,55 +409,84 @@ class ActionPlanner:
         self,
         scheme_name: str,
         user_context: Dict,
-        language: str = "en"
+        language: str = "en",
+        explain: bool = True
     ) -> Dict:
         """
         Check user eligibility for a specific scheme or service
         
+        The verdict comes from the compiled eligibility rules; the LLM only
+        words the explanation, and a template is used when it is unavailable.
+        
         Args:
-            scheme_name: Name of the government scheme or service
-            user_context: User information for eligibility check
+            scheme_name: Name or id of the government scheme
+            user_context: User information for eligibility check (age, occupation, ...)
             language: User's preferred language
+            explain: Whether to ask the LLM to explain the result
             
         Returns:
-            Eligibility information
+            Eligibility information: status (eligible/maybe/ineligible/unknown),
+            unmet criteria, missing attributes with questions, documents and
+            an explanation
         """
-        prompt = f"""
-        Check eligibility for: {scheme_name}
-        User information: {user_context}
-        
-        Provide eligibility information in simple language.
-        Include:
-        1. Eligibility criteria
-        2. Whether the user is likely eligible (yes/no/maybe)
-        3. What additional information is needed
-        4. How to apply
-        
-        Respond in JSON format.
-        """
-        
-        try:
-            # Use AI service to check eligibility
-            result = await ai_service.generate_response(
-                user_message=prompt,
-                context=user_context,
-                language=language,
-                literacy_level=user_context.get("literacy_level", "medium")
-            )
-            
-            return {
-                "scheme": scheme_name,
-                "eligibility_info": result.get("response_text"),
-                "checked_at": datetime.utcnow().isoformat()
-            }
-            
-        except Exception as e:
-            logger.error(f"Error checking eligibility: {str(e)}")
+        scheme_id = scheme_library.match_scheme(scheme_name) or scheme_name.strip().lower()
+        result = eligibility_engine.check(scheme_id, attributes_from_context(user_context))
+        if result is None:
             return {
                 "scheme": scheme_name,
-                "eligibility_info": "Unable to check eligibility at this time. Please try again or contact the relevant office.",
+                "status": "unknown",
+                "eligibility_info": "I could not find this scheme. Please check the name or ask at your nearest Common Service Centre (CSC).",
                 "checked_at": datetime.utcnow().isoformat()
             }
+        
+        questions = {attribute: ATTRIBUTE_QUESTIONS[attribute] for attribute in result["missing"]}
+        explanation = self._explain_eligibility(result, questions)
+        if explain and not ai_service.is_degraded:
+            prompt = f"""
+        Explain this eligibility result to the user in simple language. Do not change the verdict.
+        Scheme: {result['name']}
+        Verdict: {result['status']}
+        Criteria not met: {'; '.join(result['unmet']) or 'none'}
+        Information still needed: {'; '.join(questions.values()) or 'none'}
+        Documents: {'; '.join(result['documents'])}
+        """
+            try:
+                response = await ai_service.generate_response(
+                    user_message=prompt,
+                    context=user_context,
+                    language=language,
+                    literacy_level=user_context.get("literacy_level", "medium")
+                )
+                if response.get("success", True) and response.get("response_text"):
+                    explanation = response["response_text"]
+            except Exception as e:
+                logger.error(f"Error explaining eligibility: {str(e)}")
+        
+        return {
+            "scheme": result["name"],
+            "scheme_id": result["scheme_id"],
+            "status": result["status"],
+            "likely_eligible": result["status"] != "ineligible",
+            "unmet": result["unmet"],
+            "missing": result["missing"],
+            "questions": questions,
+            "criteria": result["criteria"],
+            "documents": result["documents"],
+            "eligibility_info": explanation,
+            "checked_at": datetime.utcnow().isoformat()
+        }
+    
+    def _explain_eligibility(self, result: Dict, questions: Dict) -> str:
+        """Plain explanation of an eligibility result, used without the LLM"""
+        if result["status"] == "eligible":
+            lines = [f"You are likely eligible for {result['name']}."]
+        elif result["status"] == "maybe":
+            lines = [f"You may be eligible for {result['name']}.", "Please tell us: " + " ".join(questions.values())]
+        else:
+            lines = [f"You may not be eligible for {result['name']}.", "Not met: " + "; ".join(result["unmet"])]
+        if result["status"] != "ineligible" and result["documents"]:
+            lines.append("Documents: " + ", ".join(result["documents"]))
+        return "\n".join(lines)
 
 # Initialize singleton
 action_planner = ActionPlanner()
@@ -1,14 +1,303 @@
-import google.generativeai as genai
-from typing import Dict, List, Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import hashlib
 import json
+import time
 from app.config import settings
+from app.services.cache_service import response_cache
+from app.services.intent_classifier import detect_urgency, intent_classifier
+from app.services.llm_metrics import llm_metrics
+from app.services.llm_providers import LLMResponse, create_provider
+from app.services.model_router import model_router
+from app.services.prompt_registry import prompt_registry
+from app.services.retrieval_service import knowledge_retriever
+from app.utils.concurrency import PriorityScheduler, SchedulerOverloadedError, SingleFlight
+from app.utils.llm_json import llm_output_parser
 from app.utils.logger import logger
+from app.utils.resilience import CircuitBreaker, CircuitOpenError
+from app.utils.text import estimate_tokens
+from app.utils.validation import ActionPlanPatch, ActionPlanPayload, IntentPayload, UnderstandPayload
+
+# Seconds subtracted from (or added to) a call's deadline when ordering the queue
+URGENCY_PRIORITY_OFFSETS = {"high": -10.0, "medium": 0.0, "low": 10.0}
+
+# Background work yields to anything a user is waiting on
+TASK_PRIORITY_OFFSETS = {"summary": 60.0}
+
+# Offline batch rows queue behind live traffic on every channel
+CHANNEL_PRIORITY_OFFSETS = {"batch": 300.0}
+
+# Reply sent when the LLM call fails and the caller has nothing better
+FALLBACK_RESPONSE = "I apologize, but I'm having trouble processing your request right now. Please try again."
 
 class AIService:
     def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
-        logger.info("Gemini AI Service initialized")
+        self.provider = create_provider()
+        
+        # Bound the number of concurrent LLM calls per worker; waiting calls are
+        # served earliest-deadline-first and shed when the queue is full
+        self.max_concurrency = max(1, settings.MAX_WORKERS)
+        self.scheduler = PriorityScheduler(self.max_concurrency, settings.LLM_QUEUE_MAX)
+        self.channel_deadlines = {
+            "voice": settings.LLM_DEADLINE_VOICE_SECONDS,
+            "web": settings.LLM_DEADLINE_WEB_SECONDS,
+            "whatsapp": settings.LLM_DEADLINE_WHATSAPP_SECONDS,
+            "sms": settings.LLM_DEADLINE_SMS_SECONDS
+        }
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        
+        # Identical prompts already in flight share one LLM call
+        self._single_flight = SingleFlight()
+        
+        # Deadlines, fail-fast and tail-latency hedging
+        self.timeout_seconds = settings.REQUEST_TIMEOUT_SECONDS
+        self.hedge_delay_seconds = settings.LLM_HEDGE_DELAY_SECONDS
+        self.circuit_breaker = CircuitBreaker(
+            self.provider.name,
+            failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.LLM_CIRCUIT_RESET_SECONDS
+        )
+        self._timeouts = 0
+        self._hedges_fired = 0
+        self._hedge_wins = 0
+        logger.info(
+            f"AI Service initialized (provider: {self.provider.name}, model: {self.provider.model}, "
+            f"max concurrency: {self.max_concurrency})"
+        )
+    
+    @asynccontextmanager
+    async def _slot(self, priority: float, label: str, timeout: Optional[float] = None):
+        """
+        Hold one of the concurrency slots for the duration of an LLM call
+        
+        Calls beyond the concurrency cap wait in the scheduler queue, where
+        the lowest priority value (earliest adjusted deadline) goes first.
+        timeout bounds the wait for callers that enforce their own deadline;
+        running out of it raises SchedulerOverloadedError, since a full queue
+        says nothing about the provider's health.
+        """
+        try:
+            await asyncio.wait_for(self.scheduler.acquire(priority, label), timeout)
+        except asyncio.TimeoutError:
+            raise SchedulerOverloadedError(f"No LLM slot free within {timeout:.2f}s") from None
+        
+        self._in_flight += 1
+        try:
+            yield
+            self._completed += 1
+        except asyncio.CancelledError:
+            # Losing hedges and abandoned streams are cancelled, which says nothing about the provider
+            self._cancelled += 1
+            raise
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self.scheduler.release()
+    
+    async def _generate(
+        self,
+        prompt: str,
+        task: str = "response",
+        channel: Optional[str] = None,
+        language: Optional[str] = None,
+        urgency: Optional[str] = None
+    ) -> str:
+        """
+        Run a single LLM call through the provider without blocking the event loop
+        
+        The model router picks the model and output budget for the task and
+        channel; the channel and urgency set the call's deadline and queue
+        priority. Concurrent calls with the same prompt fingerprint are
+        coalesced into one request whose response is shared by every caller.
+        """
+        route = model_router.route(task, channel)
+        if route["instructions"]:
+            prompt = f"{prompt}\n\n{route['instructions']}"
+        
+        fingerprint = hashlib.sha256(
+            f"{route['model']}|{route['max_output_tokens']}|{prompt}".encode()
+        ).hexdigest()
+        response = await self._single_flight.do(
+            fingerprint,
+            lambda: self._call_model(prompt, task, route, channel, language, urgency)
+        )
+        return response.text
+    
+    async def _call_model(
+        self,
+        prompt: str,
+        task: str,
+        route: Dict,
+        channel: Optional[str],
+        language: Optional[str],
+        urgency: Optional[str]
+    ) -> LLMResponse:
+        """
+        Call the LLM provider behind the circuit breaker
+        
+        Raises CircuitOpenError immediately while the provider is considered
+        degraded, so callers drop straight to their fallback responses.
+        Every call is recorded in llm_metrics with its tokens and latency.
+        """
+        try:
+            self.circuit_breaker.before_call()
+        except CircuitOpenError:
+            llm_metrics.record_call(task, channel, language, 0.0, status="circuit_open")
+            raise
+        
+        started = time.perf_counter()
+        try:
+            response = await self._call_with_deadline(prompt, task, route, channel, urgency)
+        except asyncio.CancelledError:
+            self.circuit_breaker.record_cancelled()
+            raise
+        except SchedulerOverloadedError:
+            # Load shedding says nothing about the provider's health
+            self.circuit_breaker.record_cancelled()
+            llm_metrics.record_call(task, channel, language, self._elapsed_ms(started), status="shed")
+            raise
+        except Exception as e:
+            self.circuit_breaker.record_failure()
+            llm_metrics.record_call(
+                task, channel, language, self._elapsed_ms(started),
+                status="timeout" if isinstance(e, asyncio.TimeoutError) else "error",
+                prompt_tokens=estimate_tokens(prompt)
+            )
+            raise
+        self.circuit_breaker.record_success()
+        llm_metrics.record_call(
+            task, channel, language, self._elapsed_ms(started),
+            prompt_tokens=response.prompt_tokens,
+            output_tokens=response.output_tokens
+        )
+        return response
+    
+    async def _call_with_deadline(
+        self,
+        prompt: str,
+        task: str,
+        route: Dict,
+        channel: Optional[str],
+        urgency: Optional[str]
+    ) -> LLMResponse:
+        """
+        Enforce the channel deadline on an LLM call, hedging if configured
+        
+        The deadline covers queueing as well as generation; if it passes
+        before any attempt got a slot, SchedulerOverloadedError is raised
+        instead of a timeout. When LLM_HEDGE_DELAY_SECONDS is set and the
+        first request has not answered by then, a second identical request
+        is sent and whichever succeeds first wins; the other is cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        timeout_seconds = self._deadline_seconds(channel)
+        deadline = loop.time() + timeout_seconds
+        priority = self._priority(deadline, task, urgency, channel)
+        label = channel or "web"
+        started = []
+        pending = {asyncio.ensure_future(self._attempt(prompt, task, route, priority, label, started))}
+        hedge = None
+        last_error = None
+        
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                
+                wait_seconds = remaining
+                if self.hedge_delay_seconds > 0 and hedge is None:
+                    wait_seconds = min(remaining, self.hedge_delay_seconds)
+                
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=wait_seconds,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is hedge:
+                            self._hedge_wins += 1
+                        return attempt.result()
+                    last_error = attempt.exception()
+                
+                if not done and self.hedge_delay_seconds > 0 and hedge is None:
+                    hedge = asyncio.ensure_future(self._attempt(prompt, task, route, priority, label, started))
+                    pending.add(hedge)
+                    self._hedges_fired += 1
+            
+            if not pending and last_error is not None:
+                raise last_error
+            if not started:
+                raise SchedulerOverloadedError(f"No LLM slot free within {timeout_seconds}s")
+            
+            self._timeouts += 1
+            raise asyncio.TimeoutError(f"{self.provider.name} call exceeded {timeout_seconds}s")
+        finally:
+            for attempt in pending:
+                attempt.cancel()
+    
+    async def _attempt(
+        self, prompt: str, task: str, route: Dict, priority: float, label: str, started: List[bool]
+    ) -> LLMResponse:
+        async with self._slot(priority, label):
+            started.append(True)
+            return await self.provider.generate(prompt, task, route)
+    
+    def _deadline_seconds(self, channel: Optional[str]) -> float:
+        """Per-channel deadline, never longer than REQUEST_TIMEOUT_SECONDS"""
+        return min(self.timeout_seconds, self.channel_deadlines.get(channel or "web", self.timeout_seconds))
+    
+    @staticmethod
+    def _priority(deadline: float, task: str, urgency: Optional[str], channel: Optional[str] = None) -> float:
+        """Queue priority: the absolute deadline shifted by urgency, task and channel"""
+        return (
+            deadline
+            + URGENCY_PRIORITY_OFFSETS.get(urgency or "medium", 0.0)
+            + TASK_PRIORITY_OFFSETS.get(task, 0.0)
+            + CHANNEL_PRIORITY_OFFSETS.get(channel or "web", 0.0)
+        )
+    
+    @staticmethod
+    def _elapsed_ms(started: float) -> float:
+        return round((time.perf_counter() - started) * 1000, 2)
+    
+    @property
+    def is_degraded(self) -> bool:
+        """Whether LLM calls are currently being failed fast"""
+        return self.circuit_breaker.is_open
+    
+    @property
+    def is_overloaded(self) -> bool:
+        """Whether enough calls are queued that optional LLM work should be skipped"""
+        return self.scheduler.queue_depth >= settings.LLM_QUEUE_DEGRADE_DEPTH
+    
+    def get_stats(self) -> Dict:
+        """Concurrency gauges and call counters for the metrics endpoint"""
+        return {
+            "provider": self.provider.name,
+            "model": self.provider.model,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.scheduler.queue_depth,
+            "in_flight": self._in_flight,
+            "completed": self._completed,
+            "failed": self._failed,
+            "cancelled": self._cancelled,
+            "timeouts": self._timeouts,
+            "timeout_seconds": self.timeout_seconds,
+            "hedges_fired": self._hedges_fired,
+            "hedge_wins": self._hedge_wins,
+            "channel_deadlines": self.channel_deadlines,
+            "scheduler": self.scheduler.get_stats(),
+            "circuit_breaker": self.circuit_breaker.get_stats(),
+            "single_flight": self._single_flight.get_stats()
+        }
     
     async def generate_response(
         self,
@@ -29,60 +318,202 @@ class AIService:
         Returns:
             Dict containing the response and metadata
         """
+        domain = (context.get("intent") or {}).get("domain", "")
+        cache_key = response_cache.make_key(
+            "response", user_message, language, literacy_level, domain,
+            context=context.get("conversation_summary", ""),
+            channel=context.get("channel", ""),
+            location=context.get("location") or ""
+        )
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Cache hit for AI response, language: {language}, literacy: {literacy_level}")
+            llm_metrics.record_avoided("response", context.get("channel"), language)
+            return cached
+        
         try:
-            # Build the system prompt
-            system_prompt = self._build_system_prompt(language, literacy_level, context)
-            
-            # Combine system prompt with user message
-            full_prompt = f"{system_prompt}\n\nUser Query: {user_message}"
+            full_prompt = self._response_prompt(user_message, context, language, literacy_level)
             
             # Generate response
-            response = self.model.generate_content(full_prompt)
+            response_text = await self._generate(
+                full_prompt,
+                task="response",
+                channel=context.get("channel"),
+                language=language,
+                urgency=(context.get("intent") or {}).get("urgency")
+            )
             
             result = {
-                "response_text": response.text,
+                "response_text": response_text,
                 "language": language,
                 "literacy_level": literacy_level,
                 "success": True
             }
             
+            await response_cache.set(cache_key, result)
+            
             logger.info(f"Generated AI response for language: {language}, literacy: {literacy_level}")
             return result
             
         except Exception as e:
             logger.error(f"Error generating AI response: {str(e)}")
             return {
-                "response_text": "I apologize, but I'm having trouble processing your request right now. Please try again.",
+                "response_text": FALLBACK_RESPONSE,
                 "language": language,
                 "success": False,
                 "error": str(e)
             }
     
-    async def extract_intent(self, user_message: str, language: str = "en") -> Dict:
-        """Extract user intent from message"""
-        prompt = f"""
-        Analyze the following user message and extract:
-        1. Primary intent (what the user wants to do)
-        2. Domain (health/agriculture/finance/education/government_schemes/climate)
-        3. Key entities (location, dates, amounts, etc.)
-        4. Urgency level (low/medium/high)
+    async def stream_response(
+        self,
+        user_message: str,
+        context: Dict,
+        language: str = "en",
+        literacy_level: str = "medium",
+        fallback: bool = True
+    ) -> AsyncIterator[str]:
+        """
+        Stream an AI response chunk by chunk as the provider produces it
         
-        User message: {user_message}
+        Uses the same prompt and cache entry as generate_response; a cached
+        answer is yielded as a single chunk. On failure the fallback text is
+        yielded instead of raising (unless chunks were already sent), so
+        callers can always finish the stream.
         
-        Respond in JSON format:
-        {{
-            "intent": "string",
-            "domain": "string",
-            "entities": {{}},
-            "urgency": "string",
-            "confidence": 0.0-1.0
-        }}
+        Args:
+            user_message: The user's input message
+            context: User context (location, previous conversation, etc.)
+            language: Target language code
+            literacy_level: User's literacy level (low/medium/high)
+            fallback: Yield the fallback text on failure; when False the
+                error is raised once recorded, so callers can tell a failed
+                or cut-short reply from a complete one
+        
+        Yields:
+            Response text chunks
+        """
+        domain = (context.get("intent") or {}).get("domain", "")
+        cache_key = response_cache.make_key(
+            "response", user_message, language, literacy_level, domain,
+            context=context.get("conversation_summary", ""),
+            channel=context.get("channel", ""),
+            location=context.get("location") or ""
+        )
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Cache hit for streamed AI response, language: {language}")
+            llm_metrics.record_avoided("response", context.get("channel"), language)
+            yield cached["response_text"]
+            return
+        
+        full_prompt = self._response_prompt(user_message, context, language, literacy_level)
+        route = model_router.route("response", context.get("channel"))
+        if route["instructions"]:
+            full_prompt = f"{full_prompt}\n\n{route['instructions']}"
+        
+        chunks = []
+        channel = context.get("channel")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._deadline_seconds(channel)
+        urgency = (context.get("intent") or {}).get("urgency") or detect_urgency(user_message)
+        started = time.perf_counter()
+        try:
+            self.circuit_breaker.before_call()
+            async with self._slot(
+                self._priority(deadline, "response", urgency, channel),
+                channel or "web",
+                timeout=max(0.0, deadline - loop.time())
+            ):
+                iterator = self.provider.stream(full_prompt, task="response", route=route).__aiter__()
+                while True:
+                    try:
+                        text = await asyncio.wait_for(
+                            iterator.__anext__(),
+                            timeout=max(0.0, deadline - loop.time())
+                        )
+                    except StopAsyncIteration:
+                        break
+                    if text:
+                        chunks.append(text)
+                        yield text
+            self.circuit_breaker.record_success()
+        except (asyncio.CancelledError, GeneratorExit):
+            self.circuit_breaker.record_cancelled()
+            raise
+        except (CircuitOpenError, SchedulerOverloadedError) as e:
+            if isinstance(e, SchedulerOverloadedError):
+                self.circuit_breaker.record_cancelled()
+            llm_metrics.record_call(
+                "response", channel, language, self._elapsed_ms(started),
+                status="circuit_open" if isinstance(e, CircuitOpenError) else "shed"
+            )
+            logger.warning(f"Skipping streamed AI response: {str(e)}")
+            if not fallback:
+                raise
+            yield FALLBACK_RESPONSE
+            return
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self._timeouts += 1
+            self.circuit_breaker.record_failure()
+            llm_metrics.record_call(
+                "response", context.get("channel"), language, self._elapsed_ms(started),
+                status="timeout" if isinstance(e, asyncio.TimeoutError) else "error",
+                prompt_tokens=estimate_tokens(full_prompt),
+                output_tokens=estimate_tokens("".join(chunks))
+            )
+            logger.error(f"Error streaming AI response: {str(e)}")
+            if not fallback:
+                raise
+            if not chunks:
+                yield FALLBACK_RESPONSE
+            return
+        
+        llm_metrics.record_call(
+            "response", context.get("channel"), language, self._elapsed_ms(started),
+            prompt_tokens=estimate_tokens(full_prompt),
+            output_tokens=estimate_tokens("".join(chunks))
+        )
+        await response_cache.set(cache_key, {
+            "response_text": "".join(chunks),
+            "language": language,
+            "literacy_level": literacy_level,
+            "success": True
+        })
+        logger.info(f"Streamed AI response for language: {language}, literacy: {literacy_level}")
+    
+    async def extract_intent(self, user_message: str, language: str = "en") -> Dict:
         """
+        Extract user intent from message
+        
+        The local classifier answers first; Gemini is only called when its
+        confidence is below INTENT_CLASSIFIER_THRESHOLD.
+        """
+        if settings.INTENT_CLASSIFIER_ENABLED:
+            local_intent = intent_classifier.classify(user_message)
+            if intent_classifier.is_confident(local_intent):
+                logger.info(
+                    f"Local intent: {local_intent['domain']} "
+                    f"(confidence: {local_intent['confidence']})"
+                )
+                llm_metrics.record_avoided("intent", None, language, reason="local_classifier")
+                return local_intent
+        
+        prompt = self._intent_prompt(user_message)
+        
+        cache_key = response_cache.make_key("intent", user_message, language)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Cache hit for intent: {cached.get('intent')}")
+            llm_metrics.record_avoided("intent", None, language)
+            return cached
         
         try:
-            response = self.model.generate_content(prompt)
-            # Parse JSON from response
-            intent_data = json.loads(response.text.strip().replace("```json", "").replace("```", ""))
+            response_text = await self._generate(
+                prompt, task="intent", language=language, urgency=detect_urgency(user_message)
+            )
+            intent_data = llm_output_parser.parse(response_text, IntentPayload, task="intent")
+            await response_cache.set(cache_key, intent_data)
             logger.info(f"Extracted intent: {intent_data.get('intent')}")
             return intent_data
         except Exception as e:
@@ -103,7 +534,303 @@ class AIService:
         language: str = "en"
     ) -> Dict:
         """Generate step-by-step action plan"""
-        prompt = f"""
+        prompt = self._action_plan_prompt(user_query, domain, user_context, language)
+        
+        cache_key = response_cache.make_key(
+            "action_plan", user_query, language, user_context.get("literacy_level", "medium"), domain,
+            context=user_context.get("conversation_summary", ""),
+            channel=user_context.get("channel", ""),
+            location=user_context.get("location") or ""
+        )
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Cache hit for action plan, domain: {domain}")
+            llm_metrics.record_avoided("action_plan", user_context.get("channel"), language)
+            return cached
+        
+        try:
+            response_text = await self._generate(
+                prompt,
+                task="action_plan",
+                channel=user_context.get("channel"),
+                language=language,
+                urgency=(user_context.get("intent") or {}).get("urgency")
+            )
+            action_plan = llm_output_parser.parse(response_text, ActionPlanPayload, task="action_plan")
+            await response_cache.set(cache_key, action_plan)
+            logger.info(f"Generated action plan for domain: {domain}")
+            return action_plan
+        except Exception as e:
+            logger.error(f"Error generating action plan: {str(e)}")
+            return {
+                "summary": "We're here to help you. Let's break this down into simple steps.",
+                "immediate_actions": ["Please provide more details about your situation"],
+                "steps": [],
+                "documents_required": [],
+                "eligibility": {"criteria": [], "status": "check_needed"},
+                "risk_alerts": [],
+                "resources": [],
+                "estimated_time": "Unknown"
+            }
+    
+    async def generate_plan_patch(
+        self,
+        user_message: str,
+        current_plan: Dict,
+        user_context: Dict,
+        language: str = "en"
+    ) -> Dict:
+        """
+        Ask for the changes a follow-up message makes to an existing action plan
+        
+        Much smaller than regenerating the plan: only changed steps, documents
+        and eligibility come back.
+        
+        Returns:
+            ActionPlanPatch fields; {"changed": False} if the call fails
+        """
+        prompt = self._plan_patch_prompt(
+            user_message, current_plan, language, user_context.get("literacy_level", "medium")
+        )
+        
+        try:
+            response_text = await self._generate(
+                prompt,
+                task="plan_patch",
+                channel=user_context.get("channel"),
+                language=language,
+                urgency=(user_context.get("intent") or {}).get("urgency")
+            )
+            patch = llm_output_parser.parse(response_text, ActionPlanPatch, task="plan_patch")
+            logger.info(f"Generated plan patch (changed: {patch['changed']})")
+            return patch
+        except Exception as e:
+            logger.error(f"Error generating plan patch: {str(e)}")
+            return {"changed": False}
+    
+    async def translate_action_plan(self, plan: Dict, language: str, literacy_level: str) -> Optional[Dict]:
+        """
+        Translate an action plan for the offline scheme library build
+        
+        Returns:
+            The translated plan, or None if the call or parsing fails
+        """
+        prompt = self._plan_translate_prompt(plan, language, literacy_level)
+        
+        try:
+            response_text = await self._generate(prompt, task="plan_translate", language=language)
+            return llm_output_parser.parse(response_text, ActionPlanPayload, task="plan_translate")
+        except Exception as e:
+            logger.error(f"Error translating action plan to {language}: {str(e)}")
+            return None
+    
+    async def understand_and_respond(
+        self,
+        user_message: str,
+        context: Dict,
+        language: str = "en",
+        literacy_level: str = "medium",
+        draft_plan: bool = True
+    ) -> Dict:
+        """
+        Extract intent, answer the user and draft an action plan in one Gemini call
+        
+        Replaces the serial extract_intent -> generate_response ->
+        generate_action_plan chain used by the messaging routes.
+        
+        Args:
+            user_message: The user's input message
+            context: User context (location, previous conversation, etc.)
+            language: Target language code
+            literacy_level: User's literacy level (low/medium/high)
+            draft_plan: False when the plan comes from elsewhere (a patch of the
+                conversation's plan or the scheme library), so none is drafted here
+        
+        Returns:
+            Dict with the intent data, the response text and an optional action plan
+        """
+        cache_key = response_cache.make_key(
+            "understand", user_message, language, literacy_level,
+            context=context.get("conversation_summary", "") + ("" if draft_plan else "|existing_plan"),
+            channel=context.get("channel", ""),
+            location=context.get("location") or ""
+        )
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Cache hit for fused understanding, domain: {cached['intent'].get('domain')}")
+            llm_metrics.record_avoided("understand", context.get("channel"), language)
+            return cached
+        
+        prompt = self._understand_prompt(user_message, context, language, literacy_level, draft_plan)
+        
+        try:
+            response_text = await self._generate(
+                prompt,
+                task="understand",
+                channel=context.get("channel"),
+                language=language,
+                urgency=detect_urgency(user_message)
+            )
+            data = llm_output_parser.parse(response_text, UnderstandPayload, task="understand")
+            
+            intent_data = {
+                "intent": data["intent"],
+                "domain": data["domain"],
+                "entities": data["entities"],
+                "urgency": data["urgency"],
+                "confidence": data["confidence"]
+            }
+            action_plan = data["action_plan"]
+            
+            result = {
+                "intent": intent_data,
+                "response_text": data["response_text"],
+                "action_plan": action_plan,
+                "language": language,
+                "literacy_level": literacy_level,
+                "success": True
+            }
+            await response_cache.set(cache_key, result)
+            
+            logger.info(
+                f"Fused understanding for intent: {intent_data['intent']}, "
+                f"domain: {intent_data['domain']}, action plan: {bool(action_plan)}"
+            )
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error in fused understanding: {str(e)}")
+            return {
+                "intent": {
+                    "intent": "general_inquiry",
+                    "domain": "general",
+                    "entities": {},
+                    "urgency": "medium",
+                    "confidence": 0.5
+                },
+                "response_text": FALLBACK_RESPONSE,
+                "action_plan": None,
+                "language": language,
+                "literacy_level": literacy_level,
+                "success": False,
+                "error": str(e)
+            }
+    
+    async def simplify_text(
+        self,
+        text: str,
+        literacy_level: str = "low",
+        language: str = "en",
+        channel: Optional[str] = None
+    ) -> str:
+        """Simplify complex text for different literacy levels"""
+        prompt = self._simplify_prompt(text, literacy_level, language)
+        
+        try:
+            response_text = await self._generate(prompt, task="simplify", channel=channel, language=language)
+            return response_text.strip()
+        except Exception as e:
+            logger.error(f"Error simplifying text: {str(e)}")
+            return text
+    
+    async def summarize_conversation(
+        self,
+        previous_summary: str,
+        user_message: str,
+        assistant_message: str,
+        max_words: int = 120
+    ) -> str:
+        """
+        Fold the latest turn into a rolling conversation summary
+        
+        Args:
+            previous_summary: Summary of the conversation before this turn
+            user_message: The user's latest message
+            assistant_message: The assistant's reply to it
+            max_words: Upper bound on the summary length
+        
+        Returns:
+            Updated summary, or the previous summary if generation fails
+        """
+        prompt = self._summary_prompt(previous_summary, user_message, assistant_message, max_words)
+        
+        try:
+            response_text = await self._generate(prompt, task="summary")
+            summary = response_text.strip()
+            words = summary.split()
+            if len(words) > max_words:
+                summary = " ".join(words[:max_words])
+            return summary
+        except Exception as e:
+            logger.error(f"Error summarizing conversation: {str(e)}")
+            return previous_summary
+    
+    def prompt_token_sizes(self) -> Dict[str, int]:
+        """
+        Estimated token size of every prompt template, for the benchmark check
+        
+        Task prompts are rendered with fixed sample inputs so sizes only
+        change when a template changes. System prompts report the largest
+        compiled variant per domain.
+        """
+        context = {"location": "Patna, Bihar", "literacy_level": "medium", "channel": "web"}
+        message = "How do I apply for PM-KISAN scheme?"
+        plan = {
+            "summary": "Apply for PM-KISAN",
+            "immediate_actions": ["Visit your nearest CSC"],
+            "steps": [{"step_number": 1, "action": "Register on the PM-KISAN portal", "details": ""}],
+            "documents_required": ["Aadhaar Card", "Land records"],
+            "eligibility": {"criteria": ["Small and marginal farmers"], "status": "check_needed"}
+        }
+        prompts = {
+            "task:response": self._response_prompt(message, context, "en", "medium"),
+            "task:intent": self._intent_prompt(message),
+            "task:action_plan": self._action_plan_prompt(message, "agriculture", context, "en"),
+            "task:understand": self._understand_prompt(message, context, "en", "medium"),
+            "task:understand_followup": self._understand_prompt(message, context, "en", "medium", draft_plan=False),
+            "task:plan_patch": self._plan_patch_prompt(
+                "I have Aadhaar but no land records", plan, "en", "medium"
+            ),
+            "task:plan_translate": self._plan_translate_prompt(plan, "hi", "medium"),
+            "task:simplify": self._simplify_prompt(message, "low", "en"),
+            "task:summary": self._summary_prompt("The user is a farmer in Bihar.", message, message, 120)
+        }
+        sizes = {name: estimate_tokens(prompt) for name, prompt in prompts.items()}
+        for name, tokens in prompt_registry.template_token_sizes().items():
+            key = f"system:{name.split('/')[0]}"
+            sizes[key] = max(sizes.get(key, 0), tokens)
+        return sizes
+    
+    def _response_prompt(self, user_message: str, context: Dict, language: str, literacy_level: str) -> str:
+        """Prompt for a conversational reply"""
+        system_prompt = self._build_system_prompt(language, literacy_level, context, user_message)
+        return f"{system_prompt}\n\nUser Query: {user_message}"
+
+    
+    def _intent_prompt(self, user_message: str) -> str:
+        """Prompt for LLM intent extraction"""
+        return f"""
+        Analyze the following user message and extract:
+        1. Primary intent (what the user wants to do)
+        2. Domain (health/agriculture/finance/education/government_schemes/climate)
+        3. Key entities (location, dates, amounts, etc.)
+        4. Urgency level (low/medium/high)
+        
+        User message: {user_message}
+        
+        Respond in JSON format:
+        {{
+            "intent": "string",
+            "domain": "string",
+            "entities": {{}},
+            "urgency": "string",
+            "confidence": 0.0-1.0
+        }}
+        """
+    
+    def _action_plan_prompt(self, user_query: str, domain: str, user_context: Dict, language: str) -> str:
+        """Prompt for a standalone action plan"""
+        return f"""
         You are SahaayAI, an assistant helping underserved communities access essential services.
         
         Domain: {domain}
@@ -135,39 +862,128 @@ class AIService:
         
         Keep language simple and appropriate for {user_context.get('literacy_level', 'medium')} literacy level.
         """
-        
-        try:
-            response = self.model.generate_content(prompt)
-            action_plan = json.loads(response.text.strip().replace("```json", "").replace("```", ""))
-            logger.info(f"Generated action plan for domain: {domain}")
-            return action_plan
-        except Exception as e:
-            logger.error(f"Error generating action plan: {str(e)}")
-            return {
-                "summary": "We're here to help you. Let's break this down into simple steps.",
-                "immediate_actions": ["Please provide more details about your situation"],
-                "steps": [],
-                "documents_required": [],
-                "eligibility": {"criteria": [], "status": "check_needed"},
-                "risk_alerts": [],
-                "resources": [],
-                "estimated_time": "Unknown"
-            }
     
-    async def simplify_text(
+    def _understand_prompt(
         self,
-        text: str,
-        literacy_level: str = "low",
-        language: str = "en"
+        user_message: str,
+        context: Dict,
+        language: str,
+        literacy_level: str,
+        draft_plan: bool = True
     ) -> str:
-        """Simplify complex text for different literacy levels"""
+        """
+        Prompt for the fused intent, reply and action plan call
+        
+        With draft_plan False (the conversation already has a plan that is
+        patched, or the scheme library has one) the plan schema is left out.
+        """
+        system_prompt = self._build_system_prompt(language, literacy_level, context, user_message)
+        
+        if draft_plan:
+            plan_instruction = """3. If the domain is not general and the user needs concrete steps, draft an action plan
+           with immediate actions, required documents, eligibility, simple step-by-step
+           instructions, risk alerts and resources. Otherwise set "action_plan" to null."""
+            plan_schema = """{
+                "summary": "Brief summary of the situation",
+                "immediate_actions": ["action1", "action2"],
+                "steps": [
+                    {"step_number": 1, "action": "description", "details": "additional info"}
+                ],
+                "documents_required": ["document1", "document2"],
+                "eligibility": {"criteria": ["criterion1"], "status": "eligible/not_eligible/check_needed"},
+                "risk_alerts": ["alert1"],
+                "resources": [{"name": "resource", "contact": "info"}],
+                "estimated_time": "time estimate"
+            }"""
+        else:
+            plan_instruction = """3. The action plan for this message is prepared separately:
+           set "action_plan" to null."""
+            plan_schema = "null"
+        
+        return f"""
+        {system_prompt}
+        
+        User Query: {user_message}
+        
+        Do all of the following in a single answer:
+        1. Identify the user's primary intent, the domain
+           (health/agriculture/finance/education/government_schemes/climate, or general if none fits),
+           key entities (location, dates, amounts, etc.), urgency (low/medium/high) and your confidence.
+        2. Write the reply to the user following the guidelines above, in language "{language}".
+        {plan_instruction}
+        
+        Respond in JSON format only:
+        {{
+            "intent": "string",
+            "domain": "string",
+            "entities": {{}},
+            "urgency": "string",
+            "confidence": 0.0-1.0,
+            "response_text": "reply to the user",
+            "action_plan": {plan_schema}
+        }}
+        """
+    
+    def _plan_patch_prompt(self, user_message: str, current_plan: Dict, language: str, literacy_level: str) -> str:
+        """Prompt for the changes a follow-up makes to an existing action plan"""
+        plan = {
+            field: current_plan.get(field)
+            for field in ("summary", "immediate_actions", "steps", "documents_required", "eligibility")
+        }
+        return f"""
+        You are SahaayAI, updating an action plan you already gave the user.
+        
+        Current plan: {json.dumps(plan, ensure_ascii=False, separators=(",", ":"))}
+        User Query: {user_message}
+        Language: {language}
+        
+        Return only what this message changes. Leave out fields that stay the same,
+        refer to steps by step_number, and set "changed" to false if nothing changes.
+        Keep language simple and appropriate for {literacy_level} literacy level.
+        
+        Respond in JSON format:
+        {{
+            "changed": true,
+            "summary": "new summary, only if it changes",
+            "immediate_actions": ["replacement list, only if it changes"],
+            "add_steps": [{{"action": "description", "details": "additional info"}}],
+            "update_steps": [{{"step_number": 2, "action": "description", "details": "additional info"}}],
+            "remove_steps": [3],
+            "add_documents": ["document"],
+            "remove_documents": ["document"],
+            "eligibility": {{"criteria": ["criterion1"], "status": "eligible/not_eligible/check_needed"}},
+            "add_risk_alerts": ["alert"]
+        }}
+        """
+    
+    def _plan_translate_prompt(self, plan: Dict, language: str, literacy_level: str) -> str:
+        """Prompt for translating a precomputed action plan"""
+        fields = {
+            field: plan.get(field)
+            for field in (
+                "summary", "immediate_actions", "steps", "documents_required",
+                "eligibility", "risk_alerts", "resources", "estimated_time"
+            )
+        }
+        return f"""
+        Translate every text value of this action plan into language "{language}".
+        Keep the JSON keys, step numbers, phone numbers, URLs and the "status" value unchanged.
+        Use words suitable for {literacy_level} literacy level.
+        
+        Plan: {json.dumps(fields, ensure_ascii=False, separators=(",", ":"))}
+        
+        Respond with the translated plan as JSON only.
+        """
+    
+    def _simplify_prompt(self, text: str, literacy_level: str, language: str) -> str:
+        """Prompt for literacy-level simplification"""
         complexity_map = {
             "low": "Use very simple words, short sentences (5-8 words), explain everything like teaching a beginner. Use analogies and examples.",
             "medium": "Use common words, moderate sentence length (8-15 words), some technical terms with brief explanations.",
             "high": "Use standard language, can include technical terms with context."
         }
         
-        prompt = f"""
+        return f"""
         Simplify the following text for someone with {literacy_level} literacy level.
         
         Guidelines: {complexity_map.get(literacy_level, complexity_map['medium'])}
@@ -178,50 +994,53 @@ class AIService:
         
         Simplified version:
         """
-        
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
-        except Exception as e:
-            logger.error(f"Error simplifying text: {str(e)}")
-            return text
     
-    def _build_system_prompt(self, language: str, literacy_level: str, context: Dict) -> str:
-        """Build system prompt based on user characteristics"""
+    def _summary_prompt(self, previous_summary: str, user_message: str, assistant_message: str, max_words: int) -> str:
+        """Prompt for folding a turn into the rolling summary"""
+        return f"""
+        You maintain a short running summary of a conversation between a user and SahaayAI,
+        an assistant for essential services (health, agriculture, finance, education,
+        government schemes, climate).
         
-        literacy_instructions = {
-            "low": "Use very simple language, short sentences, avoid technical terms. Explain everything step-by-step.",
-            "medium": "Use clear language, moderate complexity, explain technical terms when used.",
-            "high": "Use standard language, can include technical information with proper context."
-        }
+        Current summary:
+        {previous_summary or "(empty - this is the first turn)"}
         
-        system_prompt = f"""
-        You are SahaayAI, a compassionate AI assistant helping underserved communities access essential services like healthcare, government schemes, financial literacy, agriculture support, and education.
-
-        User Profile:
-        - Language: {language}
-        - Literacy Level: {literacy_level}
-        - Location: {context.get('location', 'Not specified')}
-        
-        Communication Guidelines:
-        - {literacy_instructions.get(literacy_level, literacy_instructions['medium'])}
-        - Be empathetic, patient, and respectful
-        - Provide actionable, practical advice
-        - Focus on immediate help and clear next steps
-        - Ask clarifying questions when needed
-        - Always prioritize user safety and well-being
-        - Provide information about local resources when possible
-        - Respect cultural context and sensitivities
-        
-        Response Format:
-        - Start with acknowledging the user's concern
-        - Provide clear, numbered steps when giving instructions
-        - End with asking if they need more help
-        - Keep responses concise but complete
-        
-        Remember: You're helping people who may be in difficult situations, have limited resources, and need clear, actionable guidance.
+        Latest turn:
+        User: {user_message}
+        Assistant: {assistant_message[:1500]}
+        
+        Rewrite the summary to include the latest turn. Keep the user's situation, stated facts
+        (location, documents they have or lack, eligibility details), schemes discussed and open
+        questions. Drop greetings and repetition. Write in English, at most {max_words} words,
+        as plain sentences without headings.
         """
+    
+    def _build_system_prompt(
+        self,
+        language: str,
+        literacy_level: str,
+        context: Dict,
+        user_message: str = ""
+    ) -> str:
+        """
+        Build system prompt based on user characteristics
         
+        Knowledge base passages retrieved for user_message are appended, so
+        facts come from the knowledge base instead of the model's memory.
+        """
+        system_prompt = prompt_registry.render(
+            domain=(context.get("intent") or {}).get("domain", "general"),
+            language=language,
+            literacy_level=literacy_level,
+            location=context.get("location"),
+            conversation_summary=context.get("conversation_summary")
+        )
+        knowledge = knowledge_retriever.context_for(user_message)
+        if knowledge:
+            system_prompt += (
+                "\n\nReference information (prefer these facts, and do not invent scheme details):\n"
+                f"{knowledge}"
+            )
         return system_prompt
 
 # Initialize singleton
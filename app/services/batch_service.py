@@ -0,0 +1,330 @@
+"""
+Batch question answering
+Runs NDJSON or CSV files of beneficiary questions through the message
+pipeline with bounded parallelism. Each finished row is appended to a results
+file as it completes, so an interrupted batch resumes where it stopped.
+
+Usage:
+    python -m app.services.batch_service questions.csv -o answers.ndjson
+    python -m app.services.batch_service questions.ndjson -o answers.ndjson --concurrency 8
+"""
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import json
+
+from app.config import settings
+from app.services.message_pipeline import message_pipeline
+from app.services.translation_service import translation_service
+from app.utils.logger import logger
+from app.utils.validation import sanitize_input, validate_message_content
+
+# Optional per-row fields copied from the input
+ROW_FIELDS = ["language", "literacy_level", "location"]
+
+# Channel every batch row is answered on, whatever the file says: its LLM
+# calls queue behind live traffic and do not get a live channel's deadline
+BATCH_CHANNEL = "batch"
+
+# Column names accepted for the question text
+MESSAGE_FIELDS = ["message", "question", "query", "text"]
+
+# Row statuses kept in the results file; any other status is retried on resume
+FINAL_STATUSES = ("ok", "rejected")
+
+
+class BatchFormatError(ValueError):
+    """Raised when a batch file cannot be parsed"""
+
+
+def detect_format(text: str) -> str:
+    """Guess "ndjson" or "csv" from the first non-empty line"""
+    for line in text.splitlines():
+        if line.strip():
+            return "ndjson" if line.lstrip().startswith("{") else "csv"
+    return "ndjson"
+
+
+def parse_batch(text: str, fmt: Optional[str] = None) -> List[Dict]:
+    """
+    Parse a batch file into rows
+
+    Rows without an id are numbered by position, so re-submitting the same
+    file gives the same ids.
+
+    Args:
+        text: File contents
+        fmt: "ndjson" or "csv"; detected from the content when omitted
+
+    Returns:
+        List of dicts with id, message and the optional ROW_FIELDS
+
+    Raises:
+        BatchFormatError: on malformed lines, missing questions or duplicate ids
+    """
+    fmt = (fmt or detect_format(text)).lower()
+    if fmt == "ndjson":
+        records = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise BatchFormatError(f"Line {number}: invalid JSON ({str(e)})")
+            if not isinstance(record, dict):
+                raise BatchFormatError(f"Line {number}: expected a JSON object")
+            records.append(record)
+    elif fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text.lstrip("﻿")))
+        records = [
+            # Cells past the header row land under a None key and are dropped
+            {key.strip().lower(): (value or "").strip() for key, value in row.items() if key is not None}
+            for row in reader
+        ]
+    else:
+        raise BatchFormatError(f"Unsupported batch format: {fmt}")
+
+    rows = []
+    seen = set()
+    for index, record in enumerate(records, start=1):
+        message = next((record[field] for field in MESSAGE_FIELDS if record.get(field)), None)
+        if not message:
+            raise BatchFormatError(f"Row {index}: no question in any of {MESSAGE_FIELDS}")
+        row_id = str(record.get("id") or index)
+        if row_id in seen:
+            raise BatchFormatError(f"Row {index}: duplicate id {row_id}")
+        seen.add(row_id)
+
+        row = {"id": row_id, "message": str(message)}
+        for field in ROW_FIELDS:
+            if record.get(field):
+                row[field] = str(record[field])
+        rows.append(row)
+    return rows
+
+
+def batch_id_for(text: str) -> str:
+    """Stable id for a batch file, so an identical upload resumes the same batch"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def load_results(path: Path) -> Dict[str, Dict]:
+    """
+    Read finished rows from a results file
+
+    A partially written last line (from an interrupted run) is ignored.
+    """
+    results = {}
+    if not path.exists():
+        return results
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and "id" in record:
+                results[str(record["id"])] = record
+    return results
+
+
+class BatchProcessor:
+    """
+    Answers batches of questions through the message pipeline
+
+    At most `concurrency` rows are in the pipeline at a time, and their LLM
+    calls are queued behind live requests, so a large batch cannot take
+    LLM slots from live traffic; repeated questions
+    are served from the response cache. Rows that answered (or were rejected
+    by the guardrails) are written to the results file; failed rows, and rows
+    answered without the LLM during an outage ("degraded"), are not, so the
+    next run retries them.
+    """
+
+    def __init__(self):
+        self.storage_dir = Path(settings.FILE_STORAGE_PATH) / "batches"
+        self.concurrency = settings.BATCH_CONCURRENCY
+        self._stats = {"batches": 0, "answered": 0, "rejected": 0, "degraded": 0, "failed": 0, "resumed": 0}
+
+    def input_path(self, batch_id: str) -> Path:
+        return self.storage_dir / f"{batch_id}.input"
+
+    def results_path(self, batch_id: str) -> Path:
+        return self.storage_dir / f"{batch_id}.ndjson"
+
+    def save_input(self, batch_id: str, text: str, fmt: str):
+        """Keep the uploaded file so the batch can be resumed by id"""
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        path = self.input_path(batch_id)
+        if not path.exists():
+            path.write_text(json.dumps({"format": fmt, "text": text}), encoding="utf-8")
+
+    def load_input(self, batch_id: str) -> Optional[Dict]:
+        path = self.input_path(batch_id)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def progress(self, batch_id: str) -> Optional[Dict]:
+        """Completed and total rows for a stored batch, or None if unknown"""
+        stored = self.load_input(batch_id)
+        if stored is None:
+            return None
+        total = len(parse_batch(stored["text"], stored["format"]))
+        completed = len(load_results(self.results_path(batch_id)))
+        return {
+            "batch_id": batch_id,
+            "total": total,
+            "completed": completed,
+            "finished": completed >= total
+        }
+
+    async def run(
+        self,
+        rows: List[Dict],
+        results_path: Path,
+        concurrency: Optional[int] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Answer rows, yielding each result as it completes
+
+        Rows already in results_path are yielded first (marked "resumed")
+        and not answered again. Closing the iterator cancels rows in flight.
+        """
+        self._stats["batches"] += 1
+        done = load_results(results_path)
+        for row in rows:
+            if row["id"] in done:
+                self._stats["resumed"] += 1
+                yield {**done[row["id"]], "resumed": True}
+
+        pending: asyncio.Queue = asyncio.Queue()
+        for row in rows:
+            if row["id"] not in done:
+                pending.put_nowait(row)
+        if pending.empty():
+            return
+
+        finished: asyncio.Queue = asyncio.Queue()
+        workers = [
+            asyncio.create_task(self._worker(pending, finished))
+            for _ in range(min(concurrency or self.concurrency, pending.qsize()))
+        ]
+        remaining = pending.qsize()
+
+        results_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with open(results_path, "a", encoding="utf-8") as out:
+                while remaining:
+                    result = await finished.get()
+                    remaining -= 1
+                    if result["status"] in FINAL_STATUSES:
+                        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                        out.flush()
+                    yield result
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def answer(self, row: Dict) -> Dict:
+        """Answer one row; never raises"""
+        result = {"id": row["id"]}
+        try:
+            message = sanitize_input(row["message"])
+            validation = validate_message_content(message)
+            if not validation["is_valid"]:
+                self._stats["rejected"] += 1
+                return {**result, "status": "rejected", "response_text": validation["message"]}
+
+            language = row.get("language") or translation_service.detect_language(message)
+            literacy_level = row.get("literacy_level") or settings.DEFAULT_LITERACY_LEVEL
+            user_context = {
+                "location": row.get("location"),
+                "conversation_summary": "",
+                "literacy_level": literacy_level,
+                "channel": BATCH_CHANNEL,
+                "language": language
+            }
+            answer = await message_pipeline.run(
+                user_message=message,
+                user_context=user_context,
+                language=language,
+                literacy_level=literacy_level
+            )
+        except Exception as e:
+            logger.error(f"Batch row {row['id']} failed: {str(e)}")
+            self._stats["failed"] += 1
+            return {**result, "status": "error", "error": str(e)}
+
+        if not answer.get("success", True):
+            self._stats["failed"] += 1
+            return {**result, "status": "error", "error": "LLM call failed"}
+
+        if answer.get("degraded"):
+            # A stand-in answer from the outage fallbacks; returned, but retried on resume
+            self._stats["degraded"] += 1
+            status = "degraded"
+        else:
+            self._stats["answered"] += 1
+            status = "ok"
+        return {
+            **result,
+            "status": status,
+            "language": language,
+            "intent": answer["intent"],
+            "response_text": answer["response_text"],
+            "action_plan": answer["action_plan"]
+        }
+
+    def get_stats(self) -> Dict:
+        return dict(self._stats, concurrency=self.concurrency)
+
+    async def _worker(self, pending: asyncio.Queue, finished: asyncio.Queue):
+        while not pending.empty():
+            row = pending.get_nowait()
+            await finished.put(await self.answer(row))
+
+# Initialize singleton
+batch_processor = BatchProcessor()
+
+
+async def _run_file(args) -> Dict[str, int]:
+    text = Path(args.input).read_text(encoding="utf-8")
+    rows = parse_batch(text, args.format)
+    output = Path(args.output or f"{Path(args.input).with_suffix('')}.results.ndjson")
+
+    counts = {"ok": 0, "rejected": 0, "degraded": 0, "error": 0, "resumed": 0}
+    async for result in batch_processor.run(rows, output, args.concurrency):
+        counts["resumed" if result.get("resumed") else result["status"]] += 1
+        finished = sum(counts.values())
+        if finished % 50 == 0 or finished == len(rows):
+            print(f"{finished}/{len(rows)} rows", flush=True)
+    print(f"Results written to {output}")
+    return counts
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Answer a file of questions through the message pipeline")
+    parser.add_argument("input", help="NDJSON or CSV file with a message (or question) column")
+    parser.add_argument("-o", "--output", help="Results file (NDJSON); existing rows are skipped on rerun")
+    parser.add_argument("--format", choices=["ndjson", "csv"])
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY)
+    args = parser.parse_args(argv)
+
+    counts = asyncio.run(_run_file(args))
+    print(
+        f"Answered {counts['ok']}, rejected {counts['rejected']}, answered without the LLM {counts['degraded']}, "
+        f"failed {counts['error']}, already done {counts['resumed']}"
+    )
+    if counts["error"] or counts["degraded"]:
+        print("Rerun the same command to retry failed and degraded rows")
+
+
+if __name__ == "__main__":
+    main()
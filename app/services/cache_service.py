@@ -0,0 +1,187 @@
+"""
+Response cache for AI service calls
+Keeps an in-process LRU with TTL and optionally shares entries through Redis
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import time
+
+from app.config import settings
+from app.utils.logger import logger
+from app.utils.text import normalize_text
+
+
+class ResponseCache:
+    """
+    Two-level cache for LLM results
+
+    Values are stored as JSON strings so cached dicts can never be mutated
+    by callers, and so the same payload can be written to Redis as-is.
+    Other stores (such as degraded mode's remembered answers) are separate
+    instances with their own TTL and size cap, so they are never evicted by
+    regular traffic.
+    """
+
+    def __init__(
+        self,
+        name: str = "response",
+        enabled: Optional[bool] = None,
+        ttl_seconds: Optional[int] = None,
+        max_entries: Optional[int] = None
+    ):
+        self.name = name
+        self.enabled = settings.CACHE_ENABLED if enabled is None else enabled
+        self.ttl_seconds = settings.CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = max(1, settings.CACHE_MAX_ENTRIES if max_entries is None else max_entries)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "memory_hits": 0,
+            "redis_hits": 0,
+            "evictions": 0,
+            "redis_errors": 0
+        }
+        self._task_stats: Dict[str, Dict[str, int]] = {}
+
+        self.redis = None
+        if self.enabled and settings.REDIS_ENABLED:
+            try:
+                import redis.asyncio as redis_asyncio
+
+                self.redis = redis_asyncio.Redis(
+                    host=settings.REDIS_HOST,
+                    port=settings.REDIS_PORT,
+                    db=settings.REDIS_DB,
+                    password=settings.REDIS_PASSWORD or None
+                )
+                logger.info(f"{self.name.capitalize()} cache using Redis at {settings.REDIS_HOST}:{settings.REDIS_PORT}")
+            except ImportError:
+                logger.warning(f"redis package not installed - {self.name} cache is in-process only")
+
+        logger.info(
+            f"{self.name.capitalize()} cache initialized (enabled: {self.enabled}, "
+            f"ttl: {self.ttl_seconds}s, max entries: {self.max_entries})"
+        )
+
+    def make_key(
+        self,
+        task: str,
+        text: str,
+        language: str = "",
+        literacy_level: str = "",
+        domain: str = "",
+        context: str = "",
+        channel: str = "",
+        location: str = ""
+    ) -> str:
+        """
+        Build a cache key from the normalized query and the user characteristics
+        that change the answer
+        
+        context carries anything else baked into the prompt (such as a
+        conversation summary) so follow-ups are never answered from another
+        conversation's entry. channel matters because replies are budgeted
+        per channel (a short SMS answer must not be served on the web), and
+        location because prompts name the user's district, so a reply
+        tailored to one district must not be served in another.
+        """
+        raw = "|".join([
+            normalize_text(text), language or "", literacy_level or "", domain or "", context or "", channel or "",
+            location or ""
+        ])
+        digest = hashlib.sha256(raw.encode()).hexdigest()
+        return f"sahaayai:cache:{task}:{digest}"
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Return a cached value, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        task = self._task_from_key(key)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            payload, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._record(task, hit=True, source="memory_hits")
+                return json.loads(payload)
+            del self._entries[key]
+
+        if self.redis is not None:
+            try:
+                payload = await self.redis.get(key)
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning(f"Redis cache read failed: {str(e)}")
+                payload = None
+
+            if payload is not None:
+                if isinstance(payload, bytes):
+                    payload = payload.decode()
+                self._store_local(key, payload)
+                self._record(task, hit=True, source="redis_hits")
+                return json.loads(payload)
+
+        self._record(task, hit=False)
+        return None
+
+    async def set(self, key: str, value: Any):
+        """Store a value under key for the cache's TTL"""
+        if not self.enabled:
+            return
+
+        payload = json.dumps(value, ensure_ascii=False)
+        self._store_local(key, payload)
+
+        if self.redis is not None:
+            try:
+                await self.redis.set(key, payload, ex=self.ttl_seconds)
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                logger.warning(f"Redis cache write failed: {str(e)}")
+
+    def clear(self):
+        """Drop all in-process entries"""
+        self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters for the metrics endpoint"""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "backend": "memory+redis" if self.redis is not None else "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            "by_task": self._task_stats
+        }
+
+    def _store_local(self, key: str, payload: str):
+        self._entries[key] = (payload, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _record(self, task: str, hit: bool, source: Optional[str] = None):
+        task_stats = self._task_stats.setdefault(task, {"hits": 0, "misses": 0})
+        if hit:
+            self._stats["hits"] += 1
+            self._stats[source] += 1
+            task_stats["hits"] += 1
+        else:
+            self._stats["misses"] += 1
+            task_stats["misses"] += 1
+
+    @staticmethod
+    def _task_from_key(key: str) -> str:
+        parts = key.split(":")
+        return parts[2] if len(parts) > 3 else "unknown"
+
+# Initialize singleton
+response_cache = ResponseCache()
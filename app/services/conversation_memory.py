@@ -0,0 +1,129 @@
+"""
+Rolling conversation memory
+Keeps a fixed-size summary per conversation so prompts carry context without
+re-sending (or re-decrypting) the full message log.
+"""
+from datetime import datetime
+from typing import Dict, Optional, Set
+import asyncio
+
+from app.config import settings
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, Conversation, ActionPlan
+from app.services.ai_service import ai_service
+from app.services.multimodal_service import multimodal_service
+from app.utils.encryption import encryption_service
+from app.utils.logger import logger
+
+
+class ConversationMemory:
+    """
+    Maintains the encrypted rolling summary stored on each Conversation
+
+    Summaries are updated in background tasks after a reply has been sent,
+    so they never add latency to the turn that produced them. Updates for
+    the same conversation are serialized so no turn is lost.
+    """
+
+    def __init__(self):
+        self.enabled = settings.CONVERSATION_SUMMARY_ENABLED
+        self.max_words = settings.CONVERSATION_SUMMARY_MAX_WORDS
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._lock_users: Dict[int, int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {"scheduled": 0, "updated": 0, "failed": 0}
+
+    def get_summary(self, conversation: Conversation) -> str:
+        """Return the decrypted summary for a conversation, or an empty string"""
+        if not self.enabled or not conversation.summary_encrypted:
+            return ""
+        try:
+            return encryption_service.decrypt(conversation.summary_encrypted)
+        except Exception as e:
+            logger.error(f"Error decrypting summary for conversation {conversation.id}: {str(e)}")
+            return ""
+
+    def schedule_update(self, conversation_id: int, user_message: str, assistant_message: str):
+        """Fold a finished turn into the summary in the background"""
+        if not self.enabled:
+            return
+
+        self._stats["scheduled"] += 1
+        task = asyncio.create_task(self.update_summary(conversation_id, user_message, assistant_message))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def update_summary(self, conversation_id: int, user_message: str, assistant_message: str):
+        """Fold one turn into the stored summary using its own database session"""
+        lock = self._locks.setdefault(conversation_id, asyncio.Lock())
+        self._lock_users[conversation_id] = self._lock_users.get(conversation_id, 0) + 1
+        try:
+            async with lock:
+                await self._fold_turn(conversation_id, user_message, assistant_message)
+        finally:
+            self._lock_users[conversation_id] -= 1
+            if not self._lock_users[conversation_id]:
+                del self._lock_users[conversation_id]
+                del self._locks[conversation_id]
+
+    async def _fold_turn(self, conversation_id: int, user_message: str, assistant_message: str):
+        db = SessionLocal()
+        try:
+            conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+            if not conversation:
+                return
+
+            previous_summary = self.get_summary(conversation)
+            summary = await ai_service.summarize_conversation(
+                previous_summary=previous_summary,
+                user_message=user_message,
+                assistant_message=assistant_message,
+                max_words=self.max_words
+            )
+            if not summary or summary == previous_summary:
+                self._stats["failed"] += 1
+                return
+
+            conversation.summary_encrypted = encryption_service.encrypt(summary)
+            conversation.summary_turns = (conversation.summary_turns or 0) + 1
+            conversation.summary_updated_at = datetime.utcnow()
+            db.commit()
+            self._stats["updated"] += 1
+            logger.info(f"Updated summary for conversation {conversation_id}")
+
+        except Exception as e:
+            self._stats["failed"] += 1
+            logger.error(f"Error updating summary for conversation {conversation_id}: {str(e)}")
+        finally:
+            db.close()
+
+    async def get_summary_card(self, db: Session, conversation: Conversation) -> Optional[Dict]:
+        """Build a conversation summary card from the rolling summary and latest action plan"""
+        summary = self.get_summary(conversation)
+        if not summary:
+            return None
+
+        latest_plan = (
+            db.query(ActionPlan)
+            .filter(ActionPlan.conversation_id == conversation.id)
+            .order_by(ActionPlan.id.desc())
+            .first()
+        )
+        steps = latest_plan.steps or [] if latest_plan else []
+        documents = latest_plan.documents_required or [] if latest_plan else []
+
+        return await multimodal_service.generate_summary_card({
+            "timestamp": (conversation.summary_updated_at or datetime.utcnow()).isoformat(),
+            "key_points": [sentence.strip() + "." for sentence in summary.split(".") if sentence.strip()],
+            "action_items": [f"Keep ready: {document}" for document in documents],
+            "next_steps": [step.get("action", "") for step in steps[:3] if isinstance(step, dict)]
+        })
+
+    def get_stats(self) -> Dict:
+        """Summary update counters for the metrics endpoint"""
+        return {**self._stats, "pending": len(self._tasks)}
+
+# Initialize singleton
+conversation_memory = ConversationMemory()
@@ -0,0 +1,186 @@
+"""
+Degraded-mode serving
+Answers messages without the LLM while it is failing, from remembered
+answers, the FAQ store and keyword-matched knowledge base entries
+"""
+from typing import Dict, Optional, Set
+import copy
+
+from app.config import settings
+from app.services.ai_service import ai_service
+from app.services.cache_service import ResponseCache
+from app.services.faq_service import faq_service
+from app.services.intent_classifier import intent_classifier
+from app.services.knowledge_base import get_schemes
+from app.utils.logger import logger
+from app.utils.text import tokenize
+
+# Appended to degraded answers for urgent messages, which would otherwise get emergency guidance from the LLM
+EMERGENCY_NOTE = "If this is an emergency, call 112 now (108 for an ambulance)."
+
+# Distinct keywords a message must share with a scheme before it is served
+MIN_KEYWORD_OVERLAP = 2
+
+# Keywords are compared on their first letters, so "farmer" matches "farmers"
+STEM_LENGTH = 5
+
+
+def _stems(text: str) -> Set[str]:
+    return {token[:STEM_LENGTH] for token in tokenize(text) if len(token) > 2}
+
+
+class DegradedMode:
+    """
+    Keeps answering while the LLM circuit breaker is open
+
+    Successful answers to context-free questions are remembered under the
+    question and the user's location (ignoring channel and conversation), so
+    during an outage they can be served to anyone there asking the same
+    thing. Otherwise the FAQ
+    store is searched with a looser threshold, then the knowledge base by
+    keyword. Messages none of these can answer still go to the LLM path,
+    which fails fast and returns its apology.
+    """
+
+    def __init__(self):
+        self.enabled = settings.DEGRADED_MODE_ENABLED
+        self.faq_threshold = settings.DEGRADED_FAQ_THRESHOLD
+        # Kept apart from the response cache, so regular traffic does not evict them before an outage
+        self.memory = ResponseCache(
+            name="fallback",
+            enabled=self.enabled,
+            ttl_seconds=settings.DEGRADED_MEMORY_TTL_SECONDS,
+            max_entries=settings.DEGRADED_MEMORY_MAX_ENTRIES
+        )
+        self._scheme_keywords: Optional[Dict[str, Set[str]]] = None
+        self._stats = {
+            "served": {"cache": 0, "faq": 0, "knowledge_base": 0},
+            "unanswered": 0,
+            "remembered": 0
+        }
+
+    @property
+    def mode(self) -> str:
+        """normal, degraded (LLM failing, serving without it) or overloaded (optional LLM work skipped)"""
+        if ai_service.is_degraded:
+            return "degraded"
+        if ai_service.is_overloaded:
+            return "overloaded"
+        return "normal"
+
+    @property
+    def active(self) -> bool:
+        return self.enabled and ai_service.is_degraded
+
+    async def remember(
+        self, user_message: str, language: str, literacy_level: str, result: Dict, location: Optional[str] = None
+    ):
+        """Keep a successful pipeline answer for serving during outages"""
+        if not self.enabled or not result.get("success", True):
+            return
+        await self.memory.set(self._key(user_message, language, literacy_level, location), {
+            "intent": result["intent"],
+            "response_text": result["response_text"],
+            "action_plan": result.get("action_plan")
+        })
+        self._stats["remembered"] += 1
+
+    async def answer(
+        self, user_message: str, language: str, literacy_level: str, location: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Answer a message without the LLM
+
+        Remembered answers are only served to users in the same location,
+        since the prompts that produced them named it.
+
+        Returns:
+            Dict with intent, response_text, action_plan (remembered answers
+            only) and source (cache/faq/knowledge_base), or None
+        """
+        if not self.enabled:
+            return None
+
+        intent_data = intent_classifier.classify(user_message)
+        remembered = await self.memory.get(self._key(user_message, language, literacy_level, location))
+        if remembered is not None:
+            result = dict(remembered)
+            source = "cache"
+        else:
+            result = self._faq_answer(user_message, language, literacy_level)
+            source = "faq"
+            if result is None:
+                result = self._knowledge_base_answer(user_message, language)
+                source = "knowledge_base"
+            if result is None:
+                self._stats["unanswered"] += 1
+                return None
+            result["intent"] = {**intent_data, "domain": result.pop("domain"), "confidence": 1.0}
+
+        result["intent"] = {**result["intent"], "source": "degraded"}
+        if intent_data["urgency"] == "high":
+            result["response_text"] = f"{result['response_text']}\n\n{EMERGENCY_NOTE}"
+
+        self._stats["served"][source] += 1
+        logger.info(f"Degraded mode answered from {source}")
+        return {**result, "source": source}
+
+    def match_scheme(self, text: str, domain: Optional[str] = None) -> Optional[Dict]:
+        """Scheme sharing the most keywords with a message, if it shares at least MIN_KEYWORD_OVERLAP"""
+        if self._scheme_keywords is None:
+            self._scheme_keywords = {
+                scheme["id"]: _stems(" ".join([
+                    scheme["name"],
+                    *scheme.get("description", {}).values(),
+                    *scheme.get("eligibility", {}).get("criteria", [])
+                ]))
+                for scheme in get_schemes()
+            }
+
+        stems = _stems(text)
+        best, best_overlap = None, MIN_KEYWORD_OVERLAP - 1
+        for scheme in get_schemes():
+            if domain and scheme.get("domain") != domain:
+                continue
+            overlap = len(stems & self._scheme_keywords.get(scheme["id"], set()))
+            if overlap > best_overlap:
+                best, best_overlap = scheme, overlap
+        return best
+
+    def get_stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            **copy.deepcopy(self._stats),
+            "memory": {key: value for key, value in self.memory.get_stats().items() if key != "by_task"}
+        }
+
+    def _faq_answer(self, user_message: str, language: str, literacy_level: str) -> Optional[Dict]:
+        faq = faq_service.match(user_message, language, literacy_level, threshold=self.faq_threshold)
+        if faq is None:
+            return None
+        return {
+            "response_text": faq["answer"],
+            "action_plan": None,
+            "domain": faq["domain"]
+        }
+
+    def _knowledge_base_answer(self, user_message: str, language: str) -> Optional[Dict]:
+        scheme = self.match_scheme(user_message)
+        if scheme is None:
+            return None
+        description = scheme.get("description", {})
+        lines = [f"{scheme['name']}: {description.get(language) or description.get('en', '')}"]
+        if scheme.get("helpline"):
+            lines.append(f"Helpline: {scheme['helpline']}")
+        return {
+            "response_text": "\n".join(lines),
+            "action_plan": None,
+            "domain": scheme.get("domain", "government_schemes")
+        }
+
+    def _key(self, user_message: str, language: str, literacy_level: str, location: Optional[str]) -> str:
+        return self.memory.make_key("fallback", user_message, language, literacy_level, location=location or "")
+
+# Initialize singleton
+degraded_mode = DegradedMode()
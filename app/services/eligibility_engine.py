@@ -0,0 +1,352 @@
+"""
+Eligibility rules engine
+Compiles the eligibility criteria of the scheme knowledge base into
+structured predicates over user attributes and checks a user against every
+scheme at once, without the LLM.
+
+Criteria are read from eligibility.rules when a scheme has them, e.g.
+{"age": [18, 50], "has_bank_account": true, "occupation": ["farmer"]},
+and otherwise parsed from the criteria text ("Age: 18-50 years",
+"Must have savings bank account", "Small and marginal farmers").
+
+Usage:
+    python -m app.services.eligibility_engine rules
+    python -m app.services.eligibility_engine check age=30 has_bank_account=yes occupation=farmer
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import math
+import re
+import time
+
+import numpy as np
+
+from app.services.knowledge_base import get_schemes
+from app.utils.logger import logger
+
+# User attributes the rules can test, by kind
+NUMERIC_ATTRIBUTES = ["age", "annual_income", "land_acres"]
+BOOLEAN_ATTRIBUTES = ["has_bank_account", "owns_land", "in_secc", "bpl_card"]
+CATEGORICAL_ATTRIBUTES = ["gender", "occupation", "state"]
+ATTRIBUTES = NUMERIC_ATTRIBUTES + BOOLEAN_ATTRIBUTES + CATEGORICAL_ATTRIBUTES
+
+# Questions to ask for attributes a check is missing
+ATTRIBUTE_QUESTIONS = {
+    "age": "How old are you?",
+    "annual_income": "What is your family's yearly income?",
+    "land_acres": "How much land do you have (in acres)?",
+    "has_bank_account": "Do you have a savings bank account?",
+    "owns_land": "Do you own or cultivate farm land?",
+    "in_secc": "Is your family listed in the SECC database (check at the CSC)?",
+    "bpl_card": "Do you have a BPL card?",
+    "gender": "Are you male or female?",
+    "occupation": "What work do you do?",
+    "state": "Which state do you live in?"
+}
+
+TRUE_VALUES = {"yes", "y", "true", "1", "haan", "ha", "हाँ", "हां"}
+FALSE_VALUES = {"no", "n", "false", "0", "nahi", "नहीं"}
+
+
+def _lakh(match: re.Match) -> float:
+    amount = float(match.group(1).replace(",", ""))
+    return amount * 100000 if match.group(2) else amount
+
+
+# Criterion text patterns and the rule each one implies
+CRITERIA_PATTERNS: List[Tuple[re.Pattern, Callable[[re.Match], Dict]]] = [
+    (re.compile(r"age\D{0,5}(\d+)\s*(?:-|to)\s*(\d+)"), lambda m: {"age": [int(m.group(1)), int(m.group(2))]}),
+    (re.compile(r"(\d+)\s*years?\s*(?:and|or)\s*(?:above|older)|(?:above|over|at least)\s*(\d+)\s*years"),
+     lambda m: {"age": [int(m.group(1) or m.group(2)), None]}),
+    (re.compile(r"(?:below|under|up to)\s*(\d+)\s*years"), lambda m: {"age": [None, int(m.group(1))]}),
+    (re.compile(r"income\D{0,20}(?:below|under|less than|up to|upto)\s*(?:rs\.?|₹)?\s*([\d,.]+)\s*(lakh)?"),
+     lambda m: {"annual_income": [None, _lakh(m)]}),
+    (re.compile(r"bank account"), lambda m: {"has_bank_account": True}),
+    (re.compile(r"cultivable land|land ?holding|own(?:s|ing)? land"), lambda m: {"owns_land": True}),
+    (re.compile(r"\bsecc\b"), lambda m: {"in_secc": True}),
+    (re.compile(r"\bbpl\b|below poverty line"), lambda m: {"bpl_card": True}),
+    (re.compile(r"\bfarmers?\b"), lambda m: {"occupation": ["farmer"]}),
+    (re.compile(r"\bstudents?\b"), lambda m: {"occupation": ["student"]}),
+    (re.compile(r"\b(?:women|woman|girls?|female|widows?|pregnant)\b"), lambda m: {"gender": ["female"]}),
+    (re.compile(r"resident of ([a-z ]+)"), lambda m: {"state": [m.group(1).strip()]})
+]
+
+
+def _merge(rules: Dict, new: Dict, sources: Dict, criterion: str):
+    """Add a criterion's rules; numeric ranges are intersected, other rules keep the first"""
+    for attribute, value in new.items():
+        if attribute in NUMERIC_ATTRIBUTES and attribute in rules:
+            low, high = rules[attribute]
+            low = value[0] if low is None else low if value[0] is None else max(low, value[0])
+            high = value[1] if high is None else high if value[1] is None else min(high, value[1])
+            rules[attribute] = [low, high]
+        elif attribute in rules:
+            continue
+        else:
+            rules[attribute] = value
+        sources.setdefault(attribute, criterion)
+
+
+def compile_rules(scheme: Dict) -> Tuple[Dict, Dict[str, str]]:
+    """
+    Structured rules for a scheme, and the criterion each rule came from
+
+    Returns:
+        (rules, sources): rules map attributes to a [min, max] range, a
+        required boolean or a list of allowed values
+    """
+    eligibility = scheme.get("eligibility", {})
+    rules: Dict = {}
+    sources: Dict[str, str] = {}
+    explicit = eligibility.get("rules") or {}
+    for attribute, value in explicit.items():
+        if attribute not in ATTRIBUTES:
+            logger.warning(f"Scheme {scheme.get('id')}: unknown eligibility attribute {attribute}")
+            continue
+        if attribute in NUMERIC_ATTRIBUTES and isinstance(value, dict):
+            value = [value.get("min"), value.get("max")]
+        elif attribute in CATEGORICAL_ATTRIBUTES:
+            value = [_normalize(item) for item in (value if isinstance(value, list) else [value])]
+        rules[attribute] = value
+        sources[attribute] = f"{attribute}: {value}"
+
+    for criterion in eligibility.get("criteria", []):
+        for pattern, rule in CRITERIA_PATTERNS:
+            match = pattern.search(criterion.lower())
+            if match:
+                _merge(rules, {k: v for k, v in rule(match).items() if k not in explicit}, sources, criterion)
+    return rules, sources
+
+
+def _normalize(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = re.sub(r"\s+", " ", str(value)).strip().lower()
+    if value.endswith("s") and value[:-1] in ("farmer", "student"):
+        value = value[:-1]
+    return value or None
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _flag(value) -> float:
+    if isinstance(value, bool):
+        return float(value)
+    value = _normalize(value)
+    if value in TRUE_VALUES:
+        return 1.0
+    if value in FALSE_VALUES:
+        return 0.0
+    return math.nan
+
+
+def attributes_from_context(user_context: Dict) -> Dict:
+    """User attributes found in a user context (location stands in for state)"""
+    attributes = {attribute: user_context[attribute] for attribute in ATTRIBUTES if user_context.get(attribute) is not None}
+    location = user_context.get("location")
+    if "state" not in attributes and isinstance(location, str) and location:
+        attributes["state"] = location.split(",")[-1]
+    return attributes
+
+
+class EligibilityEngine:
+    """
+    Checks user attributes against every scheme's rules in one pass
+
+    Rules are compiled into per-scheme arrays: numeric bounds, required
+    booleans and allowed-value masks. A check compares one user vector with
+    all rows, so its cost grows with the number of schemes only through
+    NumPy's inner loops.
+    """
+
+    def __init__(self):
+        self._schemes: Optional[List[Dict]] = None
+        self._stats = {"checks": 0, "total_us": 0.0, "max_us": 0.0}
+
+    def load(self, schemes: Optional[List[Dict]] = None):
+        """Compile the rules of schemes (the knowledge base by default)"""
+        schemes = get_schemes() if schemes is None else schemes
+        count = len(schemes)
+        compiled = [compile_rules(scheme) for scheme in schemes]
+
+        self._low = np.full((count, len(NUMERIC_ATTRIBUTES)), -np.inf)
+        self._high = np.full((count, len(NUMERIC_ATTRIBUTES)), np.inf)
+        self._required = np.zeros((count, len(BOOLEAN_ATTRIBUTES)), dtype=np.int8)
+        self._vocab: Dict[str, Dict[str, int]] = {attribute: {} for attribute in CATEGORICAL_ATTRIBUTES}
+        for rules, _ in compiled:
+            for attribute in CATEGORICAL_ATTRIBUTES:
+                for value in rules.get(attribute, []):
+                    self._vocab[attribute].setdefault(value, len(self._vocab[attribute]))
+        self._allowed = {
+            attribute: np.zeros((count, len(vocab)), dtype=bool) for attribute, vocab in self._vocab.items()
+        }
+        self._categorical = np.zeros((count, len(CATEGORICAL_ATTRIBUTES)), dtype=bool)
+
+        for row, (rules, _) in enumerate(compiled):
+            for column, attribute in enumerate(NUMERIC_ATTRIBUTES):
+                low, high = rules.get(attribute, [None, None])
+                self._low[row, column] = -np.inf if low is None else low
+                self._high[row, column] = np.inf if high is None else high
+            for column, attribute in enumerate(BOOLEAN_ATTRIBUTES):
+                if attribute in rules:
+                    self._required[row, column] = 1 if rules[attribute] else -1
+            for column, attribute in enumerate(CATEGORICAL_ATTRIBUTES):
+                for value in rules.get(attribute, []):
+                    self._allowed[attribute][row, self._vocab[attribute][value]] = True
+                    self._categorical[row, column] = True
+
+        self._numeric = np.isfinite(self._low) | np.isfinite(self._high)
+        self._domains = np.array([scheme.get("domain", "government_schemes") for scheme in schemes], dtype=object)
+        self._schemes = schemes
+        self._rules = compiled
+        logger.info(f"Compiled eligibility rules for {count} schemes")
+
+    def evaluate(self, attributes: Dict, domain: Optional[str] = None, include_ineligible: bool = True) -> List[Dict]:
+        """
+        Check a user against every scheme
+
+        Returns:
+            One dict per scheme, eligible first, then those needing more
+            information (fewest missing first), then ineligible ones. Each has
+            scheme_id, name, domain, status (eligible/maybe/ineligible),
+            unmet (criteria the user fails) and missing (attributes to ask for).
+            include_ineligible=False leaves out the ineligible schemes.
+        """
+        if self._schemes is None:
+            self.load()
+        started = time.perf_counter()
+
+        numbers = np.array([_number(attributes.get(attribute)) for attribute in NUMERIC_ATTRIBUTES])
+        flags = np.array([_flag(attributes.get(attribute)) for attribute in BOOLEAN_ATTRIBUTES])
+        violated_numeric = (numbers < self._low) | (numbers > self._high)
+        missing_numeric = self._numeric & np.isnan(numbers)
+        violated_boolean = ((self._required == 1) & (flags == 0)) | ((self._required == -1) & (flags == 1))
+        missing_boolean = (self._required != 0) & np.isnan(flags)
+
+        violated_categorical = np.zeros_like(self._categorical)
+        missing_categorical = np.zeros_like(self._categorical)
+        for column, attribute in enumerate(CATEGORICAL_ATTRIBUTES):
+            value = _normalize(attributes.get(attribute))
+            constrained = self._categorical[:, column]
+            if value is None:
+                missing_categorical[:, column] = constrained
+            elif value in self._vocab[attribute]:
+                violated_categorical[:, column] = constrained & ~self._allowed[attribute][:, self._vocab[attribute][value]]
+            else:
+                violated_categorical[:, column] = constrained
+
+        violated = np.hstack([violated_numeric, violated_boolean, violated_categorical])
+        missing = np.hstack([missing_numeric, missing_boolean, missing_categorical])
+        ineligible = violated.any(axis=1)
+        missing_counts = missing.sum(axis=1)
+        order = np.lexsort((missing_counts, ineligible))
+        if not include_ineligible:
+            order = order[~ineligible[order]]
+
+        if domain:
+            order = order[self._domains[order] == domain]
+
+        # Reasons are gathered only for the rows returned, from the nonzero cells
+        rows = order.tolist()
+        unmet: Dict[int, List[str]] = {}
+        for position, column in zip(*np.nonzero(violated[order])):
+            row = rows[position]
+            unmet.setdefault(row, []).append(self._rules[row][1][ATTRIBUTES[column]])
+        absent: Dict[int, List[str]] = {}
+        for position, column in zip(*np.nonzero(missing[order])):
+            absent.setdefault(rows[position], []).append(ATTRIBUTES[column])
+
+        elapsed_us = (time.perf_counter() - started) * 1_000_000
+        self._stats["checks"] += 1
+        self._stats["total_us"] += elapsed_us
+        self._stats["max_us"] = max(self._stats["max_us"], elapsed_us)
+
+        results = []
+        for row in rows:
+            scheme = self._schemes[row]
+            status = "ineligible" if row in unmet else "maybe" if row in absent else "eligible"
+            results.append({
+                "scheme_id": scheme["id"],
+                "name": scheme["name"],
+                "domain": scheme.get("domain", "government_schemes"),
+                "status": status,
+                "unmet": unmet.get(row, []),
+                "missing": absent.get(row, [])
+            })
+        return results
+
+    def eligible_schemes(self, attributes: Dict, domain: Optional[str] = None) -> Dict:
+        """
+        Schemes a user is likely eligible for
+
+        Returns:
+            Dict with eligible and maybe scheme lists, and the questions that
+            would settle the maybes
+        """
+        results = self.evaluate(attributes, domain, include_ineligible=False)
+        maybe = [result for result in results if result["status"] == "maybe"]
+        missing = sorted({attribute for result in maybe for attribute in result["missing"]}, key=ATTRIBUTES.index)
+        return {
+            "eligible": [result for result in results if result["status"] == "eligible"],
+            "maybe": maybe,
+            "questions": {attribute: ATTRIBUTE_QUESTIONS[attribute] for attribute in missing}
+        }
+
+    def check(self, scheme_id: str, attributes: Dict) -> Optional[Dict]:
+        """Result for one scheme, with its criteria and documents, or None for an unknown scheme"""
+        for result in self.evaluate(attributes):
+            if result["scheme_id"] == scheme_id:
+                scheme = next(scheme for scheme in self._schemes if scheme["id"] == scheme_id)
+                eligibility = scheme.get("eligibility", {})
+                return {
+                    **result,
+                    "criteria": eligibility.get("criteria", []),
+                    "documents": eligibility.get("documents", []),
+                    "how_to_apply": scheme.get("how_to_apply", {}).get("steps", [])
+                }
+        return None
+
+    def get_stats(self) -> Dict:
+        checks = self._stats["checks"]
+        return {
+            "schemes": len(self._schemes or []),
+            "checks": checks,
+            "avg_us": round(self._stats["total_us"] / checks, 1) if checks else 0.0,
+            "max_us": round(self._stats["max_us"], 1)
+        }
+
+# Initialize singleton
+eligibility_engine = EligibilityEngine()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect compiled eligibility rules or check a user")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("rules", help="Print the rules compiled for each scheme")
+
+    check_parser = subparsers.add_parser("check", help="Check attributes (name=value) against every scheme")
+    check_parser.add_argument("attributes", nargs="*", metavar="name=value")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "rules":
+        for scheme in get_schemes():
+            rules, _ = compile_rules(scheme)
+            print(f"{scheme['id']}: {json.dumps(rules, ensure_ascii=False)}")
+        return
+
+    attributes = dict(pair.split("=", 1) for pair in args.attributes if "=" in pair)
+    for result in eligibility_engine.evaluate(attributes):
+        detail = "; ".join(result["unmet"]) or ", ".join(result["missing"])
+        print(f"{result['status']:<10}  {result['scheme_id']:<10}  {detail}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+"""
+Offline FAQ answer engine
+Answers frequently asked questions from a precomputed store, matched with
+hashed character n-gram vectors, so common questions skip the LLM entirely.
+The store is rebuilt offline from the knowledge base and logged traffic.
+
+Usage:
+    python -m app.services.faq_service build
+    python -m app.services.faq_service build --from-db --min-count 3
+    python -m app.services.faq_service match "How can I apply for PM-KISAN?" --language en
+"""
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse
+import json
+import math
+import zlib
+
+from app.config import settings
+from app.services.knowledge_base import KNOWLEDGE_BASE_DIR, load_knowledge_base
+from app.services.scheme_library import scheme_aliases
+from app.utils.logger import logger
+from app.utils.text import char_ngrams, normalize_text
+
+FAQ_FILE = KNOWLEDGE_BASE_DIR / "faq.json"
+
+# Character n-gram sizes; robust to typos, inflections and transliteration variants
+NGRAM_SIZES = (3, 4, 5)
+
+# Hash buckets for n-grams, so the vocabulary never has to be stored
+HASH_BUCKETS = 1 << 20
+
+LITERACY_LEVELS = ["low", "medium", "high"]
+
+# Questions generated for every scheme; {name} is each name the scheme goes by
+SCHEME_QUESTIONS = {
+    "apply": ["How do I apply for {name}?", "How can I apply for {name}?", "How to apply for {name}?"],
+    "documents": ["What documents are needed for {name}?", "Which documents do I need for {name}?"],
+    "eligibility": ["Who is eligible for {name}?", "Am I eligible for {name}?"],
+    "about": ["What is {name}?", "Tell me about {name}"]
+}
+
+# Knowledge base guidance lists that answer a fixed question
+GUIDANCE_QUESTIONS = {
+    ("financial_literacy", "banking_basics", "opening_account"): "How do I open a bank account?",
+    ("financial_literacy", "banking_basics", "digital_payments"): "How do I send money with UPI?",
+    ("financial_literacy", "avoiding_fraud"): "How do I protect myself from bank fraud?",
+    ("agriculture_tips", "weather_alerts", "monsoon_preparation"): "How should I prepare my farm for the monsoon?",
+    ("health_guidelines", "when_to_seek_help"): "When should I see a doctor urgently?"
+}
+# First aid items read "For bleeding: ...", so the part before the colon is the topic
+FIRST_AID_QUESTIONS = {
+    "en": ["First aid {topic}", "What to do {topic}?"],
+    "hi": ["{topic} क्या करें?", "{topic} प्राथमिक उपचार"]
+}
+GUIDANCE_DOMAINS = {"financial_literacy": "finance", "agriculture_tips": "agriculture", "health_guidelines": "health"}
+
+
+def vectorize(text: str, idf: Optional[Dict[int, float]] = None) -> Dict[int, float]:
+    """
+    Hashed, L2-normalized n-gram vector
+
+    Term frequencies are log-scaled and weighted by idf when given, so
+    boilerplate such as "how do i" counts less than scheme names.
+    """
+    vector: Dict[int, float] = defaultdict(float)
+    for gram, count in char_ngrams(text, NGRAM_SIZES).items():
+        bucket = zlib.crc32(gram.encode("utf-8")) % HASH_BUCKETS
+        vector[bucket] += 1 + math.log(count)
+    if idf is not None:
+        for bucket in vector:
+            vector[bucket] *= idf.get(bucket, idf.get(-1, 1.0))
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {bucket: weight / norm for bucket, weight in vector.items()} if norm else {}
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(bucket, 0.0) for bucket, weight in a.items())
+
+
+def _names_scheme(entry: Dict, squashed: str) -> bool:
+    """Scheme answers are only served when the message names that scheme"""
+    return not entry.get("aliases") or any(alias in squashed for alias in entry["aliases"])
+
+
+class FAQIndex:
+    """
+    Nearest-neighbour search over FAQ questions
+
+    An inverted index from n-gram bucket to question keeps lookups
+    proportional to the n-grams a message shares with the store.
+    """
+
+    def __init__(self, entries: List[Dict]):
+        self.entries = entries
+        self._questions: List[Tuple[int, str]] = [
+            (position, question)
+            for position, entry in enumerate(entries)
+            for question in entry["questions"]
+        ]
+
+        document_frequency = Counter()
+        for _, question in self._questions:
+            document_frequency.update(vectorize(question).keys())
+        total = len(self._questions)
+        self.idf = {bucket: math.log((total + 1) / (count + 1)) + 1 for bucket, count in document_frequency.items()}
+        # Weight for n-grams no stored question has
+        self.idf[-1] = math.log(total + 1) + 1
+
+        self._postings: Dict[int, List[Tuple[int, float]]] = defaultdict(list)
+        for question_id, (_, question) in enumerate(self._questions):
+            for bucket, weight in vectorize(question, self.idf).items():
+                self._postings[bucket].append((question_id, weight))
+
+    def search(self, text: str, accept=None, limit: int = 5) -> List[Tuple[Dict, float]]:
+        """
+        Best matching entries for a message, highest similarity first
+
+        Args:
+            accept: optional predicate on entries (e.g. same language)
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for bucket, weight in vectorize(text, self.idf).items():
+            for question_id, question_weight in self._postings.get(bucket, ()):
+                scores[question_id] += weight * question_weight
+
+        best: Dict[int, float] = {}
+        for question_id, score in scores.items():
+            position = self._questions[question_id][0]
+            if accept is not None and not accept(self.entries[position]):
+                continue
+            best[position] = max(best.get(position, 0.0), score)
+        ranked = sorted(best.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(self.entries[position], round(score, 4)) for position, score in ranked]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class FAQService:
+    """
+    Answers messages from the FAQ store without calling the LLM
+
+    A message is answered only when its similarity to a stored question in
+    the same language is at least FAQ_MATCH_THRESHOLD. Answers for the
+    user's literacy level are preferred, then medium, then any level.
+    """
+
+    def __init__(self, path: Path = FAQ_FILE):
+        self.path = Path(path)
+        self.enabled = settings.FAQ_ENABLED
+        self.threshold = settings.FAQ_MATCH_THRESHOLD
+        self._index: Optional[FAQIndex] = None
+        self._stats = {"lookups": 0, "answered": 0}
+
+    def match(
+        self,
+        text: str,
+        language: str,
+        literacy_level: str = "medium",
+        threshold: Optional[float] = None
+    ) -> Optional[Dict]:
+        """
+        Return the stored answer for a message, or None below the threshold
+
+        Args:
+            threshold: overrides FAQ_MATCH_THRESHOLD (degraded mode accepts looser matches)
+
+        Returns:
+            Dict with id, question, answer, domain, language, literacy_level and score
+        """
+        index = self._load()
+        if index is None or not text:
+            return None
+        self._stats["lookups"] += 1
+
+        squashed = normalize_text(text).replace(" ", "")
+        candidates = index.search(
+            text,
+            accept=lambda entry: entry["language"] == language and _names_scheme(entry, squashed)
+        )
+        if not candidates or candidates[0][1] < (self.threshold if threshold is None else threshold):
+            return None
+
+        best_score = candidates[0][1]
+        # Among equally good questions, pick the answer written for the user's literacy level
+        preference = [literacy_level, "medium", *LITERACY_LEVELS]
+        matches = [(entry, score) for entry, score in candidates if best_score - score < 1e-6]
+        entry, score = min(matches, key=lambda item: preference.index(item[0].get("literacy_level", "medium")))
+
+        self._stats["answered"] += 1
+        return {
+            "id": entry["id"],
+            "question": entry["questions"][0],
+            "answer": entry["answer"],
+            "domain": entry.get("domain", "general"),
+            "scheme_id": entry.get("scheme_id"),
+            "language": entry["language"],
+            "literacy_level": entry.get("literacy_level", "medium"),
+            "score": score
+        }
+
+    def get_stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "entries": len(self._index) if self._index else 0,
+            **self._stats
+        }
+
+    def _load(self) -> Optional[FAQIndex]:
+        if not self.enabled:
+            return None
+        if self._index is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    entries = json.load(f)["entries"]
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"FAQ store unavailable ({self.path}): {str(e)}")
+                self.enabled = False
+                return None
+            self._index = FAQIndex(entries)
+            logger.info(f"Loaded {len(entries)} FAQ entries from {self.path}")
+        return self._index
+
+# Initialize singleton
+faq_service = FAQService()
+
+
+def _scheme_names(scheme: Dict) -> List[str]:
+    name = scheme["name"]
+    if "(" not in name:
+        return [name, scheme["id"]]
+    outer, inner = name.split("(", 1)
+    return [outer.strip(), inner.rstrip(")").strip(), scheme["id"]]
+
+
+
+def _scheme_answer(scheme: Dict, topic: str, literacy_level: str) -> str:
+    name = _scheme_names(scheme)[0]
+    eligibility = scheme.get("eligibility", {})
+    helpline = scheme.get("helpline")
+    website = scheme.get("website")
+    limit = 3 if literacy_level == "low" else None
+
+    if topic == "apply":
+        steps = scheme.get("how_to_apply", {}).get("steps", [])[:limit]
+        lines = [f"To apply for {name}:"] + [f"{number}. {step}" for number, step in enumerate(steps, start=1)]
+    elif topic == "documents":
+        lines = [f"For {name} you need: " + ", ".join(eligibility.get("documents", [])) + "."]
+    elif topic == "eligibility":
+        lines = [f"{name} is for:"] + [f"- {criterion}" for criterion in eligibility.get("criteria", [])[:limit]]
+    else:
+        lines = [f"{name}: {scheme.get('description', {}).get('en', '')}"]
+
+    if helpline:
+        lines.append(f"Helpline: {helpline}")
+    if website and literacy_level == "high":
+        lines.append(f"Website: {website}")
+    return "\n".join(lines)
+
+
+def entries_from_knowledge_base(knowledge_base: Optional[Dict] = None) -> List[Dict]:
+    """FAQ entries for every scheme topic and literacy level, plus the guidance lists"""
+    knowledge_base = knowledge_base or load_knowledge_base()
+    entries = []
+
+    for scheme in knowledge_base.get("schemes", []):
+        names = _scheme_names(scheme)
+        for topic, templates in SCHEME_QUESTIONS.items():
+            questions = [template.format(name=name) for template in templates for name in names]
+            for literacy_level in LITERACY_LEVELS:
+                entries.append({
+                    "id": f"{scheme['id']}:{topic}:en:{literacy_level}",
+                    "questions": questions,
+                    "answer": _scheme_answer(scheme, topic, literacy_level),
+                    "domain": scheme.get("domain", "government_schemes"),
+                    "scheme_id": scheme["id"],
+                    "aliases": scheme_aliases(scheme),
+                    "language": "en",
+                    "literacy_level": literacy_level,
+                    "source": "knowledge_base"
+                })
+        description_hi = scheme.get("description", {}).get("hi")
+        if description_hi:
+            entries.append({
+                "id": f"{scheme['id']}:about:hi:medium",
+                "questions": [f"{name} क्या है?" for name in names],
+                "answer": f"{names[0]}: {description_hi}",
+                "domain": scheme.get("domain", "government_schemes"),
+                "scheme_id": scheme["id"],
+                "aliases": scheme_aliases(scheme),
+                "language": "hi",
+                "literacy_level": "medium",
+                "source": "knowledge_base"
+            })
+
+    for language, items in knowledge_base.get("health_guidelines", {}).get("first_aid", {}).items():
+        for number, item in enumerate(items, start=1):
+            topic, _, advice = item.partition(":")
+            if not advice or language not in FIRST_AID_QUESTIONS:
+                continue
+            entries.append({
+                "id": f"first_aid:{number}:{language}",
+                "questions": [template.format(topic=topic.strip()) for template in FIRST_AID_QUESTIONS[language]],
+                "answer": f"{topic.strip()}: {advice.strip()}",
+                "domain": "health",
+                "language": language,
+                "literacy_level": "medium",
+                "source": "knowledge_base"
+            })
+
+    for path, question in GUIDANCE_QUESTIONS.items():
+        value = knowledge_base
+        for key in path:
+            value = value.get(key, {}) if isinstance(value, dict) else {}
+        if isinstance(value, list) and value:
+            entries.append({
+                "id": ":".join(path[1:]) + ":en",
+                "questions": [question],
+                "answer": "\n".join(f"- {item}" for item in value),
+                "domain": GUIDANCE_DOMAINS[path[0]],
+                "language": "en",
+                "literacy_level": "medium",
+                "source": "knowledge_base"
+            })
+
+    return entries
+
+
+def entries_from_traffic(
+    pairs: Iterable[Tuple[str, str, str, str, str]],
+    min_count: int = 3,
+    similarity: float = 0.8
+) -> List[Dict]:
+    """
+    FAQ entries for questions asked at least min_count times
+
+    Questions are clustered greedily by n-gram similarity within each
+    (language, literacy level); each cluster keeps its most common phrasings
+    and the latest answer.
+
+    Args:
+        pairs: (question, answer, language, literacy_level, domain) tuples, oldest first
+    """
+    clusters: Dict[Tuple[str, str], List[Dict]] = defaultdict(list)
+    for question, answer, language, literacy_level, domain in pairs:
+        vector = vectorize(question)
+        group = clusters[(language, literacy_level)]
+        cluster = next((c for c in group if cosine(vector, c["vector"]) >= similarity), None)
+        if cluster is None:
+            cluster = {"vector": vector, "questions": Counter(), "count": 0}
+            group.append(cluster)
+        cluster["questions"][question.strip()] += 1
+        cluster["count"] += 1
+        cluster.update(answer=answer, domain=domain)
+
+    entries = []
+    for (language, literacy_level), group in clusters.items():
+        for number, cluster in enumerate(group):
+            if cluster["count"] < min_count:
+                continue
+            entries.append({
+                "id": f"traffic:{language}:{literacy_level}:{number}",
+                "questions": [question for question, _ in cluster["questions"].most_common(5)],
+                "answer": cluster["answer"],
+                "domain": cluster["domain"],
+                "language": language,
+                "literacy_level": literacy_level,
+                "source": "traffic",
+                "count": cluster["count"]
+            })
+    return entries
+
+
+def pairs_from_messages() -> Iterable[Tuple[str, str, str, str, str]]:
+    """
+    Yield (question, answer, language, literacy level, domain) from logged conversations
+
+    Only the opening turn of each conversation is used, since later turns
+    depend on earlier context. Failed replies are skipped, and so are replies
+    that were themselves FAQ answers.
+    """
+    from app.database import SessionLocal, Conversation, Message, MessageRole, User
+    from app.utils.encryption import encryption_service
+
+    db = SessionLocal()
+    try:
+        rows = db.query(Message, User.literacy_level).join(
+            Conversation, Message.conversation_id == Conversation.id
+        ).join(User, Conversation.user_id == User.id).order_by(
+            Message.conversation_id, Message.id
+        ).yield_per(500)
+
+        conversation_id = None
+        question = None
+        for message, literacy_level in rows:
+            if message.conversation_id != conversation_id:
+                conversation_id = message.conversation_id
+                question = None
+                if message.role == MessageRole.USER:
+                    question = encryption_service.decrypt(message.content_encrypted)
+                continue
+            if question is None or message.role != MessageRole.ASSISTANT:
+                question = None
+                continue
+
+            intent = (message.message_metadata or {}).get("intent") or {}
+            if intent.get("source") != "faq" and intent.get("domain", "general") != "general":
+                yield (
+                    question,
+                    encryption_service.decrypt(message.content_encrypted),
+                    message.language or "en",
+                    getattr(literacy_level, "value", literacy_level) or "medium",
+                    intent["domain"]
+                )
+            question = None
+    finally:
+        db.close()
+
+
+def build_store(from_db: bool = False, min_count: int = 3) -> Dict:
+    entries = entries_from_knowledge_base()
+    if from_db:
+        entries += entries_from_traffic(pairs_from_messages(), min_count)
+    return {"entries": entries}
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build or query the FAQ answer store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Rebuild the store from the knowledge base and traffic")
+    build_parser.add_argument("--from-db", action="store_true", help="Add questions asked often in logged traffic")
+    build_parser.add_argument("--min-count", type=int, default=3)
+    build_parser.add_argument("--output", default=str(FAQ_FILE))
+
+    match_parser = subparsers.add_parser("match", help="Show the best stored answers for a message")
+    match_parser.add_argument("text")
+    match_parser.add_argument("--language", default="en")
+    match_parser.add_argument("--literacy", default="medium", choices=LITERACY_LEVELS)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "match":
+        service = FAQService()
+        index = service._load()
+        for entry, score in index.search(args.text, accept=lambda entry: entry["language"] == args.language):
+            print(f"{score:.3f}  {entry['id']}  {entry['questions'][0]}")
+        print(json.dumps(service.match(args.text, args.language, args.literacy), ensure_ascii=False, indent=2))
+        return
+
+    store = build_store(args.from_db, args.min_count)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(store, f, ensure_ascii=False, indent=1)
+        f.write("\n")
+    print(f"Wrote {len(store['entries'])} FAQ entries to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Local intent/domain classifier
+Multinomial naive Bayes seeded from the domain keyword lists and the scheme
+knowledge base, and trainable from logged traffic.
+
+Usage:
+    python -m app.services.intent_classifier train --input labelled.ndjson
+    python -m app.services.intent_classifier train --from-db
+    python -m app.services.intent_classifier classify "How do I get an Ayushman card?"
+"""
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse
+import csv
+import json
+import math
+import re
+
+from app.config import settings
+from app.services.knowledge_base import get_schemes
+from app.utils.logger import logger
+from app.utils.text import tokenize
+from app.utils.validation import DOMAIN_KEYWORDS
+
+DOMAINS = ["health", "agriculture", "finance", "education", "government_schemes", "climate", "general"]
+
+# Seed examples for messages that do not belong to any service domain
+GENERAL_SEEDS = [
+    "hello", "hi", "hey", "namaste", "good morning", "good evening", "thank you", "thanks",
+    "who are you", "what can you do", "help me", "ok", "bye", "नमस्ते", "धन्यवाद"
+]
+
+# Words that signal an urgent request
+URGENT_KEYWORDS = [
+    "emergency", "urgent", "immediately", "accident", "bleeding", "unconscious", "chest pain",
+    "not breathing", "heart attack", "snake bite", "flood", "cyclone", "fire", "dying",
+    "आपातकाल", "तुरंत", "बाढ़"
+]
+
+# Latin keywords match whole words (plurals allowed), so "fired" is not "fire";
+# \b does not hold inside Devanagari words, which are matched as substrings
+_URGENT_PATTERN = re.compile(
+    r"\b(?:" + "|".join(re.escape(keyword) for keyword in URGENT_KEYWORDS if keyword.isascii()) + r")s?\b"
+)
+_URGENT_SUBSTRINGS = [keyword for keyword in URGENT_KEYWORDS if not keyword.isascii()]
+
+# Keyword seeds count more than free text from the knowledge base
+KEYWORD_SEED_WEIGHT = 3
+
+# Additive smoothing; kept small so a single strong keyword can decide the domain
+SMOOTHING = 0.1
+
+
+class IntentClassifier:
+    """
+    Answers the domain/intent question in-process in microseconds
+
+    extract_intent only falls back to the LLM when the posterior probability
+    of the best domain is below INTENT_CLASSIFIER_THRESHOLD.
+    """
+
+    def __init__(self, model_path: Optional[str] = None):
+        self.model_path = Path(model_path or settings.INTENT_CLASSIFIER_MODEL_PATH)
+        self.threshold = settings.INTENT_CLASSIFIER_THRESHOLD
+        self._reset()
+
+        if self.model_path.exists():
+            self.load(self.model_path)
+        else:
+            self._seed()
+
+        self._stats = {"classified": 0, "confident": 0}
+        logger.info(
+            f"Intent classifier ready ({len(self.vocabulary)} terms, threshold: {self.threshold})"
+        )
+
+    def classify(self, text: str) -> Dict:
+        """
+        Classify a message into a domain
+
+        Returns:
+            Dict in the extract_intent format plus "source": "local".
+            Confidence is 0 when none of the message's terms are known.
+        """
+        self._stats["classified"] += 1
+        domain, confidence = self.predict_domain(text)
+
+        if confidence >= self.threshold:
+            self._stats["confident"] += 1
+
+        return {
+            "intent": self._intent_label(text, domain),
+            "domain": domain,
+            "entities": {},
+            "urgency": detect_urgency(text),
+            "confidence": round(confidence, 4),
+            "source": "local"
+        }
+
+    def predict_domain(self, text: str) -> Tuple[str, float]:
+        """Return the most likely domain and its posterior probability"""
+        scores = self._domain_probabilities(text)
+        if scores is None:
+            return "general", 0.0
+        return max(scores.items(), key=lambda item: item[1])
+
+    def is_confident(self, intent_data: Dict) -> bool:
+        """Whether a local classification is good enough to skip the LLM"""
+        return intent_data.get("confidence", 0) >= self.threshold
+
+    def train(self, samples: Iterable[Tuple[str, str]], weight: int = 1) -> int:
+        """
+        Add labelled (text, domain) samples to the model
+
+        Returns:
+            Number of samples used
+        """
+        used = 0
+        for text, domain in samples:
+            if domain not in DOMAINS or not text:
+                continue
+            self._add_document(tokenize(text), domain, weight)
+            used += 1
+        return used
+
+    def save(self, path: Optional[Path] = None):
+        """Persist token counts as JSON"""
+        path = Path(path or self.model_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "doc_counts": self.doc_counts,
+                "token_counts": self.token_counts,
+                "total_tokens": self.total_tokens
+            }, f, ensure_ascii=False)
+        logger.info(f"Saved intent classifier to {path}")
+
+    def load(self, path: Path):
+        """Load token counts saved by save()"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        self._reset()
+        self.doc_counts.update(data["doc_counts"])
+        for domain, counts in data["token_counts"].items():
+            self.token_counts[domain].update(counts)
+            self.vocabulary.update(counts)
+        self.total_tokens.update(data["total_tokens"])
+        logger.info(f"Loaded intent classifier from {path}")
+
+    def get_stats(self) -> Dict:
+        """Classification counters for the metrics endpoint"""
+        classified = self._stats["classified"]
+        return {
+            **self._stats,
+            "confident_rate": round(self._stats["confident"] / classified, 4) if classified else 0.0,
+            "vocabulary_size": len(self.vocabulary)
+        }
+
+    def _reset(self):
+        self.doc_counts: Dict[str, int] = defaultdict(int)
+        self.token_counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.total_tokens: Dict[str, int] = defaultdict(int)
+        self.vocabulary = set()
+
+    def _seed(self):
+        """Build the initial model from keyword lists and the scheme catalog"""
+        for domain, keywords in DOMAIN_KEYWORDS.items():
+            for keyword in keywords:
+                self._add_document(tokenize(keyword), domain, KEYWORD_SEED_WEIGHT)
+
+        for seed in GENERAL_SEEDS:
+            self._add_document(tokenize(seed, drop_stopwords=False), "general", KEYWORD_SEED_WEIGHT)
+
+        for scheme in get_schemes():
+            domain = scheme.get("domain")
+            if domain not in DOMAINS:
+                continue
+            texts = [scheme.get("name", "")]
+            texts.extend((scheme.get("description") or {}).values())
+            texts.extend((scheme.get("eligibility") or {}).get("criteria", []))
+            for text in texts:
+                tokens = tokenize(text)
+                self._add_document(tokens, domain)
+                # Scheme names are also evidence for the government schemes domain
+                if text == scheme.get("name"):
+                    self._add_document(tokens, "government_schemes")
+
+    def _add_document(self, tokens: List[str], domain: str, weight: int = 1):
+        if not tokens:
+            return
+        self.doc_counts[domain] += weight
+        for token in tokens:
+            self.token_counts[domain][token] += weight
+            self.total_tokens[domain] += weight
+            self.vocabulary.add(token)
+
+    def _domain_probabilities(self, text: str) -> Optional[Dict[str, float]]:
+        content_tokens = tokenize(text)
+        if content_tokens:
+            tokens = [token for token in content_tokens if token in self.vocabulary]
+        else:
+            # Greetings such as "who are you" consist only of stopwords
+            tokens = [token for token in tokenize(text, drop_stopwords=False) if token in self.vocabulary]
+        if not tokens:
+            return None
+
+        total_docs = sum(self.doc_counts.values())
+        vocab_size = len(self.vocabulary)
+        log_scores = {}
+        for domain in DOMAINS:
+            if not self.doc_counts.get(domain):
+                continue
+            score = math.log(self.doc_counts[domain] / total_docs)
+            denominator = self.total_tokens[domain] + SMOOTHING * vocab_size
+            for token in tokens:
+                score += math.log((self.token_counts[domain].get(token, 0) + SMOOTHING) / denominator)
+            log_scores[domain] = score
+
+        # Softmax over log scores
+        best = max(log_scores.values())
+        exp_scores = {domain: math.exp(score - best) for domain, score in log_scores.items()}
+        total = sum(exp_scores.values())
+        return {domain: value / total for domain, value in exp_scores.items()}
+
+    @staticmethod
+    def _intent_label(text: str, domain: str) -> str:
+        lower_text = text.lower()
+        if "eligib" in lower_text:
+            return "check_eligibility"
+        if any(word in lower_text for word in ("apply", "register", "enrol", "enroll")):
+            return "apply_for_service"
+        if any(word in lower_text for word in ("document", "papers", "certificate")):
+            return "document_inquiry"
+        return "general_inquiry" if domain == "general" else f"{domain}_inquiry"
+
+
+
+def detect_urgency(text: str) -> str:
+    """Urgency of a message from keywords: high if any urgent keyword appears, else medium"""
+    lower_text = text.lower()
+    if _URGENT_PATTERN.search(lower_text) or any(keyword in lower_text for keyword in _URGENT_SUBSTRINGS):
+        return "high"
+    return "medium"
+
+
+def load_samples(path: str) -> Iterable[Tuple[str, str]]:
+    """Read labelled samples from NDJSON ({"text", "domain"} per line) or CSV (text,domain columns)"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            for row in csv.DictReader(f):
+                yield row.get("text", ""), row.get("domain", "")
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    row = json.loads(line)
+                    yield row.get("text", ""), row.get("domain", "")
+
+
+def samples_from_messages(min_confidence: float = 0.8) -> Iterable[Tuple[str, str]]:
+    """
+    Yield (user message, domain) pairs from logged conversations
+
+    A user message is labelled with the LLM-extracted intent stored in the
+    metadata of the assistant reply that follows it. Labels produced by this
+    classifier are skipped so it never trains on its own output.
+    """
+    from app.database import SessionLocal, Message, MessageRole
+    from app.utils.encryption import encryption_service
+
+    db = SessionLocal()
+    try:
+        pending_text = None
+        messages = db.query(Message).order_by(Message.conversation_id, Message.id).yield_per(500)
+        for message in messages:
+            if message.role == MessageRole.USER:
+                pending_text = encryption_service.decrypt(message.content_encrypted)
+                continue
+
+            intent = (message.message_metadata or {}).get("intent") or {}
+            if (
+                pending_text
+                and intent.get("source") != "local"
+                and intent.get("confidence", 0) >= min_confidence
+            ):
+                yield pending_text, intent.get("domain", "")
+            pending_text = None
+    finally:
+        db.close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Train or query the local intent classifier")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="Train from logged traffic and save the model")
+    train_parser.add_argument("--input", help="NDJSON or CSV file of labelled messages")
+    train_parser.add_argument("--from-db", action="store_true", help="Use labelled messages from the database")
+    train_parser.add_argument("--output", help="Model path (defaults to INTENT_CLASSIFIER_MODEL_PATH)")
+
+    classify_parser = subparsers.add_parser("classify", help="Classify a message")
+    classify_parser.add_argument("text")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "classify":
+        print(json.dumps(intent_classifier.classify(args.text), ensure_ascii=False, indent=2))
+        return
+
+    used = 0
+    if args.input:
+        used += intent_classifier.train(load_samples(args.input))
+    if args.from_db:
+        used += intent_classifier.train(samples_from_messages())
+    intent_classifier.save(Path(args.output) if args.output else None)
+    print(f"Trained on {used} samples")
+
+# Initialize singleton
+intent_classifier = IntentClassifier()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Access to the bundled knowledge base files under data/
+"""
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+
+from app.utils.logger import logger
+
+DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data"
+KNOWLEDGE_BASE_DIR = DATA_DIR / "knowledge_base"
+SCHEMES_FILE = KNOWLEDGE_BASE_DIR / "schemes.json"
+
+# Knowledge base sections split into guidance passages, with their domain
+GUIDANCE_SECTIONS = {"health_guidelines": "health", "agriculture_tips": "agriculture", "financial_literacy": "finance"}
+
+
+@lru_cache(maxsize=1)
+def load_knowledge_base() -> Dict:
+    """Load data/knowledge_base/schemes.json once per process"""
+    try:
+        with open(SCHEMES_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error loading knowledge base {SCHEMES_FILE}: {str(e)}")
+        return {"schemes": []}
+
+
+def get_schemes() -> List[Dict]:
+    """Return the scheme entries from the knowledge base"""
+    return load_knowledge_base().get("schemes", [])
+
+
+def _humanize(key: str) -> str:
+    return key.replace("_", " ").capitalize()
+
+
+def passages_from_knowledge_base(knowledge_base: Optional[Dict] = None) -> List[Dict]:
+    """Passages for each scheme section and each guidance list in schemes.json"""
+    knowledge_base = knowledge_base or load_knowledge_base()
+    passages = []
+
+    def add(passage_id: str, title: str, text: str, domain: str, language: str = "en"):
+        if text:
+            passages.append({
+                "id": passage_id, "title": title, "text": text,
+                "domain": domain, "language": language, "source": "schemes.json"
+            })
+
+    for scheme in knowledge_base.get("schemes", []):
+        name = scheme["name"]
+        domain = scheme.get("domain", "government_schemes")
+        eligibility = scheme.get("eligibility", {})
+        for language, description in scheme.get("description", {}).items():
+            contact = f" Helpline: {scheme['helpline']}." if scheme.get("helpline") else ""
+            add(f"kb:{scheme['id']}:about:{language}", name, f"{description}.{contact}", domain, language)
+        add(f"kb:{scheme['id']}:eligibility", f"{name} eligibility", "; ".join(eligibility.get("criteria", [])), domain)
+        add(f"kb:{scheme['id']}:documents", f"{name} documents", "; ".join(eligibility.get("documents", [])), domain)
+        steps = scheme.get("how_to_apply", {}).get("steps", [])
+        website = f" Website: {scheme['website']}" if scheme.get("website") else ""
+        add(f"kb:{scheme['id']}:apply", f"How to apply for {name}", "; ".join(steps) + website, domain)
+
+    # Guidance sections nest lists (per language or per topic) and dicts of facts
+    def walk(path: List[str], value, domain: str):
+        if isinstance(value, list):
+            per_language = len(path[-1]) == 2
+            language = path[-1] if per_language else "en"
+            topic = path[-2] if per_language else path[-1]
+            add("kb:" + ":".join(path), _humanize(topic), "; ".join(str(item) for item in value), domain, language)
+        elif isinstance(value, dict):
+            if all(isinstance(item, str) for item in value.values()):
+                text = "; ".join(f"{_humanize(key)}: {item}" for key, item in value.items())
+                add("kb:" + ":".join(path), _humanize(path[-1]), text, domain)
+            else:
+                for key, item in value.items():
+                    walk(path + [key], item, domain)
+
+    for section, domain in GUIDANCE_SECTIONS.items():
+        walk([section], knowledge_base.get(section, {}), domain)
+
+    return passages
+
+
+def passages_from_row(row) -> List[Dict]:
+    """Passages for a knowledge_base table row, one per language in its content"""
+    content = row.content
+    if isinstance(content, dict):
+        texts = content.items()
+    else:
+        texts = [(row.language or "en", content)]
+
+    domain = getattr(row.domain, "value", row.domain) or "general"
+    passages = []
+    for language, text in texts:
+        if isinstance(text, list):
+            text = "; ".join(str(item) for item in text)
+        if not text:
+            continue
+        passages.append({
+            "id": f"db:{row.id}:{language}",
+            "title": row.title or row.category or domain,
+            "text": str(text),
+            "keywords": row.keywords or "",
+            "domain": domain,
+            "language": language,
+            "source": "database"
+        })
+    return passages
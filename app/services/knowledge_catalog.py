@@ -0,0 +1,349 @@
+"""
+Scheme catalog ingestion
+Streams JSON, NDJSON or CSV catalogs of central and state schemes into the
+knowledge_base table in batches. Each row keeps a hash of its record, so
+re-running an import only writes the schemes that changed. On SQLite, the
+rows are searched through the knowledge_base_fts FTS5 table.
+
+JSON files hold a list of schemes or a {"schemes": [...]} object in the
+format of data/knowledge_base/schemes.json. CSV files need id and name
+columns and may add domain, category, state, description (or
+description_<language>), criteria, documents, helpline, website and
+keywords; list columns are separated by ";".
+
+Usage:
+    python -m app.services.knowledge_catalog ingest schemes.csv
+    python -m app.services.knowledge_catalog ingest data/knowledge_base/schemes.json --batch-size 1000
+    python -m app.services.knowledge_catalog search "widow pension rajasthan"
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+import argparse
+import csv
+import hashlib
+import json
+
+from sqlalchemy import insert, or_, text, update
+
+from app.config import settings
+from app.utils.logger import logger
+from app.utils.text import tokenize
+
+# Record fields holding lists, which CSV files separate with ";"
+LIST_FIELDS = ["criteria", "documents", "steps"]
+
+# bm25() column weights for title, keywords and content
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+
+
+class CatalogFormatError(ValueError):
+    """Raised when a catalog file or record cannot be parsed"""
+
+
+def detect_format(path: Path) -> str:
+    """"json", "ndjson" or "csv" from the file extension, else from the first character"""
+    suffix = path.suffix.lower()
+    if suffix in (".ndjson", ".jsonl"):
+        return "ndjson"
+    if suffix in (".json", ".csv"):
+        return suffix[1:]
+    with open(path, encoding="utf-8-sig") as f:
+        first = f.read(1)
+    return "json" if first in "[{" else "csv"
+
+
+def iter_records(path: Path, fmt: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Yield the scheme records of a catalog file
+
+    NDJSON and CSV files are read a line at a time; JSON files are loaded
+    whole.
+
+    Raises:
+        CatalogFormatError: on malformed JSON or an unsupported format
+    """
+    fmt = (fmt or detect_format(path)).lower()
+    if fmt == "json":
+        try:
+            with open(path, encoding="utf-8-sig") as f:
+                data = json.load(f)
+        except ValueError as e:
+            raise CatalogFormatError(f"{path}: invalid JSON ({str(e)})")
+        yield from data.get("schemes", []) if isinstance(data, dict) else data
+    elif fmt == "ndjson":
+        with open(path, encoding="utf-8-sig") as f:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise CatalogFormatError(f"Line {number}: invalid JSON ({str(e)})")
+    elif fmt == "csv":
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                # Cells past the header row land under a None key and are dropped
+                yield {key.strip().lower(): (value or "").strip() for key, value in row.items() if key is not None}
+    else:
+        raise CatalogFormatError(f"Unsupported catalog format: {fmt}")
+
+
+def _as_list(value) -> List[str]:
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value or "").split(";") if item.strip()]
+
+
+def row_from_record(record: Dict) -> Dict:
+    """
+    knowledge_base column values for a scheme record
+
+    content holds the description per language, with the helpline and
+    website appended to the English one; eligibility criteria, documents,
+    the state and the category go into keywords.
+
+    Raises:
+        CatalogFormatError: when the record has no id or name
+    """
+    from app.database import Domain
+
+    if not isinstance(record, dict):
+        raise CatalogFormatError("expected a JSON object")
+    external_id = str(record.get("id") or record.get("external_id") or "").strip()
+    title = str(record.get("name") or record.get("title") or "").strip()
+    if not external_id or not title:
+        raise CatalogFormatError("record needs an id and a name")
+
+    description = record.get("description") or {}
+    content = dict(description) if isinstance(description, dict) else {"en": description}
+    for key, value in record.items():
+        if key.startswith("description_") and value:
+            content[key[len("description_"):]] = value
+    content = {language: str(value).strip() for language, value in content.items() if value}
+    contact = " ".join(
+        f"{label}: {record[field]}." for field, label in (("helpline", "Helpline"), ("website", "Website"))
+        if record.get(field)
+    )
+    if contact:
+        content["en"] = f"{content.get('en', title).rstrip('.')}. {contact}"
+
+    eligibility = record.get("eligibility") if isinstance(record.get("eligibility"), dict) else {}
+    steps = record.get("how_to_apply", {}).get("steps") if isinstance(record.get("how_to_apply"), dict) else None
+    lists = {
+        "criteria": eligibility.get("criteria", record.get("criteria")),
+        "documents": eligibility.get("documents", record.get("documents")),
+        "steps": steps or record.get("steps")
+    }
+    category = str(record.get("category") or "scheme")
+    keywords = [
+        external_id, category, str(record.get("state") or ""), *_as_list(record.get("keywords")),
+        *(item for field in LIST_FIELDS for item in _as_list(lists[field]))
+    ]
+
+    domain = str(record.get("domain") or "").strip().lower()
+    row = {
+        "external_id": external_id,
+        "domain": domain if domain in Domain._value2member_map_ else Domain.GOVERNMENT_SCHEMES.value,
+        "category": category,
+        "title": title,
+        "content": content,
+        "keywords": " ".join(keyword for keyword in keywords if keyword),
+        "language": "en" if "en" in content or not content else next(iter(content))
+    }
+    row["content_hash"] = hashlib.sha256(
+        json.dumps(row, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()[:16]
+    row["domain"] = Domain(row["domain"])
+    return row
+
+
+def _write_batch(db, rows: Dict[str, Dict], counts: Dict[str, int]):
+    """Insert new rows and update changed ones in one transaction"""
+    from app.database import KnowledgeBase
+
+    existing = {
+        external_id: (row_id, content_hash)
+        for external_id, row_id, content_hash in db.query(
+            KnowledgeBase.external_id, KnowledgeBase.id, KnowledgeBase.content_hash
+        ).filter(KnowledgeBase.external_id.in_(list(rows)))
+    }
+    now = datetime.utcnow()
+    inserts, updates = [], []
+    for external_id, row in rows.items():
+        if external_id not in existing:
+            inserts.append({**row, "updated_at": now})
+        elif existing[external_id][1] != row["content_hash"]:
+            updates.append({**row, "id": existing[external_id][0], "updated_at": now})
+
+    if inserts:
+        db.execute(insert(KnowledgeBase), inserts)
+    if updates:
+        db.execute(update(KnowledgeBase), updates)
+    db.commit()
+    if inserts or updates:
+        _reindex(db, [row["external_id"] for row in inserts + updates])
+    counts["inserted"] += len(inserts)
+    counts["updated"] += len(updates)
+    counts["unchanged"] += len(rows) - len(inserts) - len(updates)
+
+
+def _reindex(db, external_ids: List[str]):
+    """Hand committed rows to prompt retrieval, which bulk writes do not notify"""
+    from app.database import KnowledgeBase
+    from app.services.retrieval_service import knowledge_retriever
+
+    if not knowledge_retriever.enabled:
+        return
+    for row in db.query(KnowledgeBase).filter(KnowledgeBase.external_id.in_(external_ids)):
+        knowledge_retriever.upsert_row(row)
+
+
+def ingest(records: Iterable[Dict], batch_size: Optional[int] = None, db=None) -> Dict[str, int]:
+    """
+    Upsert scheme records into knowledge_base, matched on external_id
+
+    Each batch is committed as it is written, so an interrupted import can
+    simply be re-run. Bulk writes bypass ORM events, so the changed rows of
+    each batch are re-indexed for prompt retrieval once it commits.
+
+    Returns:
+        Counts of inserted, updated, unchanged and invalid records
+    """
+    from app.database import SessionLocal
+
+    batch_size = batch_size or settings.KNOWLEDGE_INGEST_BATCH_SIZE
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "invalid": 0}
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        batch: Dict[str, Dict] = {}
+        for number, record in enumerate(records, start=1):
+            try:
+                row = row_from_record(record)
+            except CatalogFormatError as e:
+                counts["invalid"] += 1
+                logger.warning(f"Skipping catalog record {number}: {str(e)}")
+                continue
+            # A scheme listed twice keeps its last version
+            batch[row["external_id"]] = row
+            if len(batch) >= batch_size:
+                _write_batch(db, batch, counts)
+                batch = {}
+        if batch:
+            _write_batch(db, batch, counts)
+    finally:
+        if own_session:
+            db.close()
+
+    logger.info(
+        f"Catalog ingested: {counts['inserted']} inserted, {counts['updated']} updated, "
+        f"{counts['unchanged']} unchanged, {counts['invalid']} invalid"
+    )
+    return counts
+
+
+def search(query: str, limit: int = 10, domain: Optional[str] = None, language: str = "en", db=None) -> List[Dict]:
+    """
+    Catalog rows matching any word of a query, best first
+
+    Uses the FTS5 table on SQLite (ranked by bm25, title matches weighted
+    highest) and a LIKE scan over title and keywords elsewhere.
+
+    Returns:
+        Dicts with id, external_id, title, domain, category, text and score
+    """
+    from app.database import SessionLocal, KnowledgeBase, Domain, KNOWLEDGE_FTS_TABLE
+
+    terms = tokenize(query)
+    if not terms:
+        return []
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        domain = Domain(domain) if domain in Domain._value2member_map_ else None
+        if db.get_bind().dialect.name == "sqlite":
+            match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+            weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+            ranked = db.execute(text(
+                f"SELECT knowledge_base.id, bm25({KNOWLEDGE_FTS_TABLE}, {weights}) AS rank "
+                f"FROM {KNOWLEDGE_FTS_TABLE} JOIN knowledge_base ON knowledge_base.id = {KNOWLEDGE_FTS_TABLE}.rowid "
+                f"WHERE {KNOWLEDGE_FTS_TABLE} MATCH :match"
+                + (" AND knowledge_base.domain = :domain" if domain else "")
+                + " ORDER BY rank LIMIT :limit"
+            ), {"match": match, "domain": domain.name if domain else None, "limit": limit})
+            scores = {row_id: -rank for row_id, rank in ranked}
+            rows = sorted(
+                db.query(KnowledgeBase).filter(KnowledgeBase.id.in_(list(scores))).all(),
+                key=lambda row: scores[row.id], reverse=True
+            )
+        else:
+            likes = [
+                column.ilike(f"%{term}%") for term in terms for column in (KnowledgeBase.title, KnowledgeBase.keywords)
+            ]
+            query = db.query(KnowledgeBase).filter(or_(*likes))
+            if domain:
+                query = query.filter(KnowledgeBase.domain == domain)
+            rows = query.limit(limit).all()
+            scores = {}
+    finally:
+        if own_session:
+            db.close()
+
+    results = []
+    for row in rows:
+        content = row.content if isinstance(row.content, dict) else {"en": row.content or ""}
+        results.append({
+            "id": row.id,
+            "external_id": row.external_id,
+            "title": row.title,
+            "domain": getattr(row.domain, "value", row.domain),
+            "category": row.category,
+            "text": content.get(language) or content.get("en") or next(iter(content.values()), ""),
+            "score": round(scores.get(row.id, 0.0), 3)
+        })
+    return results
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Load scheme catalogs into the knowledge_base table")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Upsert a JSON, NDJSON or CSV catalog")
+    ingest_parser.add_argument("input", type=Path)
+    ingest_parser.add_argument("--format", choices=["json", "ndjson", "csv"])
+    ingest_parser.add_argument("--batch-size", type=int, default=settings.KNOWLEDGE_INGEST_BATCH_SIZE)
+    ingest_parser.add_argument("--skip-vectors", action="store_true", help="Do not rebuild the dense vector index")
+
+    search_parser = subparsers.add_parser("search", help="Full-text search the catalog")
+    search_parser.add_argument("query")
+    search_parser.add_argument("-k", type=int, default=10)
+    search_parser.add_argument("--domain")
+
+    args = parser.parse_args(argv)
+
+    from app.database import init_db
+    init_db()
+
+    if args.command == "search":
+        for result in search(args.query, args.k, args.domain):
+            print(f"{result['score']:.3f}  {result['external_id'] or result['id']}  {result['title']}: {result['text']}")
+        return
+
+    try:
+        counts = ingest(iter_records(args.input, args.format), args.batch_size)
+    except CatalogFormatError as e:
+        parser.exit(1, f"{str(e)}; batches before it were saved, fix the file and rerun\n")
+    print(
+        f"Inserted {counts['inserted']}, updated {counts['updated']}, "
+        f"unchanged {counts['unchanged']}, invalid {counts['invalid']}"
+    )
+    if (counts["inserted"] or counts["updated"]) and not args.skip_vectors:
+        from app.services.vector_index import vector_index
+
+        count = vector_index.build(with_database=True)
+        print(f"Rebuilt the vector index with {count} passages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Token and latency accounting for LLM calls
+Aggregates every call in-process by task, channel and language, and checks
+prompt template sizes against a committed baseline.
+
+Usage:
+    python -m app.services.llm_metrics benchmark
+    python -m app.services.llm_metrics benchmark --update
+"""
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+import argparse
+import json
+import sys
+
+from app.services.knowledge_base import DATA_DIR
+from app.utils.logger import logger
+
+PROMPT_BASELINE_FILE = DATA_DIR / "prompts" / "token_baseline.json"
+
+# Allowed growth over the baseline before the benchmark fails
+DEFAULT_TOLERANCE = 0.05
+
+# Latency samples kept per series for percentiles
+LATENCY_WINDOW = 500
+
+
+class LLMMetrics:
+    """
+    In-process counters for LLM usage
+
+    Each series is keyed by (task, channel, language). Calls record prompt
+    and output tokens, latency and outcome; requests answered without a call
+    (cache hit, local classifier) are counted as avoided.
+    """
+
+    def __init__(self):
+        self._series: Dict[Tuple[str, str, str], Dict] = {}
+        self._latencies: Dict[Tuple[str, str, str], Deque[float]] = {}
+
+    def record_call(
+        self,
+        task: str,
+        channel: Optional[str],
+        language: Optional[str],
+        latency_ms: float,
+        status: str = "ok",
+        prompt_tokens: int = 0,
+        output_tokens: int = 0
+    ):
+        """
+        Record one LLM call
+
+        Args:
+            status: "ok", "error", "timeout" or "circuit_open"
+        """
+        key = self._key(task, channel, language)
+        series = self._get_series(key)
+        series["calls"] += 1
+        if status != "ok":
+            series["errors"][status] = series["errors"].get(status, 0) + 1
+        series["prompt_tokens"] += prompt_tokens
+        series["output_tokens"] += output_tokens
+        series["latency_ms_total"] += latency_ms
+        self._latencies[key].append(latency_ms)
+
+    def record_avoided(self, task: str, channel: Optional[str], language: Optional[str], reason: str = "cache"):
+        """Record a request answered without an LLM call"""
+        series = self._get_series(self._key(task, channel, language))
+        series["avoided"][reason] = series["avoided"].get(reason, 0) + 1
+
+    def get_stats(self) -> Dict:
+        """Per-series aggregates plus totals for the metrics endpoint"""
+        series = []
+        totals = {"calls": 0, "avoided": 0, "prompt_tokens": 0, "output_tokens": 0}
+        for key, data in sorted(self._series.items()):
+            task, channel, language = key
+            latencies = sorted(self._latencies[key])
+            series.append({
+                "task": task,
+                "channel": channel,
+                "language": language,
+                "calls": data["calls"],
+                "errors": dict(data["errors"]),
+                "avoided": dict(data["avoided"]),
+                "prompt_tokens": data["prompt_tokens"],
+                "output_tokens": data["output_tokens"],
+                "avg_prompt_tokens": round(data["prompt_tokens"] / data["calls"], 1) if data["calls"] else 0.0,
+                "avg_latency_ms": round(data["latency_ms_total"] / data["calls"], 2) if data["calls"] else 0.0,
+                "p50_latency_ms": _percentile(latencies, 0.5),
+                "p95_latency_ms": _percentile(latencies, 0.95)
+            })
+            totals["calls"] += data["calls"]
+            totals["avoided"] += sum(data["avoided"].values())
+            totals["prompt_tokens"] += data["prompt_tokens"]
+            totals["output_tokens"] += data["output_tokens"]
+        return {"totals": totals, "series": series}
+
+    def reset(self):
+        """Drop all recorded series"""
+        self._series.clear()
+        self._latencies.clear()
+
+    def _get_series(self, key: Tuple[str, str, str]) -> Dict:
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = {
+                "calls": 0,
+                "errors": {},
+                "avoided": {},
+                "prompt_tokens": 0,
+                "output_tokens": 0,
+                "latency_ms_total": 0.0
+            }
+            self._latencies[key] = deque(maxlen=LATENCY_WINDOW)
+        return series
+
+    @staticmethod
+    def _key(task: str, channel: Optional[str], language: Optional[str]) -> Tuple[str, str, str]:
+        return task, channel or "web", language or "unknown"
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 2)
+
+
+def check_prompt_budgets(
+    baseline_path: Path = PROMPT_BASELINE_FILE,
+    tolerance: float = DEFAULT_TOLERANCE
+) -> List[str]:
+    """
+    Compare current prompt template sizes with the baseline
+
+    Returns:
+        One message per template that grew by more than tolerance, or
+        that is missing from the baseline
+    """
+    from app.services.ai_service import ai_service
+
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = []
+    for name, tokens in ai_service.prompt_token_sizes().items():
+        allowed = baseline.get(name)
+        if allowed is None:
+            regressions.append(f"{name}: {tokens} tokens, not in baseline")
+        elif tokens > allowed * (1 + tolerance):
+            regressions.append(f"{name}: {tokens} tokens, baseline {allowed}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="LLM prompt token benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="Fail if prompt templates grew past the baseline")
+    benchmark_parser.add_argument("--baseline", default=str(PROMPT_BASELINE_FILE))
+    benchmark_parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    benchmark_parser.add_argument("--update", action="store_true", help="Write the current sizes as the new baseline")
+
+    args = parser.parse_args(argv)
+
+    from app.services.ai_service import ai_service
+
+    sizes = ai_service.prompt_token_sizes()
+    if args.update:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(sizes, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Wrote {len(sizes)} prompt sizes to {args.baseline}")
+        return
+
+    for name, tokens in sorted(sizes.items()):
+        print(f"{name:<40} {tokens:>6}")
+
+    regressions = check_prompt_budgets(Path(args.baseline), args.tolerance)
+    if regressions:
+        logger.error("Prompt token budget exceeded")
+        print("\nPrompt token regressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print("\nAll prompt templates within budget")
+
+# Initialize singleton
+llm_metrics = LLMMetrics()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+LLM provider backends used by AIService
+"gemini" calls Google Gemini; "local" is a deterministic in-process stand-in
+for offline load tests and fast unit tests.
+"""
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import json
+import random
+import re
+
+from app.config import settings
+from app.services.intent_classifier import intent_classifier
+from app.services.knowledge_base import get_schemes
+from app.utils.logger import logger
+from app.utils.text import estimate_tokens
+
+
+class LLMProviderError(Exception):
+    """Raised by a provider when a generation request fails"""
+
+
+class LLMResponse:
+    """Completion text plus the token usage reported (or estimated) for the call"""
+
+    __slots__ = ("text", "prompt_tokens", "output_tokens")
+
+    def __init__(self, text: str, prompt_tokens: int, output_tokens: int):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.output_tokens = output_tokens
+
+
+class LLMProvider(ABC):
+    """
+    Interface every LLM backend implements
+
+    Backends must implement generate; stream falls back to a single chunk.
+
+    task names the AIService operation so a provider can route or
+    simulate per task; providers must not change the prompt's meaning.
+    route carries the generation settings chosen by the model router
+    (model, max_output_tokens, temperature, stop_sequences, json).
+    """
+
+    name = "base"
+    model = ""
+
+    @abstractmethod
+    async def generate(self, prompt: str, task: str = "response", route: Optional[Dict] = None) -> LLMResponse:
+        """Return the full completion for a prompt"""
+
+    async def stream(self, prompt: str, task: str = "response", route: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Yield the completion text in chunks as it is produced"""
+        response = await self.generate(prompt, task, route)
+        yield response.text
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through the google-generativeai async client"""
+
+    name = "gemini"
+
+    def __init__(self, model: Optional[str] = None, api_key: Optional[str] = None):
+        import google.generativeai as genai
+
+        self.model = model or settings.LLM_MODEL
+        api_key = api_key if api_key is not None else settings.GEMINI_API_KEY
+        if not api_key:
+            logger.warning("GEMINI_API_KEY is not set - Gemini calls will fail")
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self._models = {}
+
+    async def generate(self, prompt: str, task: str = "response", route: Optional[Dict] = None) -> LLMResponse:
+        model, generation_config = self._resolve(route)
+        response = await model.generate_content_async(prompt, generation_config=generation_config)
+        text = response.text
+        usage = getattr(response, "usage_metadata", None)
+        return LLMResponse(
+            text,
+            getattr(usage, "prompt_token_count", 0) or estimate_tokens(prompt),
+            getattr(usage, "candidates_token_count", 0) or estimate_tokens(text)
+        )
+
+    async def stream(self, prompt: str, task: str = "response", route: Optional[Dict] = None) -> AsyncIterator[str]:
+        model, generation_config = self._resolve(route)
+        response = await model.generate_content_async(prompt, generation_config=generation_config, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    def _resolve(self, route: Optional[Dict]):
+        route = route or {}
+        model_name = route.get("model") or self.model
+        model = self._models.get(model_name)
+        if model is None:
+            model = self._models[model_name] = self._genai.GenerativeModel(model_name)
+
+        generation_config = {}
+        if route.get("max_output_tokens"):
+            generation_config["max_output_tokens"] = route["max_output_tokens"]
+        if route.get("temperature") is not None:
+            generation_config["temperature"] = route["temperature"]
+        if route.get("stop_sequences"):
+            generation_config["stop_sequences"] = route["stop_sequences"]
+        if route.get("json"):
+            generation_config["response_mime_type"] = "application/json"
+        return model, generation_config or None
+
+
+class LocalProvider(LLMProvider):
+    """
+    Deterministic stand-in backend
+
+    Answers are derived from the prompt with the local intent classifier and
+    the scheme knowledge base, so the same prompt always gets the same text.
+    Latency follows a log-normal distribution around LLM_LOCAL_LATENCY_MS
+    (LLM_LOCAL_LATENCY_SIGMA = 0 makes it fixed). A fraction of calls fail
+    (LLM_LOCAL_ERROR_RATE) or hang past any deadline (LLM_LOCAL_TIMEOUT_RATE),
+    drawn from a generator seeded with LLM_LOCAL_SEED so runs are repeatable.
+    """
+
+    name = "local"
+    model = "local-stand-in"
+
+    # How long a simulated hang lasts; long enough to trip every deadline
+    HANG_SECONDS = 3600
+
+    def __init__(
+        self,
+        latency_ms: Optional[float] = None,
+        latency_sigma: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        timeout_rate: Optional[float] = None,
+        seed: Optional[int] = None
+    ):
+        self.latency_ms = settings.LLM_LOCAL_LATENCY_MS if latency_ms is None else latency_ms
+        self.latency_sigma = settings.LLM_LOCAL_LATENCY_SIGMA if latency_sigma is None else latency_sigma
+        self.error_rate = settings.LLM_LOCAL_ERROR_RATE if error_rate is None else error_rate
+        self.timeout_rate = settings.LLM_LOCAL_TIMEOUT_RATE if timeout_rate is None else timeout_rate
+        self._random = random.Random(settings.LLM_LOCAL_SEED if seed is None else seed)
+        self.calls = 0
+
+    async def generate(self, prompt: str, task: str = "response", route: Optional[Dict] = None) -> LLMResponse:
+        await self._simulate()
+        text = self._budgeted(self._answer(prompt, task), route)
+        return LLMResponse(text, estimate_tokens(prompt), estimate_tokens(text))
+
+    async def stream(self, prompt: str, task: str = "response", route: Optional[Dict] = None) -> AsyncIterator[str]:
+        await self._simulate()
+        for chunk in re.findall(r"\S+\s*", self._budgeted(self._answer(prompt, task), route)):
+            yield chunk
+
+    @staticmethod
+    def _budgeted(text: str, route: Optional[Dict]) -> str:
+        """Cut plain-text answers at max_output_tokens like a real model would"""
+        if not route or route.get("json") or not route.get("max_output_tokens"):
+            return text
+        return text[:route["max_output_tokens"] * 4]
+
+    async def _simulate(self):
+        self.calls += 1
+        draw = self._random.random()
+        latency = self.latency_ms / 1000
+        if self.latency_sigma > 0 and latency > 0:
+            latency *= self._random.lognormvariate(0, self.latency_sigma)
+
+        if draw < self.timeout_rate:
+            await asyncio.sleep(self.HANG_SECONDS)
+        await asyncio.sleep(latency)
+        if draw < self.timeout_rate + self.error_rate:
+            raise LLMProviderError("Simulated provider error")
+
+    def _answer(self, prompt: str, task: str) -> str:
+        query = _extract(prompt, r"User (?:Query|message): (.+)")
+
+        if task == "intent":
+            return json.dumps(self._intent(query))
+        if task == "action_plan":
+            domain = _extract(prompt, r"Domain: (\w+)") or self._intent(query)["domain"]
+            return json.dumps(self._action_plan(query, domain))
+        if task == "understand":
+            intent = self._intent(query)
+            drafts_plan = intent["domain"] != "general" and "prepared separately" not in prompt
+            plan = self._action_plan(query, intent["domain"]) if drafts_plan else None
+            return json.dumps({**intent, "response_text": self._reply(query, intent["domain"]), "action_plan": plan})
+        if task == "plan_patch":
+            if not query:
+                return json.dumps({"changed": False})
+            return json.dumps({
+                "changed": True,
+                "add_steps": [{"action": f"Follow up on: {query}", "details": "Ask at the CSC which documents can be used instead"}]
+            })
+        if task == "plan_translate":
+            # No real translation offline: hand the plan back unchanged
+            return _extract(prompt, r"Plan: (\{.+\})") or "{}"
+        if task == "simplify":
+            original = prompt.split("Original text:", 1)[-1].split("Simplified version:", 1)[0].strip()
+            sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", original) if s.strip()]
+            return "In simple words: " + " ".join(sentences[:3])
+        if task == "summary":
+            previous = prompt.split("Current summary:", 1)[-1].split("Latest turn:", 1)[0].strip()
+            user_turn = _extract(prompt, r"User: (.+)")
+            if previous.startswith("(empty"):
+                previous = ""
+            return f"{previous} The user asked: {user_turn}".strip()
+        return self._reply(query, self._intent(query)["domain"])
+
+    @staticmethod
+    def _intent(query: str) -> Dict:
+        intent = intent_classifier.classify(query)
+        intent.pop("source", None)
+        intent["confidence"] = max(intent["confidence"], 0.5)
+        return intent
+
+    @staticmethod
+    def _scheme_for(domain: str) -> Optional[Dict]:
+        return next((scheme for scheme in get_schemes() if scheme.get("domain") == domain), None)
+
+    def _reply(self, query: str, domain: str) -> str:
+        lines = [f"I understand you are asking about: {query.rstrip('?.!') or 'your situation'}."]
+        scheme = self._scheme_for(domain)
+        if scheme:
+            lines.append(f"{scheme['name']} may help you.")
+            for number, step in enumerate(scheme.get("how_to_apply", {}).get("steps", [])[:3], start=1):
+                lines.append(f"{number}. {step}")
+        else:
+            lines.append("1. Visit your nearest Common Service Centre (CSC) for guidance.")
+        lines.append("Do you need more help?")
+        return "\n".join(lines)
+
+    def _action_plan(self, query: str, domain: str) -> Dict:
+        scheme = self._scheme_for(domain) or {}
+        steps: List[str] = scheme.get("how_to_apply", {}).get("steps") or [
+            "Visit your nearest Common Service Centre (CSC)",
+            "Explain your situation to the operator"
+        ]
+        eligibility = scheme.get("eligibility", {})
+        return {
+            "summary": f"Steps for: {query}" if query else "Steps to get help",
+            "immediate_actions": steps[:2],
+            "steps": [
+                {"step_number": number, "action": step, "details": ""}
+                for number, step in enumerate(steps, start=1)
+            ],
+            "documents_required": eligibility.get("documents", ["Aadhaar Card"]),
+            "eligibility": {"criteria": eligibility.get("criteria", []), "status": "check_needed"},
+            "risk_alerts": ["Never pay an agent to apply for a government scheme"],
+            "resources": [{"name": scheme["name"], "contact": scheme.get("helpline", "")}] if scheme else [],
+            "estimated_time": "1-2 weeks"
+        }
+
+
+def _extract(text: str, pattern: str) -> str:
+    match = re.search(pattern, text)
+    return match.group(1).strip() if match else ""
+
+
+def create_provider(name: Optional[str] = None) -> LLMProvider:
+    """Build the provider named by LLM_PROVIDER"""
+    name = (name or settings.LLM_PROVIDER).lower()
+    if name == "gemini":
+        return GeminiProvider()
+    if name == "local":
+        return LocalProvider()
+    raise ValueError(f"Unknown LLM provider: {name}")
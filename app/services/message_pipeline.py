@@ -0,0 +1,546 @@
+"""
+Message pipeline orchestrator
+Runs intent extraction, reply generation and action planning for a message
+"""
+from typing import AsyncIterator, Awaitable, Dict, Optional
+import asyncio
+import time
+
+from app.config import settings
+from app.services.ai_service import FALLBACK_RESPONSE, ai_service
+from app.services.action_planner import action_planner
+from app.services.degraded_mode import degraded_mode
+from app.services.faq_service import faq_service
+from app.services.intent_classifier import detect_urgency, intent_classifier
+from app.services.llm_metrics import llm_metrics
+from app.utils.logger import logger
+
+# Minimum intent confidence before an action plan is attached
+ACTION_PLAN_CONFIDENCE = 0.7
+
+# Minimum local classifier confidence before an action plan is started speculatively
+SPECULATION_CONFIDENCE = 0.5
+
+
+class MessagePipeline:
+    """
+    Orchestrates the LLM stages needed to answer a message
+
+    In "fused" mode a single structured call returns intent, reply and plan.
+    In "parallel" mode intent extraction and reply generation run as
+    concurrent tasks, and the action plan is started speculatively when a
+    cheap local pre-classifier predicts a specific domain; the speculative
+    plan is cancelled if the extracted intent does not need it. Either way,
+    wall-clock time is the longest stage rather than the sum of all stages.
+
+    When the conversation already has a plan in the same domain, no new plan
+    is drafted; a small patch call updates the existing one instead. Messages
+    naming a known scheme use its precomputed plan from the scheme library.
+    
+    Messages that closely match a stored FAQ question are answered from the
+    FAQ store with no LLM call at all, unless they look urgent. While the LLM
+    is failing, messages are answered in degraded mode where possible.
+
+    stream answers the same way as run but yields the reply as the provider
+    produces it, for the streaming web endpoint.
+    """
+
+    def __init__(self):
+        self.mode = settings.PIPELINE_MODE
+        self._stage_stats: Dict[str, Dict[str, float]] = {}
+        self._speculation = {"started": 0, "used": 0, "cancelled": 0, "mispredicted": 0}
+        logger.info(f"Message pipeline initialized (mode: {self.mode})")
+
+    async def run(
+        self,
+        user_message: str,
+        user_context: Dict,
+        language: str = "en",
+        literacy_level: str = "medium",
+        current_plan: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Answer a message and report per-stage timings
+
+        Args:
+            user_message: The user's input message
+            user_context: User profile and context information
+            language: Target language code
+            literacy_level: User's literacy level (low/medium/high)
+            current_plan: Latest action plan in the conversation; a follow-up
+                in the same domain patches it instead of drafting a new one
+
+        Returns:
+            Dict with intent, response_text, action_plan (finalized or None),
+            success (False when the LLM call fell back to a canned reply) and
+            timings; "degraded" names the source of answers served without the LLM
+        """
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+
+        result = self._answer_from_faq(user_message, user_context, language, literacy_level, timings)
+        if result is None and degraded_mode.active:
+            # The LLM is failing: answer without it when possible instead of queueing for an apology
+            result = await self._answer_degraded(user_message, user_context, language, literacy_level, timings)
+            if result is not None:
+                llm_metrics.record_avoided("understand", user_context.get("channel"), language, reason="degraded")
+
+        if result is None:
+            if self.mode == "parallel":
+                result = await self._run_parallel(
+                    user_message, user_context, language, literacy_level, current_plan, timings
+                )
+            else:
+                result = await self._run_fused(
+                    user_message, user_context, language, literacy_level, current_plan, timings
+                )
+
+            if not result["success"]:
+                result = await self._answer_degraded(
+                    user_message, user_context, language, literacy_level, timings
+                ) or result
+            elif current_plan is None and not user_context.get("conversation_summary"):
+                # Answers that do not depend on the conversation can be served to anyone during an outage
+                await degraded_mode.remember(
+                    user_message, language, literacy_level, result, location=user_context.get("location")
+                )
+
+        timings["total_ms"] = self._elapsed_ms(started)
+        self._record("total", timings["total_ms"])
+        result["timings"] = timings
+
+        logger.info(f"Pipeline ({self.mode}) finished in {timings['total_ms']}ms: {timings}")
+        return result
+
+    async def stream(
+        self,
+        user_message: str,
+        user_context: Dict,
+        language: str = "en",
+        literacy_level: str = "medium",
+        current_plan: Optional[Dict] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Answer a message like run, yielding the reply text as it is produced
+
+        Yields {"token": text} for each piece of the reply, then a single
+        {"result": ...} with the same fields as run. Answers given without
+        the LLM (FAQ store or degraded mode) arrive as one token. If the
+        stream breaks after some text was sent, the fallback reply is
+        appended and the result is marked partial and unsuccessful.
+        """
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+
+        result = self._answer_from_faq(user_message, user_context, language, literacy_level, timings)
+        if result is None and degraded_mode.active:
+            result = await self._answer_degraded(user_message, user_context, language, literacy_level, timings)
+            if result is not None:
+                llm_metrics.record_avoided("understand", user_context.get("channel"), language, reason="degraded")
+
+        if result is not None:
+            yield {"token": result["response_text"]}
+        else:
+            # Classify the message while the reply streams
+            intent_task = asyncio.create_task(
+                self._timed("intent", ai_service.extract_intent(user_message, language), timings)
+            )
+            chunks = []
+            error = None
+            stream_started = time.perf_counter()
+            try:
+                try:
+                    async for chunk in ai_service.stream_response(
+                        user_message=user_message,
+                        context=dict(user_context),
+                        language=language,
+                        literacy_level=literacy_level,
+                        fallback=False
+                    ):
+                        chunks.append(chunk)
+                        yield {"token": chunk}
+                except Exception as e:
+                    error = e
+                finally:
+                    timings["response_ms"] = self._elapsed_ms(stream_started)
+
+                if error is not None and not chunks:
+                    # Nothing was sent yet, so a degraded answer can still replace the reply
+                    result = await self._answer_degraded(
+                        user_message, user_context, language, literacy_level, timings
+                    )
+                    if result is not None:
+                        yield {"token": result["response_text"]}
+
+                if result is None:
+                    intent_data = await intent_task
+                    user_context["intent"] = intent_data
+                    if error is None:
+                        result = {
+                            "intent": intent_data,
+                            "response_text": "".join(chunks),
+                            "action_plan": await self._stream_plan(
+                                user_message, user_context, language, current_plan, timings
+                            ),
+                            "success": True
+                        }
+                        if current_plan is None and not user_context.get("conversation_summary"):
+                            await degraded_mode.remember(
+                                user_message, language, literacy_level, result, location=user_context.get("location")
+                            )
+                    else:
+                        # Cut short (or never started): finish with the fallback reply
+                        fallback = f"\n\n{FALLBACK_RESPONSE}" if chunks else FALLBACK_RESPONSE
+                        yield {"token": fallback}
+                        result = {
+                            "intent": intent_data,
+                            "response_text": "".join(chunks) + fallback,
+                            "action_plan": None,
+                            "success": False
+                        }
+                        if chunks:
+                            result["partial"] = True
+            finally:
+                if not intent_task.done():
+                    intent_task.cancel()
+
+        timings["total_ms"] = self._elapsed_ms(started)
+        self._record("total", timings["total_ms"])
+        result["timings"] = timings
+
+        logger.info(f"Pipeline (stream) finished in {timings['total_ms']}ms: {timings}")
+        yield {"result": result}
+
+    async def _stream_plan(
+        self,
+        user_message: str,
+        user_context: Dict,
+        language: str,
+        current_plan: Optional[Dict],
+        timings: Dict[str, float]
+    ) -> Optional[Dict]:
+        """Action plan for a streamed reply, patching the conversation's plan when the domain matches"""
+        intent_data = user_context["intent"]
+        if not self._needs_action_plan(intent_data):
+            return None
+        if self._can_refine(current_plan, intent_data):
+            return await self._refine(user_message, current_plan, user_context, language, timings)
+        return await self._timed(
+            "action_plan",
+            action_planner.create_action_plan(
+                user_query=user_message,
+                domain=intent_data["domain"],
+                user_context=user_context,
+                language=language
+            ),
+            timings
+        )
+
+    async def _run_fused(
+        self,
+        user_message: str,
+        user_context: Dict,
+        language: str,
+        literacy_level: str,
+        current_plan: Optional[Dict],
+        timings: Dict[str, float]
+    ) -> Dict:
+        # A message naming a known scheme gets its precomputed plan, so none is drafted inline
+        library_plan = None
+        if current_plan is None:
+            library_plan = action_planner.library_plan(user_message, None, user_context, language)
+
+        fused = await self._timed(
+            "fused",
+            ai_service.understand_and_respond(
+                user_message=user_message,
+                context=dict(user_context),
+                language=language,
+                literacy_level=literacy_level,
+                draft_plan=current_plan is None and library_plan is None
+            ),
+            timings
+        )
+
+        intent_data = fused["intent"]
+        user_context["intent"] = intent_data
+
+        action_plan = None
+        if self._needs_action_plan(intent_data):
+            if self._can_refine(current_plan, intent_data):
+                action_plan = await self._refine(user_message, current_plan, user_context, language, timings)
+            elif library_plan is not None and library_plan["domain"] == intent_data["domain"]:
+                llm_metrics.record_avoided("action_plan", user_context.get("channel"), language, reason="scheme_library")
+                action_plan = library_plan
+            elif fused.get("action_plan"):
+                action_plan = action_planner.finalize_action_plan(
+                    fused["action_plan"],
+                    domain=intent_data["domain"],
+                    user_context=user_context,
+                    language=language
+                )
+            elif current_plan is not None or library_plan is not None:
+                # The plan expected from elsewhere does not fit the extracted domain
+                action_plan = await self._timed(
+                    "action_plan",
+                    action_planner.create_action_plan(
+                        user_query=user_message,
+                        domain=intent_data["domain"],
+                        user_context=user_context,
+                        language=language
+                    ),
+                    timings
+                )
+
+        return {
+            "intent": intent_data,
+            "response_text": fused.get("response_text", ""),
+            "action_plan": action_plan,
+            "success": fused.get("success", True)
+        }
+
+    async def _run_parallel(
+        self,
+        user_message: str,
+        user_context: Dict,
+        language: str,
+        literacy_level: str,
+        current_plan: Optional[Dict],
+        timings: Dict[str, float]
+    ) -> Dict:
+        intent_task = asyncio.create_task(
+            self._timed("intent", ai_service.extract_intent(user_message, language), timings)
+        )
+        response_task = asyncio.create_task(
+            self._timed(
+                "response",
+                ai_service.generate_response(
+                    user_message=user_message,
+                    context=dict(user_context),
+                    language=language,
+                    literacy_level=literacy_level
+                ),
+                timings
+            )
+        )
+
+        # Speculatively start the action plan when the message clearly targets a domain;
+        # follow-ups to an existing plan are patched instead
+        predicted_domain = predict_domain(user_message)
+        plan_task: Optional[asyncio.Task] = None
+        if predicted_domain != "general" and current_plan is None:
+            self._speculation["started"] += 1
+            plan_task = asyncio.create_task(
+                self._timed(
+                    "speculative_plan",
+                    action_planner.create_action_plan(
+                        user_query=user_message,
+                        domain=predicted_domain,
+                        user_context=dict(user_context),
+                        language=language
+                    ),
+                    timings
+                )
+            )
+
+        try:
+            intent_data = await intent_task
+            user_context["intent"] = intent_data
+
+            action_plan = None
+            if self._needs_action_plan(intent_data):
+                if self._can_refine(current_plan, intent_data):
+                    action_plan = await self._refine(user_message, current_plan, user_context, language, timings)
+                elif plan_task is not None and intent_data["domain"] == predicted_domain:
+                    self._speculation["used"] += 1
+                    action_plan = await plan_task
+                else:
+                    if plan_task is not None:
+                        self._speculation["mispredicted"] += 1
+                        self._cancel(plan_task)
+                    action_plan = await self._timed(
+                        "action_plan",
+                        action_planner.create_action_plan(
+                            user_query=user_message,
+                            domain=intent_data["domain"],
+                            user_context=user_context,
+                            language=language
+                        ),
+                        timings
+                    )
+            elif plan_task is not None:
+                self._cancel(plan_task)
+
+            response = await response_task
+        except BaseException:
+            for task in (intent_task, response_task, plan_task):
+                if task is not None and not task.done():
+                    task.cancel()
+            raise
+
+        return {
+            "intent": intent_data,
+            "response_text": response.get("response_text", ""),
+            "action_plan": action_plan,
+            "success": response.get("success", True)
+        }
+
+    def _answer_from_faq(
+        self,
+        user_message: str,
+        user_context: Dict,
+        language: str,
+        literacy_level: str,
+        timings: Dict[str, float]
+    ) -> Optional[Dict]:
+        """
+        Answer from the FAQ store, with the scheme's stored plan if any, or None
+
+        Urgent-looking messages are never answered from the FAQ store.
+        """
+        if detect_urgency(user_message) == "high":
+            return None
+
+        faq_started = time.perf_counter()
+        faq = faq_service.match(user_message, language, literacy_level)
+        timings["faq_ms"] = self._elapsed_ms(faq_started)
+        if faq is None:
+            return None
+
+        channel = user_context.get("channel")
+        llm_metrics.record_avoided("understand", channel, language, reason="faq")
+
+        intent_data = {
+            "intent": "faq",
+            "domain": faq["domain"],
+            "entities": {},
+            "urgency": "medium",
+            "confidence": faq["score"],
+            "source": "faq",
+            "faq_id": faq["id"]
+        }
+        user_context["intent"] = intent_data
+
+        action_plan = None
+        if faq["scheme_id"] and self._needs_action_plan(intent_data):
+            action_plan = action_planner.library_plan(user_message, faq["domain"], user_context, language)
+
+        logger.info(f"Answered from FAQ entry {faq['id']} (similarity {faq['score']})")
+        return {
+            "intent": intent_data,
+            "response_text": faq["answer"],
+            "action_plan": action_plan,
+            "success": True
+        }
+
+    async def _answer_degraded(
+        self,
+        user_message: str,
+        user_context: Dict,
+        language: str,
+        literacy_level: str,
+        timings: Dict[str, float]
+    ) -> Optional[Dict]:
+        """Answer from remembered answers, the FAQ store or the knowledge base, or None"""
+        degraded = await self._timed(
+            "degraded",
+            degraded_mode.answer(user_message, language, literacy_level, location=user_context.get("location")),
+            timings
+        )
+        if degraded is None:
+            return None
+
+        intent_data = degraded["intent"]
+        user_context["intent"] = intent_data
+
+        action_plan = degraded["action_plan"]
+        if action_plan is None and self._needs_action_plan(intent_data):
+            action_plan = action_planner.knowledge_base_plan(user_message, intent_data["domain"], user_context, language)
+
+        return {
+            "intent": intent_data,
+            "response_text": degraded["response_text"],
+            "action_plan": action_plan,
+            "success": True,
+            "degraded": degraded["source"]
+        }
+
+    def get_stats(self) -> Dict:
+        """Per-stage timing aggregates and speculation counters for the metrics endpoint"""
+        stages = {
+            stage: {
+                "count": int(stats["count"]),
+                "avg_ms": round(stats["total_ms"] / stats["count"], 2) if stats["count"] else 0.0,
+                "max_ms": stats["max_ms"]
+            }
+            for stage, stats in self._stage_stats.items()
+        }
+        return {
+            "mode": self.mode,
+            "stages": stages,
+            "speculation": dict(self._speculation)
+        }
+
+    def _needs_action_plan(self, intent_data: Dict) -> bool:
+        return (
+            intent_data.get("domain") != "general"
+            and intent_data.get("confidence", 0) > ACTION_PLAN_CONFIDENCE
+        )
+
+    @staticmethod
+    def _can_refine(current_plan: Optional[Dict], intent_data: Dict) -> bool:
+        return current_plan is not None and current_plan.get("domain") == intent_data.get("domain")
+
+    async def _refine(
+        self,
+        user_message: str,
+        current_plan: Dict,
+        user_context: Dict,
+        language: str,
+        timings: Dict[str, float]
+    ) -> Dict:
+        return await self._timed(
+            "plan_refine",
+            action_planner.refine_action_plan(
+                user_query=user_message,
+                current_plan=current_plan,
+                user_context=user_context,
+                language=language
+            ),
+            timings
+        )
+
+    def _cancel(self, task: asyncio.Task):
+        self._speculation["cancelled"] += 1
+        task.cancel()
+
+    async def _timed(self, stage: str, awaitable: Awaitable, timings: Dict[str, float]):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            timings[f"{stage}_ms"] = self._elapsed_ms(started)
+            self._record(stage, timings[f"{stage}_ms"])
+
+    def _record(self, stage: str, elapsed_ms: float):
+        stats = self._stage_stats.setdefault(stage, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    @staticmethod
+    def _elapsed_ms(started: float) -> float:
+        return round((time.perf_counter() - started) * 1000, 2)
+
+
+def predict_domain(text: str) -> str:
+    """
+    Cheap local pre-classifier used to decide whether to start planning early
+
+    Returns the local classifier's domain, or "general" when it is unsure.
+    """
+    domain, confidence = intent_classifier.predict_domain(text)
+    return domain if confidence >= SPECULATION_CONFIDENCE else "general"
+
+# Initialize singleton
+message_pipeline = MessagePipeline()
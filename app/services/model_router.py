@@ -0,0 +1,122 @@
+"""
+Per-task, per-channel model routing
+Picks the model, output budget and stop conditions for each LLM call so short
+channels do not pay for generations that are truncated afterwards.
+"""
+from typing import Dict, Optional
+import copy
+
+from app.config import settings
+
+# Defaults per task; "json" asks the provider for a JSON response body
+TASK_ROUTES: Dict[str, Dict] = {
+    "intent": {"model": "fast", "max_output_tokens": 256, "temperature": 0.0, "json": True},
+    "understand": {"model": "default", "max_output_tokens": 2048, "temperature": 0.4, "json": True},
+    "response": {
+        "model": "default",
+        "max_output_tokens": 1024,
+        "temperature": 0.7,
+        "stop_sequences": ["User Query:"]
+    },
+    "action_plan": {"model": "default", "max_output_tokens": 1536, "temperature": 0.3, "json": True},
+    "plan_patch": {"model": "default", "max_output_tokens": 384, "temperature": 0.2, "json": True},
+    "plan_translate": {"model": "default", "max_output_tokens": 2048, "temperature": 0.1, "json": True},
+    "simplify": {"model": "fast", "max_output_tokens": 512, "temperature": 0.3, "stop_sequences": ["Original text:"]},
+    "summary": {"model": "fast", "max_output_tokens": 256, "temperature": 0.2}
+}
+
+SMS_REPLY_INSTRUCTIONS = (
+    "This reply is sent as an SMS: answer in at most 2 short sentences "
+    "(under 300 characters), plain text, no markdown."
+)
+SMS_PLAN_INSTRUCTIONS = (
+    "This plan is sent as an SMS: keep the summary to one sentence, give at most "
+    "3 immediate actions and list only the 2 most important documents."
+)
+VOICE_REPLY_INSTRUCTIONS = (
+    "This reply is read aloud on a phone call: answer in at most 3 short spoken "
+    "sentences with no lists, numbering or formatting."
+)
+
+# Channel-specific overrides, merged over TASK_ROUTES
+CHANNEL_ROUTES: Dict[str, Dict[str, Dict]] = {
+    "sms": {
+        "response": {"max_output_tokens": 160, "instructions": SMS_REPLY_INSTRUCTIONS},
+        "understand": {
+            "max_output_tokens": 768,
+            "instructions": f"Keep response_text under 300 characters. {SMS_PLAN_INSTRUCTIONS}"
+        },
+        "action_plan": {"max_output_tokens": 512, "instructions": SMS_PLAN_INSTRUCTIONS}
+    },
+    "whatsapp": {
+        "response": {"max_output_tokens": 600},
+        "understand": {"max_output_tokens": 1536},
+        "action_plan": {"max_output_tokens": 1024}
+    },
+    "voice": {
+        "response": {"max_output_tokens": 250, "instructions": VOICE_REPLY_INSTRUCTIONS},
+        "understand": {
+            "max_output_tokens": 768,
+            "instructions": "Write response_text as at most 3 short spoken sentences with no lists or formatting."
+        },
+        "simplify": {"max_output_tokens": 250, "instructions": VOICE_REPLY_INSTRUCTIONS}
+    },
+    "web": {}
+}
+
+
+class ModelRouter:
+    """
+    Resolves the generation settings for a (task, channel) pair
+
+    Routes name a model tier ("default" or "fast") that maps to LLM_MODEL and
+    LLM_FAST_MODEL, so changing models is a configuration change.
+    """
+
+    def __init__(self):
+        self.models = {
+            "default": settings.LLM_MODEL,
+            "fast": settings.LLM_FAST_MODEL or settings.LLM_MODEL
+        }
+        self._routes: Dict[str, Dict] = {}
+        self._counts: Dict[str, int] = {}
+
+    def route(self, task: str, channel: Optional[str] = None) -> Dict:
+        """
+        Return the generation settings for a call
+
+        Returns:
+            Dict with model, max_output_tokens, temperature, stop_sequences,
+            json and instructions (text appended to the prompt, may be empty)
+        """
+        channel = channel or "web"
+        key = f"{task}:{channel}"
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+        route = self._routes.get(key)
+        if route is None:
+            route = self._routes[key] = self._resolve(task, channel)
+        return route
+
+    def get_stats(self) -> Dict:
+        """Calls per route and the resolved budgets for the metrics endpoint"""
+        return {
+            "models": dict(self.models),
+            "calls": dict(self._counts),
+            "routes": {
+                key: {"model": route["model"], "max_output_tokens": route["max_output_tokens"]}
+                for key, route in self._routes.items()
+            }
+        }
+
+    def _resolve(self, task: str, channel: str) -> Dict:
+        route = copy.deepcopy(TASK_ROUTES.get(task, TASK_ROUTES["response"]))
+        route.update(copy.deepcopy(CHANNEL_ROUTES.get(channel, {}).get(task, {})))
+        route["model"] = self.models.get(route["model"], route["model"])
+        route.setdefault("stop_sequences", [])
+        route.setdefault("json", False)
+        route.setdefault("instructions", "")
+        return route
+
+# Initialize singleton
+model_router = ModelRouter()
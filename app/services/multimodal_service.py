@@ -1,6 +1,7 @@
 from gtts import gTTS
 from pathlib import Path
 from typing import Optional
+import asyncio
 import uuid
 from app.config import settings
 from app.utils.logger import logger
@@ -55,9 +56,9 @@ class MultimodalService:
             filename = f"{uuid.uuid4()}.mp3"
             filepath = self.audio_path / filename
             
-            # Generate speech
+            # Generate speech off the event loop (gTTS does blocking HTTP calls)
             tts = gTTS(text=text, lang=gtts_lang, slow=slow)
-            tts.save(str(filepath))
+            await asyncio.to_thread(tts.save, str(filepath))
             
             logger.info(f"Generated audio file: {filename}")
             return str(filepath)
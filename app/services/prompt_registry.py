@@ -0,0 +1,220 @@
+"""
+System prompt registry
+Loads data/prompts/system_prompts.json once, precompiles a system prompt per
+(domain, language, literacy) combination and reloads when the file changes.
+"""
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import json
+import os
+import time
+
+from app.config import settings
+from app.services.knowledge_base import DATA_DIR
+from app.utils.logger import logger
+from app.utils.text import estimate_tokens
+
+PROMPTS_FILE = DATA_DIR / "prompts" / "system_prompts.json"
+
+LITERACY_INSTRUCTIONS = {
+    "low": "Use very simple language, short sentences, avoid technical terms. Explain everything step-by-step.",
+    "medium": "Use clear language, moderate complexity, explain technical terms when used.",
+    "high": "Use standard language, can include technical information with proper context."
+}
+
+BASE_PROMPT = """You are SahaayAI, a compassionate AI assistant helping underserved communities access essential services like healthcare, government schemes, financial literacy, agriculture support, and education.
+{domain_prompt}
+User Profile:
+- Language: {language}
+- Literacy Level: {literacy_level}
+- Location: {location}
+
+Communication Guidelines:
+- {literacy_instructions}
+- Be empathetic, patient, and respectful
+- Provide actionable, practical advice
+- Focus on immediate help and clear next steps
+- Ask clarifying questions when needed
+- Always prioritize user safety and well-being
+- Provide information about local resources when possible
+- Respect cultural context and sensitivities
+
+Response Format:
+- Start with acknowledging the user's concern
+- Provide clear, numbered steps when giving instructions
+- End with asking if they need more help
+- Keep responses concise but complete
+
+Remember: You're helping people who may be in difficult situations, have limited resources, and need clear, actionable guidance."""
+
+# Marker left in compiled templates where the per-user location is inserted
+LOCATION_MARKER = "\x00location\x00"
+
+# Seconds between checks of the prompts file's modification time
+RELOAD_CHECK_INTERVAL_SECONDS = 5.0
+
+
+class PromptRegistry:
+    """
+    Serves precompiled system prompts
+
+    Every (domain, language, literacy) combination is rendered at load time,
+    leaving only the location and the conversation summary to be filled in
+    per request. The prompts file is re-read when its modification time
+    changes; if the new file is invalid the previous templates stay in use.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or PROMPTS_FILE)
+        self._domain_prompts: Dict[str, Dict[str, str]] = {}
+        self._compiled: Dict[Tuple[str, str, str], Tuple[str, str]] = {}
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._stats = {"renders": 0, "reloads": 0, "reload_errors": 0}
+        self.reload()
+
+    def render(
+        self,
+        domain: str,
+        language: str,
+        literacy_level: str,
+        location: Optional[str] = None,
+        conversation_summary: Optional[str] = None
+    ) -> str:
+        """
+        Return the system prompt for a user
+
+        Args:
+            domain: Detected domain; domains without a prompt use "general"
+            language: Target language code; unsupported codes use English
+            literacy_level: User's literacy level (low/medium/high)
+            location: User's location, if known
+            conversation_summary: Rolling summary of earlier turns, if any
+        """
+        self._maybe_reload()
+        self._stats["renders"] += 1
+
+        # Unknown values map onto precompiled templates, so the set never grows per request
+        if literacy_level not in LITERACY_INSTRUCTIONS:
+            literacy_level = "medium"
+        if domain not in self._domain_prompts:
+            domain = "general"
+        if language not in settings.supported_languages_list:
+            language = "en"
+
+        head, tail = self._compiled[(domain, language, literacy_level)]
+        prompt = f"{head}{location or 'Not specified'}{tail}"
+
+        if conversation_summary:
+            prompt += f"\n\nConversation so far (use it to understand follow-up questions):\n{conversation_summary}"
+
+        return prompt
+
+    def reload(self) -> bool:
+        """
+        Load and validate the prompts file and recompile all templates
+
+        Returns:
+            True if the file was loaded, False if it was missing or invalid
+        """
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, encoding="utf-8") as f:
+                domain_prompts = self._validate(json.load(f))
+        except (OSError, ValueError) as e:
+            self._stats["reload_errors"] += 1
+            logger.error(f"Error loading system prompts from {self.path}: {str(e)}")
+            return False
+
+        compiled = {}
+        for domain in list(domain_prompts) + ["general"]:
+            for language in settings.supported_languages_list:
+                for literacy_level in LITERACY_INSTRUCTIONS:
+                    key = (domain, language, literacy_level)
+                    compiled[key] = self._compile(*key, domain_prompts=domain_prompts)
+
+        # Swap in the new state only once everything compiled
+        self._domain_prompts = domain_prompts
+        self._compiled = compiled
+        self._mtime = mtime
+        self._stats["reloads"] += 1
+        logger.info(f"Loaded {len(compiled)} system prompt templates from {self.path}")
+        return True
+
+    def template_token_sizes(self) -> Dict[str, int]:
+        """Estimated tokens per compiled template, keyed by domain/language/literacy"""
+        return {
+            "/".join(key): estimate_tokens(head + tail)
+            for key, (head, tail) in self._compiled.items()
+        }
+
+    def get_stats(self) -> Dict:
+        """Template counts and prompt token sizes for the metrics endpoint"""
+        sizes = self.template_token_sizes()
+        largest = max(sizes.items(), key=lambda item: item[1]) if sizes else (None, 0)
+        return {
+            **self._stats,
+            "path": str(self.path),
+            "templates": len(sizes),
+            "domains": sorted(self._domain_prompts),
+            "avg_tokens": round(sum(sizes.values()) / len(sizes), 1) if sizes else 0.0,
+            "max_tokens": largest[1],
+            "largest_template": largest[0]
+        }
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < RELOAD_CHECK_INTERVAL_SECONDS:
+            return
+        self._last_check = now
+
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            # Remember the new mtime even if the reload fails, so a broken file is reported once
+            self._mtime = mtime
+            logger.info(f"System prompts changed on disk, reloading {self.path}")
+            self.reload()
+
+    def _compile(
+        self,
+        domain: str,
+        language: str,
+        literacy_level: str,
+        domain_prompts: Optional[Dict[str, Dict[str, str]]] = None
+    ) -> Tuple[str, str]:
+        translations = (domain_prompts if domain_prompts is not None else self._domain_prompts).get(domain, {})
+        domain_prompt = translations.get(language) or translations.get("en", "")
+
+        prompt = BASE_PROMPT.format(
+            domain_prompt=f"\n{domain_prompt}\n" if domain_prompt else "",
+            language=language,
+            literacy_level=literacy_level,
+            location=LOCATION_MARKER,
+            literacy_instructions=LITERACY_INSTRUCTIONS[literacy_level]
+        )
+        head, tail = prompt.split(LOCATION_MARKER)
+        return head, tail
+
+    @staticmethod
+    def _validate(data: Dict) -> Dict[str, Dict[str, str]]:
+        """Check the file layout and return the system_prompts section"""
+        domain_prompts = data.get("system_prompts") if isinstance(data, dict) else None
+        if not isinstance(domain_prompts, dict) or not domain_prompts:
+            raise ValueError("missing or empty \"system_prompts\" section")
+
+        for domain, translations in domain_prompts.items():
+            if not isinstance(translations, dict):
+                raise ValueError(f"prompts for domain {domain!r} must be an object of language -> text")
+            if "en" not in translations:
+                raise ValueError(f"domain {domain!r} has no English prompt")
+            for language, text in translations.items():
+                if not isinstance(text, str) or not text.strip():
+                    raise ValueError(f"prompt {domain}/{language} must be a non-empty string")
+
+        return domain_prompts
+
+# Initialize singleton
+prompt_registry = PromptRegistry()
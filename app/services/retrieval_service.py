@@ -0,0 +1,290 @@
+"""
+Knowledge retrieval
+Keeps an in-memory BM25 index over passages from data/knowledge_base/schemes.json
+and the knowledge_base table, and returns the passages most relevant to a
+message so prompts can be grounded in them. BM25 results are fused with the
+dense vector index, which also matches Indic-script messages.
+
+Usage:
+    python -m app.services.retrieval_service search "documents for PM-KISAN"
+"""
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse
+import heapq
+import math
+import time
+
+from app.config import settings
+from app.services.knowledge_base import passages_from_knowledge_base, passages_from_row
+from app.services.vector_index import vector_index
+from app.utils.logger import logger
+from app.utils.text import estimate_tokens, tokenize
+
+# BM25 term-frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Passages scoring below this fraction of the best passage are left out
+MIN_RELATIVE_SCORE = 0.5
+
+# Reciprocal rank fusion damping: a passage scores 1 / (RRF_K + rank) per result list
+RRF_K = 60
+
+# Session.info key holding knowledge_base rows flushed but not yet committed
+PENDING_ROWS_KEY = "knowledge_retriever_pending"
+
+def _terms(text: str) -> List[str]:
+    """Index terms: tokens without stopwords, with a plural "s" dropped"""
+    return [
+        token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+        for token in tokenize(text)
+    ]
+
+
+class BM25Index:
+    """
+    Inverted index scored with Okapi BM25
+
+    Documents can be added, replaced and removed one at a time; document
+    frequencies and the average length are kept current, so no rebuild is
+    needed when the corpus changes.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._lengths: Dict[str, int] = {}
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._total_length = 0
+
+    def add(self, doc_id: str, text: str):
+        """Index a document, replacing any earlier version with the same id"""
+        self.remove(doc_id)
+        counts = Counter(_terms(text))
+        for term, count in counts.items():
+            self._postings[term][doc_id] = count
+        length = sum(counts.values())
+        self._lengths[doc_id] = length
+        self._doc_terms[doc_id] = list(counts)
+        self._total_length += length
+
+    def remove(self, doc_id: str):
+        if doc_id not in self._lengths:
+            return
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def search(self, text: str, limit: int) -> List[Tuple[str, float]]:
+        """Top documents for a query as (doc_id, score), best first"""
+        total = len(self._lengths)
+        if not total:
+            return []
+        average_length = self._total_length / total
+
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(_terms(text)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, count in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc_id] / average_length)
+                scores[doc_id] += idf * count * (BM25_K1 + 1) / (count + norm)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+
+class KnowledgeRetriever:
+    """
+    Retrieves knowledge passages for a message
+
+    schemes.json is indexed on first use. build_from_database adds the
+    knowledge_base table at startup, and watch_database keeps the index in
+    step with inserts, updates and deletes committed through the ORM.
+    """
+
+    def __init__(self):
+        self.enabled = settings.RETRIEVAL_ENABLED
+        self.top_k = settings.RETRIEVAL_TOP_K
+        self.max_tokens = settings.RETRIEVAL_MAX_TOKENS
+        self._index = BM25Index()
+        self._passages: Dict[str, Dict] = {}
+        self._row_passages: Dict[int, List[str]] = {}
+        self._loaded = False
+        self._watching = False
+        self._stats = {"searches": 0, "total_us": 0.0, "max_us": 0.0, "row_updates": 0}
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Most relevant passages for a message, best first
+
+        BM25 and dense vector results are merged by reciprocal rank fusion;
+        ties keep the BM25 order. Dense results for passages no longer in
+        the index (deleted rows) are dropped.
+
+        Returns:
+            Passage dicts (id, title, text, domain, language, source) with a
+            fused score
+        """
+        if not self.enabled or not text:
+            return []
+        self._ensure_loaded()
+        limit = limit or self.top_k
+
+        started = time.perf_counter()
+        results = self._index.search(text, limit)
+        if results:
+            cutoff = results[0][1] * MIN_RELATIVE_SCORE
+            results = [(passage_id, score) for passage_id, score in results if score >= cutoff]
+        dense = [passage["id"] for passage in vector_index.search(text, limit) if passage["id"] in self._passages]
+
+        fused: Dict[str, float] = defaultdict(float)
+        for ranking in ([passage_id for passage_id, _ in results], dense):
+            for rank, passage_id in enumerate(ranking, 1):
+                fused[passage_id] += 1 / (RRF_K + rank)
+        ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+        elapsed_us = (time.perf_counter() - started) * 1_000_000
+        self._stats["searches"] += 1
+        self._stats["total_us"] += elapsed_us
+        self._stats["max_us"] = max(self._stats["max_us"], elapsed_us)
+
+        return [
+            {**self._passages[passage_id], "score": round(score * RRF_K, 3)}
+            for passage_id, score in ranked
+        ]
+
+    def context_for(self, text: str) -> str:
+        """Passages for a message formatted for a prompt, within RETRIEVAL_MAX_TOKENS"""
+        lines = []
+        budget = self.max_tokens
+        for passage in self.search(text):
+            line = f"- {passage['title']}: {passage['text']}"
+            cost = estimate_tokens(line)
+            if cost > budget:
+                break
+            lines.append(line)
+            budget -= cost
+        return "\n".join(lines)
+
+    def add_passages(self, passages: Iterable[Dict]) -> List[str]:
+        ids = []
+        for passage in passages:
+            self._passages[passage["id"]] = passage
+            self._index.add(passage["id"], f"{passage['title']} {passage['text']} {passage.get('keywords', '')}")
+            ids.append(passage["id"])
+        return ids
+
+    def upsert_row(self, row):
+        """Index a knowledge_base row, replacing its earlier passages"""
+        self._replace_row(row.id, passages_from_row(row))
+
+    def remove_row(self, row_id: int):
+        for passage_id in self._row_passages.pop(row_id, []):
+            self._index.remove(passage_id)
+            self._passages.pop(passage_id, None)
+
+    def build_from_database(self):
+        """Index every knowledge_base row (called at startup)"""
+        from app.database import SessionLocal, KnowledgeBase
+
+        if not self.enabled:
+            return
+        db = SessionLocal()
+        try:
+            rows = db.query(KnowledgeBase).all()
+            for row in rows:
+                self.upsert_row(row)
+        finally:
+            db.close()
+        logger.info(f"Knowledge retrieval index: {len(self._index)} passages ({len(rows)} database rows)")
+
+    def watch_database(self):
+        """
+        Re-index knowledge_base rows once the transaction that changed them commits
+
+        Passages are built when the rows are flushed (attributes are expired by
+        the time after_commit runs) and dropped if the transaction rolls back,
+        so a rolled-back write never becomes searchable.
+        """
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+        from app.database import KnowledgeBase
+
+        if self._watching or not self.enabled:
+            return
+
+        def collect(session, flush_context):
+            pending = session.info.setdefault(PENDING_ROWS_KEY, {})
+            for row in chain(session.new, session.dirty):
+                if isinstance(row, KnowledgeBase):
+                    pending[row.id] = passages_from_row(row)
+            for row in session.deleted:
+                if isinstance(row, KnowledgeBase):
+                    pending[row.id] = None
+
+        def apply(session):
+            for row_id, passages in session.info.pop(PENDING_ROWS_KEY, {}).items():
+                if passages is None:
+                    self.remove_row(row_id)
+                else:
+                    self._replace_row(row_id, passages)
+
+        event.listen(Session, "after_flush", collect)
+        event.listen(Session, "after_commit", apply)
+        event.listen(Session, "after_rollback", lambda session: session.info.pop(PENDING_ROWS_KEY, None))
+        self._watching = True
+
+    def get_stats(self) -> Dict:
+        searches = self._stats["searches"]
+        return {
+            "enabled": self.enabled,
+            "passages": len(self._index),
+            "database_rows": len(self._row_passages),
+            "searches": searches,
+            "avg_us": round(self._stats["total_us"] / searches, 1) if searches else 0.0,
+            "max_us": round(self._stats["max_us"], 1),
+            "row_updates": self._stats["row_updates"]
+        }
+
+    def _replace_row(self, row_id: int, passages: List[Dict]):
+        self._ensure_loaded()
+        self.remove_row(row_id)
+        self._row_passages[row_id] = self.add_passages(passages)
+        self._stats["row_updates"] += 1
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._loaded = True
+            self.add_passages(passages_from_knowledge_base())
+
+# Initialize singleton
+knowledge_retriever = KnowledgeRetriever()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Query the knowledge retrieval index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = subparsers.add_parser("search", help="Show the passages retrieved for a message")
+    search_parser.add_argument("text")
+    search_parser.add_argument("-k", type=int, default=settings.RETRIEVAL_TOP_K)
+    search_parser.add_argument("--with-db", action="store_true", help="Also index the knowledge_base table")
+
+    args = parser.parse_args(argv)
+
+    if args.with_db:
+        knowledge_retriever.build_from_database()
+    for passage in knowledge_retriever.search(args.text, args.k):
+        print(f"{passage['score']:.3f}  {passage['id']}  {passage['title']}: {passage['text']}")
+
+
+if __name__ == "__main__":
+    main()
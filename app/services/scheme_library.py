@@ -0,0 +1,300 @@
+"""
+Precomputed action plans for known schemes
+Builds canonical action plans per scheme, language and literacy level from
+data/knowledge_base/schemes.json, and serves them when a query names one
+of those schemes, so the plan does not need an LLM call.
+
+Usage:
+    python -m app.services.scheme_library build
+    python -m app.services.scheme_library build --translate --languages en,hi,bn
+    python -m app.services.scheme_library show pmkisan --language en --literacy low
+"""
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import argparse
+import asyncio
+import copy
+import hashlib
+import json
+
+from app.config import settings
+from app.services.knowledge_base import KNOWLEDGE_BASE_DIR, SCHEMES_FILE, get_schemes
+from app.utils.logger import logger
+from app.utils.text import normalize_text
+
+ACTION_PLAN_LIBRARY_FILE = KNOWLEDGE_BASE_DIR / "action_plans.json"
+
+LITERACY_LEVELS = ["low", "medium", "high"]
+
+# Names people use for a scheme that its official name does not contain
+EXTRA_ALIASES = {
+    "pmjay": ["ayushman", "ayushman card", "आयुष्मान"],
+    "pmkisan": ["kisan samman", "किसान सम्मान"],
+    "pmjjby": ["jeevan jyoti", "जीवन ज्योति"]
+}
+
+# Squashed aliases shorter than this match too much by accident
+MIN_ALIAS_LENGTH = 5
+
+SCAM_ALERT = "Never pay an agent or share your OTP to apply for a government scheme"
+
+
+def _squash(text: str) -> str:
+    return normalize_text(text).replace(" ", "")
+
+
+def scheme_aliases(scheme: Dict) -> List[str]:
+    """Names a query may use for a scheme: its id, its name and the parts of its name"""
+    name = scheme.get("name", "")
+    candidates = [scheme["id"], name, *EXTRA_ALIASES.get(scheme["id"], [])]
+    if "(" in name:
+        outer, inner = name.split("(", 1)
+        candidates += [outer, inner.rstrip(")")]
+    aliases = []
+    for candidate in candidates:
+        alias = _squash(candidate)
+        if len(alias) >= MIN_ALIAS_LENGTH and alias not in aliases:
+            aliases.append(alias)
+    return aliases
+
+
+def source_hash(path: Path = SCHEMES_FILE) -> str:
+    """Hash of the knowledge base the library was built from"""
+    return hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+
+
+def canonical_plan(scheme: Dict, literacy_level: str) -> Dict:
+    """
+    Build the English action plan for a scheme at a literacy level
+
+    Low literacy gets a one-sentence summary and only the key criteria;
+    high literacy also gets the website and fuller step details.
+    """
+    description = scheme.get("description", {}).get("en", "")
+    eligibility = scheme.get("eligibility", {})
+    steps = scheme.get("how_to_apply", {}).get("steps", [])
+    helpline = scheme.get("helpline", "")
+    website = scheme.get("website", "")
+    criteria = eligibility.get("criteria", [])
+
+    summary = f"{scheme['name']}: {description}" if description else scheme["name"]
+    if literacy_level == "low":
+        summary = description.split(". ")[0] if description else scheme["name"]
+        criteria = criteria[:2]
+
+    plan_steps = []
+    for number, step in enumerate(steps, start=1):
+        details = ""
+        if number == 1 and helpline:
+            details = f"Call {helpline} if you need help"
+        if literacy_level == "high" and website and ("portal" in step.lower() or "online" in step.lower()):
+            details = f"Apply online at {website}" + (f" or call {helpline}" if helpline else "")
+        plan_steps.append({"step_number": number, "action": step, "details": details})
+
+    resources = [{"name": scheme["name"], "contact": helpline}]
+    if literacy_level == "high" and website:
+        resources.append({"name": "Official website", "contact": website})
+
+    return {
+        "summary": summary,
+        "immediate_actions": steps[:2],
+        "steps": plan_steps,
+        "documents_required": list(eligibility.get("documents", [])),
+        "eligibility": {"criteria": list(criteria), "status": "check_needed"},
+        "risk_alerts": [SCAM_ALERT],
+        "resources": resources,
+        "estimated_time": "1-2 weeks",
+        "scheme_id": scheme["id"],
+        "source": "scheme_library"
+    }
+
+
+async def build_library(
+    languages: Iterable[str] = ("en",),
+    translate: bool = False,
+    schemes: Optional[List[Dict]] = None
+) -> Dict:
+    """
+    Build the library as a compact index
+
+    English plans are built directly from the knowledge base. Other languages
+    are only built with translate=True, which asks the LLM once per plan;
+    languages that cannot be built are left out and fall back to generation.
+
+    Returns:
+        Dict with the source hash, scheme aliases, an index of
+        "scheme|language|literacy" keys into a deduplicated plan list
+    """
+    from app.services.ai_service import ai_service
+
+    schemes = get_schemes() if schemes is None else schemes
+    plans: List[Dict] = []
+    positions: Dict[str, int] = {}
+    index: Dict[str, int] = {}
+
+    def add(key: str, plan: Dict):
+        serialized = json.dumps(plan, sort_keys=True, ensure_ascii=False)
+        if serialized not in positions:
+            positions[serialized] = len(plans)
+            plans.append(plan)
+        index[key] = positions[serialized]
+
+    for scheme in schemes:
+        for literacy_level in LITERACY_LEVELS:
+            english = canonical_plan(scheme, literacy_level)
+            for language in languages:
+                key = f"{scheme['id']}|{language}|{literacy_level}"
+                if language == "en":
+                    add(key, english)
+                elif translate:
+                    translated = await ai_service.translate_action_plan(english, language, literacy_level)
+                    if translated is None:
+                        logger.warning(f"Could not translate plan {key}, skipping")
+                        continue
+                    add(key, {**translated, "scheme_id": scheme["id"], "source": "scheme_library"})
+
+    return {
+        "source_hash": source_hash(),
+        "schemes": {
+            scheme["id"]: {
+                "name": scheme["name"],
+                "domain": scheme.get("domain", "government_schemes"),
+                "aliases": scheme_aliases(scheme)
+            }
+            for scheme in schemes
+        },
+        "index": index,
+        "plans": plans
+    }
+
+
+def save_library(library: Dict, path: Path = ACTION_PLAN_LIBRARY_FILE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(library, f, ensure_ascii=False, separators=(",", ":"))
+        f.write("\n")
+
+
+class SchemeLibrary:
+    """
+    Serves precomputed action plans for queries that name a known scheme
+
+    The library file is loaded on first use. It is ignored when it was
+    built from a different schemes.json, so edited schemes never serve
+    stale plans; rebuild it with the build command.
+    """
+
+    def __init__(self, path: Path = ACTION_PLAN_LIBRARY_FILE):
+        self.path = Path(path)
+        self.enabled = settings.SCHEME_LIBRARY_ENABLED
+        self._library: Optional[Dict] = None
+        self._stats = {"hits": 0, "misses": 0}
+
+    def match_scheme(self, text: str, domain: Optional[str] = None) -> Optional[str]:
+        """
+        Return the id of the scheme a query names, or None
+
+        The longest matching alias wins. With domain set, only schemes in
+        that domain match.
+        """
+        library = self._load()
+        if not library or not text:
+            return None
+
+        query = _squash(text)
+        best: Tuple[int, Optional[str]] = (0, None)
+        for scheme_id, scheme in library["schemes"].items():
+            if domain and scheme["domain"] != domain:
+                continue
+            for alias in scheme["aliases"]:
+                if alias in query and len(alias) > best[0]:
+                    best = (len(alias), scheme_id)
+        return best[1]
+
+    def get_plan(self, scheme_id: str, language: str, literacy_level: str) -> Optional[Dict]:
+        """Copy of the stored plan with its domain, or None when the library has no entry"""
+        library = self._load()
+        if not library:
+            return None
+        position = library["index"].get(f"{scheme_id}|{language}|{literacy_level}")
+        if position is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        plan = copy.deepcopy(library["plans"][position])
+        plan["domain"] = library["schemes"][scheme_id]["domain"]
+        return plan
+
+    def find(
+        self,
+        text: str,
+        language: str,
+        literacy_level: str,
+        domain: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Plan for the scheme a query names, in its language and literacy level"""
+        scheme_id = self.match_scheme(text, domain)
+        if scheme_id is None:
+            return None
+        return self.get_plan(scheme_id, language, literacy_level or "medium")
+
+    def get_stats(self) -> Dict:
+        library = self._library or {}
+        return {
+            "enabled": self.enabled,
+            "schemes": len(library.get("schemes", {})),
+            "entries": len(library.get("index", {})),
+            "plans": len(library.get("plans", [])),
+            **self._stats
+        }
+
+    def _load(self) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        if self._library is None:
+            self._library = {}
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    library = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Action plan library unavailable ({self.path}): {str(e)}")
+                return None
+            if library.get("source_hash") != source_hash():
+                logger.warning(f"Action plan library {self.path} is stale, rebuild it with the build command")
+                return None
+            self._library = library
+            logger.info(f"Loaded {len(library['index'])} precomputed action plans from {self.path}")
+        return self._library or None
+
+# Initialize singleton
+scheme_library = SchemeLibrary()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build or inspect the precomputed action plan library")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build plans for every scheme, language and literacy level")
+    build_parser.add_argument("--languages", default="en", help="Comma-separated language codes")
+    build_parser.add_argument("--translate", action="store_true", help="Translate non-English plans with the LLM")
+    build_parser.add_argument("--output", default=str(ACTION_PLAN_LIBRARY_FILE))
+
+    show_parser = subparsers.add_parser("show", help="Print a stored plan")
+    show_parser.add_argument("scheme_id")
+    show_parser.add_argument("--language", default="en")
+    show_parser.add_argument("--literacy", default="medium", choices=LITERACY_LEVELS)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "show":
+        plan = SchemeLibrary().get_plan(args.scheme_id, args.language, args.literacy)
+        print(json.dumps(plan, ensure_ascii=False, indent=2) if plan else "No such plan")
+        return
+
+    languages = [language.strip() for language in args.languages.split(",") if language.strip()]
+    library = asyncio.run(build_library(languages, args.translate))
+    save_library(library, Path(args.output))
+    print(f"Wrote {len(library['index'])} entries ({len(library['plans'])} distinct plans) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Dense vector index for knowledge retrieval
+Embeds knowledge passages offline with a local hashed character n-gram
+embedder and stores them as a float32 matrix that is memory-mapped at
+query time, so every worker process shares the same pages.
+
+Indic-script text is also embedded in a rough romanization, so a Hindi or
+Tamil query naming "Ayushman" or "Kisan" finds the English passages that
+do too.
+
+Usage:
+    python -m app.services.vector_index build
+    python -m app.services.vector_index build --with-db
+    python -m app.services.vector_index search "आयुष्मान कार्ड कैसे बनेगा"
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import json
+import math
+import os
+import zlib
+
+import numpy as np
+
+from app.config import settings
+from app.services.knowledge_base import passages_from_knowledge_base, passages_from_row
+from app.services.scheme_library import source_hash
+from app.utils.logger import logger
+from app.utils.text import char_ngrams, has_indic_script, romanize
+
+MATRIX_FILE = "vectors.npy"
+PASSAGES_FILE = "passages.json"
+
+
+class HashedNgramEmbedder:
+    """
+    Maps text to a fixed-size unit vector without a model or network access
+
+    Character 3-5 grams are hashed into `dim` buckets with a hashed sign,
+    so collisions cancel out rather than pile up; counts are log-scaled.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        grams = char_ngrams(text)
+        if has_indic_script(text):
+            grams.update(char_ngrams(romanize(text)))
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for gram, count in grams.items():
+            hashed = zlib.crc32(gram.encode("utf-8"))
+            sign = 1.0 if (hashed // self.dim) & 1 else -1.0
+            vector[hashed % self.dim] += sign * (1 + math.log(count))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self.embed(text)
+        return matrix
+
+
+def passage_text(passage: Dict) -> str:
+    return f"{passage['title']} {passage['text']} {passage.get('keywords', '')}"
+
+
+def build_index(directory: Path, passages: List[Dict], dim: int) -> int:
+    """
+    Embed passages and write the matrix and passage list to directory
+
+    Files are written under temporary names and renamed into place, so
+    workers reading the old index never see a partial one.
+
+    Returns:
+        Number of passages indexed
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    matrix = HashedNgramEmbedder(dim).embed_many([passage_text(passage) for passage in passages])
+
+    matrix_tmp = directory / f"{MATRIX_FILE}.{os.getpid()}.tmp"
+    with open(matrix_tmp, "wb") as f:
+        np.save(f, matrix)
+    passages_tmp = directory / f"{PASSAGES_FILE}.{os.getpid()}.tmp"
+    with open(passages_tmp, "w", encoding="utf-8") as f:
+        json.dump({"dim": dim, "source_hash": source_hash(), "passages": passages}, f, ensure_ascii=False)
+
+    os.replace(matrix_tmp, directory / MATRIX_FILE)
+    os.replace(passages_tmp, directory / PASSAGES_FILE)
+    return len(passages)
+
+
+def database_passages() -> List[Dict]:
+    from app.database import SessionLocal, KnowledgeBase
+
+    db = SessionLocal()
+    try:
+        return [passage for row in db.query(KnowledgeBase).all() for passage in passages_from_row(row)]
+    finally:
+        db.close()
+
+
+class VectorIndex:
+    """
+    Top-k cosine search over the memory-mapped passage matrix
+
+    The index is opened on first search and reopened when the files are
+    rebuilt. An index built from a different schemes.json is ignored until
+    it is rebuilt.
+    """
+
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = Path(directory or settings.VECTOR_INDEX_PATH)
+        self.enabled = settings.VECTOR_INDEX_ENABLED
+        self.min_similarity = settings.VECTOR_MIN_SIMILARITY
+        self._matrix: Optional[np.ndarray] = None
+        self._passages: List[Dict] = []
+        self._embedder: Optional[HashedNgramEmbedder] = None
+        self._mtime: Optional[float] = None
+        self._stats = {"searches": 0, "reloads": 0}
+
+    def build(self, with_database: bool = False) -> int:
+        """Rebuild the index from schemes.json, and the knowledge_base table if asked"""
+        passages = passages_from_knowledge_base()
+        if with_database:
+            passages += database_passages()
+        count = build_index(self.directory, passages, settings.VECTOR_DIM)
+        logger.info(f"Built vector index with {count} passages in {self.directory}")
+        return count
+
+    def ensure_built(self, with_database: bool = True) -> bool:
+        """Build the index when it is missing or stale; returns True if it was built"""
+        if not self.enabled or self._open() is not None:
+            return False
+        self.build(with_database)
+        return True
+
+    def search(self, text: str, limit: int = 5) -> List[Dict]:
+        """
+        Passages most similar to text, best first
+
+        Returns:
+            Passage dicts with a "similarity" in [-1, 1], at least VECTOR_MIN_SIMILARITY
+        """
+        matrix = self._open() if self.enabled and text else None
+        if matrix is None or not len(self._passages):
+            return []
+        self._stats["searches"] += 1
+
+        similarities = matrix @ self._embedder.embed(text)
+        limit = min(limit, len(similarities))
+        top = np.argpartition(-similarities, limit - 1)[:limit]
+        top = top[np.argsort(-similarities[top])]
+        return [
+            {**self._passages[position], "similarity": round(float(similarities[position]), 4)}
+            for position in top
+            if similarities[position] >= self.min_similarity
+        ]
+
+    def get_stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "passages": len(self._passages),
+            "dim": self._embedder.dim if self._embedder else settings.VECTOR_DIM,
+            **self._stats
+        }
+
+    def _open(self) -> Optional[np.ndarray]:
+        matrix_path = self.directory / MATRIX_FILE
+        try:
+            mtime = matrix_path.stat().st_mtime
+        except OSError:
+            return None
+        if self._matrix is not None and mtime == self._mtime:
+            return self._matrix
+
+        try:
+            with open(self.directory / PASSAGES_FILE, encoding="utf-8") as f:
+                meta = json.load(f)
+            matrix = np.load(matrix_path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Vector index unavailable ({self.directory}): {str(e)}")
+            return None
+        if meta.get("source_hash") != source_hash():
+            logger.warning(f"Vector index in {self.directory} is stale, rebuild it with the build command")
+            return None
+        if matrix.shape != (len(meta["passages"]), meta["dim"]):
+            logger.warning(f"Vector index in {self.directory} does not match its passage list")
+            return None
+
+        self._matrix, self._passages, self._mtime = matrix, meta["passages"], mtime
+        self._embedder = HashedNgramEmbedder(meta["dim"])
+        self._stats["reloads"] += 1
+        logger.info(f"Memory-mapped vector index with {len(self._passages)} passages from {self.directory}")
+        return self._matrix
+
+# Initialize singleton
+vector_index = VectorIndex()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Build or query the dense knowledge vector index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Embed knowledge passages into the index")
+    build_parser.add_argument("--with-db", action="store_true", help="Also index the knowledge_base table")
+
+    search_parser = subparsers.add_parser("search", help="Show the passages nearest to a message")
+    search_parser.add_argument("text")
+    search_parser.add_argument("-k", type=int, default=5)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = vector_index.build(args.with_db)
+        print(f"Indexed {count} passages in {vector_index.directory}")
+        return
+
+    for passage in vector_index.search(args.text, args.k):
+        print(f"{passage['similarity']:.3f}  {passage['id']}  {passage['title']}: {passage['text']}")
+
+
+if __name__ == "__main__":
+    main()
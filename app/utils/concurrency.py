@@ -0,0 +1,160 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one execution
+    
+    The first caller for a key starts the work as its own task; callers that
+    arrive while it is running await the same task instead of starting a new
+    one. The work is shielded, so one caller being cancelled (for example a
+    client disconnecting) does not cancel it for the others.
+    """
+    
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+    
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Run factory() for key, or join the execution already in flight"""
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        
+        return await asyncio.shield(task)
+    
+    def get_stats(self) -> Dict:
+        """Execution and coalescing counters"""
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight_keys": len(self._in_flight)
+        }
+
+
+class SchedulerOverloadedError(Exception):
+    """Raised when a request is shed because the scheduler queue is full or no slot freed up in time"""
+
+
+class PriorityScheduler:
+    """
+    Concurrency limiter that grants free slots in priority order
+    
+    Works like a semaphore, except that waiters are served lowest priority
+    value first (callers pass an absolute deadline, adjusted for urgency)
+    instead of first come, first served. When max_queue requests are already
+    waiting, the request with the worst priority is shed with
+    SchedulerOverloadedError: either the newcomer or the worst waiter.
+    A waiter cancelled before it gets a slot (for example because its
+    deadline passed) leaves the queue and is counted as expired.
+    """
+    
+    # Queue wait samples kept per label for percentiles
+    WAIT_WINDOW = 500
+    
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(1, max_queue)
+        self._available = self.max_concurrency
+        self._waiters: List[Tuple[float, int, asyncio.Future, str]] = []
+        self._sequence = itertools.count()
+        self._waits: Dict[str, Deque[float]] = {}
+        self.granted = 0
+        self.shed = 0
+        self.expired = 0
+    
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+    
+    @property
+    def in_use(self) -> int:
+        return self.max_concurrency - self._available
+    
+    async def acquire(self, priority: float, label: str = "default"):
+        """Wait for a slot; lower priority values are served first"""
+        enqueued = time.monotonic()
+        if self._available > 0 and not self._waiters:
+            self._available -= 1
+            self._grant(label, enqueued)
+            return
+        
+        if len(self._waiters) >= self.max_queue:
+            worst = max(self._waiters)
+            if priority >= worst[0]:
+                self.shed += 1
+                raise SchedulerOverloadedError(f"LLM queue full ({self.max_queue} waiting)")
+            self._remove(worst)
+            self.shed += 1
+            worst[2].set_exception(SchedulerOverloadedError("Shed for a higher-priority request"))
+        
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._sequence), future, label)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                if future.exception() is None:
+                    # The slot was handed over just as we were cancelled; pass it on
+                    self.release()
+                # Otherwise we were shed before resuming and never held a slot
+            else:
+                self._remove(entry)
+                self.expired += 1
+            raise
+        self._grant(label, enqueued)
+    
+    def release(self):
+        """Hand the slot to the best waiter, or return it to the pool"""
+        while self._waiters:
+            _, _, future, _ = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._available += 1
+    
+    def get_stats(self) -> Dict:
+        """Queue gauges, shedding counters and queue wait percentiles per label"""
+        waits = {}
+        for label, samples in self._waits.items():
+            ordered = sorted(samples)
+            waits[label] = {
+                "samples": len(ordered),
+                "avg_ms": round(sum(ordered) / len(ordered), 2),
+                "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 2),
+                "max_ms": round(ordered[-1], 2)
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_depth": self.queue_depth,
+            "in_use": self.in_use,
+            "granted": self.granted,
+            "shed": self.shed,
+            "expired": self.expired,
+            "queue_wait": waits
+        }
+    
+    def _grant(self, label: str, enqueued: float):
+        self.granted += 1
+        samples = self._waits.setdefault(label, deque(maxlen=self.WAIT_WINDOW))
+        samples.append((time.monotonic() - enqueued) * 1000)
+    
+    def _remove(self, entry: Tuple):
+        try:
+            self._waiters.remove(entry)
+        except ValueError:
+            return
+        heapq.heapify(self._waiters)
@@ -2,6 +2,11 @@ from cryptography.fernet import Fernet
 from app.config import settings
 import base64
 import hashlib
+import hmac
+import re
+
+# Separators and prefixes that do not change which phone a number reaches
+_PHONE_NOISE_RE = re.compile(r"[\s\-().]|^(?:whatsapp|tel):")
 
 class EncryptionService:
     def __init__(self):
@@ -15,6 +20,12 @@ class EncryptionService:
         
         # Fernet requires base64-encoded 32-byte key
         self.fernet = Fernet(base64.urlsafe_b64encode(key))
+        
+        # Blind-index key, kept separate from the Fernet key
+        self.index_key = (
+            settings.BLIND_INDEX_KEY.encode() if settings.BLIND_INDEX_KEY
+            else hashlib.sha256(b"blind-index|" + settings.ENCRYPTION_KEY.encode()).digest()
+        )
     
     def encrypt(self, data: str) -> str:
         """Encrypt sensitive data"""
@@ -29,7 +40,21 @@ class EncryptionService:
         return self.fernet.decrypt(encrypted_data.encode()).decode()
     
     def hash_data(self, data: str) -> str:
-        """Create a hash of data for indexing without exposing the actual value"""
-        return hashlib.sha256(data.encode()).hexdigest()
+        """
+        Keyed hash (HMAC-SHA256) of data for indexing without exposing the actual value
+        
+        Unlike encrypt, the same input always gives the same output, so the
+        result can be looked up with an equality filter; without the key it
+        cannot be brute-forced from the small space of phone numbers.
+        """
+        return hmac.new(self.index_key, data.encode(), hashlib.sha256).hexdigest()
+    
+    def normalize_phone(self, phone_number: str) -> str:
+        """Phone number without spaces, dashes, brackets or a whatsapp:/tel: prefix"""
+        return _PHONE_NOISE_RE.sub("", phone_number.strip().lower())
+    
+    def phone_index(self, phone_number: str) -> str:
+        """Blind index of a phone number, stored in users.phone_number_hash"""
+        return self.hash_data(self.normalize_phone(phone_number))
 
 encryption_service = EncryptionService()
@@ -0,0 +1,212 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?")
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_PYTHON_LITERALS = [(re.compile(r"\bTrue\b"), "true"), (re.compile(r"\bFalse\b"), "false"), (re.compile(r"\bNone\b"), "null")]
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+# Candidate objects tried before giving up on a response
+MAX_CANDIDATES = 5
+
+
+class LLMOutputError(ValueError):
+    """Raised when model output holds no usable JSON payload"""
+
+
+class JSONExtractor:
+    """
+    Incremental scanner for the first JSON object in model output
+
+    Text can be fed in chunks as it streams in; complete is set as soon as
+    the top-level object closes, so a caller can stop reading trailing
+    prose. Brackets inside strings are ignored. finish() returns the
+    object text, closing any strings and brackets left open by a
+    truncated generation.
+    """
+
+    def __init__(self, start: int = 0):
+        self.buffer = ""
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+        self._position = start
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+    def feed(self, chunk: str) -> bool:
+        """Scan another chunk; returns True once the object is complete"""
+        self.buffer += chunk
+        while self._position < len(self.buffer) and not self.complete:
+            char = self.buffer[self._position]
+            if self.start is None:
+                if char == "{":
+                    self.start = self._position
+                    self._stack.append("}")
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append("}" if char == "{" else "]")
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if not self._stack:
+                    self.end = self._position + 1
+            self._position += 1
+        return self.complete
+
+    def finish(self) -> Tuple[Optional[str], bool]:
+        """
+        Return the object text and whether it had to be closed off
+
+        Returns (None, False) when no object was started.
+        """
+        if self.start is None:
+            return None, False
+        if self.complete:
+            return self.buffer[self.start:self.end], False
+
+        text = self.buffer[self.start:]
+        if self._in_string:
+            if self._escaped:
+                text = text[:-1]
+            text += '"'
+        # Drop a separator, or inside an object a key without a value, left by the cut
+        text = re.sub(r"[,:]\s*$", "", text.rstrip())
+        if self._stack[-1] == "}":
+            text = re.sub(r'([{,])\s*"[^"]*"\s*$', r"\1", text)
+        return text.rstrip().rstrip(",") + "".join(reversed(self._stack)), True
+
+
+def _repairs(text: str):
+    """Yield progressively repaired versions of a JSON candidate with the repair name"""
+    if text != text.translate(_SMART_QUOTES):
+        text = text.translate(_SMART_QUOTES)
+        yield "smart_quotes", text
+    if _TRAILING_COMMA_RE.search(text):
+        text = _TRAILING_COMMA_RE.sub(r"\1", text)
+        yield "trailing_commas", text
+    if any(pattern.search(text) for pattern, _ in _PYTHON_LITERALS):
+        for pattern, replacement in _PYTHON_LITERALS:
+            text = pattern.sub(replacement, text)
+        yield "python_literals", text
+    if '"' not in text and "'" in text:
+        yield "single_quotes", text.replace("'", '"')
+
+
+def _loads(text: str) -> Any:
+    # strict=False accepts raw newlines inside strings, which models often emit
+    return json.loads(text, strict=False)
+
+
+def extract_json(text: str) -> Tuple[Dict, List[str]]:
+    """
+    Extract the first JSON object from model output
+
+    Handles code fences, prose before or after the object, truncated output,
+    smart quotes, trailing commas and Python literals.
+
+    Returns:
+        (object, names of the repairs applied)
+
+    Raises:
+        LLMOutputError: if no candidate object parses
+    """
+    if not text:
+        raise LLMOutputError("Empty model output")
+
+    cleaned = _FENCE_RE.sub("", text)
+    position = 0
+    for _ in range(MAX_CANDIDATES):
+        extractor = JSONExtractor(start=position)
+        extractor.feed(cleaned)
+        candidate, truncated = extractor.finish()
+        if candidate is None:
+            break
+
+        applied = ["closed_truncated"] if truncated else []
+        try:
+            value = _loads(candidate)
+        except ValueError:
+            value = None
+            for name, repaired in _repairs(candidate):
+                applied.append(name)
+                try:
+                    value = _loads(repaired)
+                    break
+                except ValueError:
+                    continue
+
+        if isinstance(value, dict):
+            return value, applied
+        # Unparseable: resume after this object, not inside it, or a nested
+        # object would be returned as the whole payload
+        if not extractor.complete:
+            break
+        position = extractor.end
+
+    raise LLMOutputError("No JSON object found in model output")
+
+
+class LLMOutputParser:
+    """
+    Parses and validates JSON payloads from model output, keeping per-task rates
+
+    A result counts as "clean" when it parsed as-is, "repaired" when a repair
+    was needed, and "failed" when no object could be extracted or it did not
+    match the schema.
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, Dict] = {}
+
+    def parse(self, text: str, schema: Type[BaseModel], task: str) -> Dict:
+        """
+        Extract, repair and validate a payload
+
+        Raises:
+            LLMOutputError: if the output cannot be turned into a valid payload
+        """
+        stats = self._stats.setdefault(task, {"clean": 0, "repaired": 0, "failed": 0, "repairs": {}})
+        try:
+            value, applied = extract_json(text)
+            payload = schema(**value).dict()
+        except (LLMOutputError, ValidationError, TypeError) as e:
+            stats["failed"] += 1
+            raise LLMOutputError(f"Invalid {task} payload: {str(e)}") from e
+
+        if applied:
+            stats["repaired"] += 1
+            for name in applied:
+                stats["repairs"][name] = stats["repairs"].get(name, 0) + 1
+        else:
+            stats["clean"] += 1
+        return payload
+
+    def get_stats(self) -> Dict:
+        """Clean, repaired and failed counts and the failure rate per task"""
+        result = {}
+        for task, stats in self._stats.items():
+            total = stats["clean"] + stats["repaired"] + stats["failed"]
+            result[task] = {
+                **stats,
+                "repairs": dict(stats["repairs"]),
+                "failure_rate": round(stats["failed"] / total, 4) if total else 0.0
+            }
+        return result
+
+# Initialize singleton
+llm_output_parser = LLMOutputParser()
@@ -0,0 +1,84 @@
+import time
+from typing import Dict
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+    
+    After failure_threshold consecutive failures the circuit opens and calls
+    are rejected immediately with CircuitOpenError. Once reset_timeout
+    seconds have passed a single trial call is let through (half-open); its
+    success closes the circuit and its failure opens it again.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._stats = {"trips": 0, "rejected": 0, "successes": 0, "failures": 0}
+    
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently being rejected"""
+        if self.state == self.CLOSED:
+            return False
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at < self.reset_timeout
+        return self._trial_in_flight
+    
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError"""
+        if self.state == self.CLOSED:
+            return
+        
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return
+        
+        self._stats["rejected"] += 1
+        raise CircuitOpenError(f"{self.name} circuit is open")
+    
+    def record_success(self):
+        self._stats["successes"] += 1
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+        self.state = self.CLOSED
+    
+    def record_failure(self):
+        self._stats["failures"] += 1
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self._stats["trips"] += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+    
+    def record_cancelled(self):
+        """Release a half-open trial slot without judging the dependency"""
+        self._trial_in_flight = False
+    
+    def get_stats(self) -> Dict:
+        """Breaker state and counters"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            **self._stats
+        }
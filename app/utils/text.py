@@ -0,0 +1,125 @@
+from collections import Counter
+from typing import Iterable, List
+import re
+import unicodedata
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize free text for matching and cache keys
+    
+    Lowercases, applies Unicode NFKC normalization, replaces punctuation and
+    symbols with spaces and collapses whitespace, so "How to get Ayushman card?"
+    and "how to get  ayushman card" compare equal. Combining marks are kept so
+    Indic scripts survive intact.
+    """
+    if not text:
+        return ""
+    
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = "".join(
+        " " if unicodedata.category(char)[0] in ("P", "S") else char
+        for char in text
+    )
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+# Function words that carry no domain signal
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "of", "to", "in", "on", "for", "from",
+    "with", "by", "at", "as", "is", "are", "was", "were", "be", "been", "am", "do", "does",
+    "did", "i", "me", "my", "we", "our", "you", "your", "he", "she", "it", "they", "them",
+    "this", "that", "these", "those", "what", "which", "who", "how", "when", "where", "why",
+    "can", "could", "should", "would", "will", "shall", "may", "might", "must", "have", "has",
+    "had", "get", "got", "need", "want", "please", "tell", "about", "there", "here", "any",
+    "all", "some", "not", "no", "yes", "so", "up", "out", "than", "then", "also", "per",
+    "का", "के", "की", "है", "हैं", "में", "और", "को", "से", "पर", "कि", "यह", "वह", "मैं",
+    "मुझे", "क्या", "कैसे", "लिए", "एक", "हूं", "था", "थी", "तो", "भी", "ही"
+}
+
+def tokenize(text: str, drop_stopwords: bool = True) -> List[str]:
+    """Split normalized text into word tokens, optionally dropping stopwords"""
+    tokens = normalize_text(text).split()
+    if drop_stopwords:
+        tokens = [token for token in tokens if token not in STOPWORDS]
+    return tokens
+
+def char_ngrams(text: str, sizes: Iterable[int] = (3, 4, 5)) -> Counter:
+    """Counts of the character n-grams of a normalized, space-padded text"""
+    padded = f" {normalize_text(text)} "
+    grams = Counter()
+    for size in sizes:
+        for start in range(len(padded) - size + 1):
+            grams[padded[start:start + size]] += 1
+    return grams
+
+# Brahmic scripts share one layout: each block from U+0900 to U+0D7F is
+# 0x80 wide with letters at the same offsets, so one table romanizes all of them
+_INDIC_START, _INDIC_END, _INDIC_BLOCK = 0x0900, 0x0D7F, 0x80
+_INDIC_VOWELS = {
+    0x05: "a", 0x06: "a", 0x07: "i", 0x08: "i", 0x09: "u", 0x0A: "u", 0x0B: "ri",
+    0x0E: "e", 0x0F: "e", 0x10: "ai", 0x12: "o", 0x13: "o", 0x14: "au"
+}
+_INDIC_CONSONANTS = dict(zip(range(0x15, 0x3A), [
+    "k", "kh", "g", "gh", "ng", "ch", "chh", "j", "jh", "ny", "t", "th", "d", "dh", "n",
+    "t", "th", "d", "dh", "n", "n", "p", "ph", "b", "bh", "m", "y", "r", "r", "l", "l", "zh",
+    "v", "sh", "sh", "s", "h"
+]))
+_INDIC_SIGNS = {
+    0x3E: "a", 0x3F: "i", 0x40: "i", 0x41: "u", 0x42: "u", 0x43: "ri",
+    0x46: "e", 0x47: "e", 0x48: "ai", 0x4A: "o", 0x4B: "o", 0x4C: "au"
+}
+_INDIC_NASALS = {0x01: "n", 0x02: "n", 0x03: "h"}
+_INDIC_VIRAMA = 0x4D
+
+def romanize(text: str) -> str:
+    """
+    Rough Latin transliteration of Indic-script text
+    
+    Meant for matching rather than display: long and short vowels are
+    merged and the inherent vowel is dropped at the end of a word, so
+    "किसान" gives "kisan" and "ஆதார்" gives "atar". Other characters are
+    kept as they are.
+    """
+    out: List[str] = []
+    pending_vowel = False
+    for char in text:
+        code = ord(char)
+        offset = (code - _INDIC_START) % _INDIC_BLOCK if _INDIC_START <= code <= _INDIC_END else None
+        if offset in _INDIC_SIGNS or offset == _INDIC_VIRAMA:
+            out.append(_INDIC_SIGNS.get(offset, ""))
+            pending_vowel = False
+            continue
+        if pending_vowel:
+            # The consonant before this character keeps its inherent "a" unless a word ends here
+            if offset is not None and (offset in _INDIC_CONSONANTS or offset in _INDIC_NASALS or offset in _INDIC_VOWELS):
+                out.append("a")
+            pending_vowel = False
+        if offset in _INDIC_CONSONANTS:
+            out.append(_INDIC_CONSONANTS[offset])
+            pending_vowel = True
+        elif offset in _INDIC_VOWELS:
+            out.append(_INDIC_VOWELS[offset])
+        elif offset in _INDIC_NASALS:
+            out.append(_INDIC_NASALS[offset])
+        elif offset is not None and 0x66 <= offset <= 0x6F:
+            out.append(str(offset - 0x66))
+        elif offset is None:
+            out.append(char)
+    return "".join(out)
+
+def has_indic_script(text: str) -> bool:
+    return any(_INDIC_START <= ord(char) <= _INDIC_END for char in text)
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for prompts and outputs
+    
+    Latin text averages about four characters per token; Indic scripts
+    tokenize much less efficiently, so other characters count double.
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    other_chars = len(text) - ascii_chars
+    return max(1, round(ascii_chars / 4 + other_chars / 2))
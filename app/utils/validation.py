@@ -1,7 +1,39 @@
 import re
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, validator
 
+# Domain-specific keywords used to check relevance and to pre-classify messages
+DOMAIN_KEYWORDS = {
+    "health": [
+        'health', 'hospital', 'doctor', 'medical', 'medicine', 'disease', 'illness', 'treatment',
+        'insurance', 'ayushman', 'clinic', 'surgery', 'patient', 'healthcare', 'covid'
+    ],
+    "agriculture": [
+        'farm', 'crop', 'seed', 'fertilizer', 'agriculture', 'kisan', 'irrigation', 'harvest',
+        'soil', 'pesticide', 'tractor', 'land', 'cultivation', 'organic', 'farmer'
+    ],
+    "finance": [
+        'bank', 'loan', 'money', 'finance', 'saving', 'account', 'credit', 'debit',
+        'payment', 'insurance', 'investment', 'pension', 'subsidy', 'mudra', 'financial'
+    ],
+    "government_schemes": [
+        'scheme', 'yojana', 'government', 'welfare', 'benefit', 'eligibility',
+        'registration', 'certificate', 'document', 'aadhar', 'ration', 'pension',
+        'subsidy', 'pradhan mantri', 'ayushman', 'ujjwala', 'awas',
+        # Legal/Documentation
+        'legal', 'law', 'court', 'certificate', 'license', 'permit',
+        'passport', 'voter', 'pan', 'rights', 'complaint', 'ration card'
+    ],
+    "education": [
+        'education', 'school', 'college', 'scholarship', 'student', 'study', 'exam',
+        'degree', 'course', 'training', 'skill', 'learning', 'admission', 'fees'
+    ],
+    "climate": [
+        'weather', 'rain', 'flood', 'drought', 'disaster', 'climate', 'cyclone',
+        'emergency', 'relief', 'alert'
+    ]
+}
+
 class MessageRequest(BaseModel):
     phone_number: str
     message: str
@@ -35,6 +67,166 @@ class ActionPlanRequest(BaseModel):
             raise ValueError(f'Domain must be one of {valid_domains}')
         return v
 
+class EligibilityRequest(BaseModel):
+    """User attributes for an eligibility check; unknown ones are left out"""
+    age: Optional[int] = None
+    annual_income: Optional[float] = None
+    land_acres: Optional[float] = None
+    has_bank_account: Optional[bool] = None
+    owns_land: Optional[bool] = None
+    in_secc: Optional[bool] = None
+    bpl_card: Optional[bool] = None
+    gender: Optional[str] = None
+    occupation: Optional[str] = None
+    state: Optional[str] = None
+    domain: Optional[str] = None
+    scheme: Optional[str] = None
+    language: str = "en"
+    explain: bool = False
+    
+    @validator('age')
+    def validate_age(cls, v):
+        if v is not None and not 0 <= v <= 120:
+            raise ValueError('Age must be between 0 and 120')
+        return v
+
+def _as_list(v) -> list:
+    if v is None:
+        return []
+    if isinstance(v, (str, dict)):
+        return [v]
+    return list(v)
+
+def _as_steps(v) -> list:
+    steps = []
+    for number, step in enumerate(_as_list(v), start=1):
+        if isinstance(step, str):
+            step = {"action": step}
+        if isinstance(step, dict) and step.get("action"):
+            steps.append({
+                "step_number": step.get("step_number") or number,
+                "action": str(step["action"]),
+                "details": str(step.get("details") or "")
+            })
+    return steps
+
+class IntentPayload(BaseModel):
+    """Intent fields parsed from model output"""
+    intent: str = "general_inquiry"
+    domain: str = "general"
+    entities: dict = {}
+    urgency: str = "medium"
+    confidence: float = 0.5
+
+    @validator('intent', pre=True)
+    def validate_intent(cls, v):
+        return str(v).strip() if v else "general_inquiry"
+
+    @validator('domain', pre=True)
+    def validate_domain(cls, v):
+        # Models vary in case and spacing; anything unknown falls back to general
+        domain = str(v or "").strip().lower().replace(" ", "_")
+        return domain if domain in DOMAIN_KEYWORDS else "general"
+
+    @validator('entities', pre=True)
+    def validate_entities(cls, v):
+        return v if isinstance(v, dict) else {}
+
+    @validator('urgency', pre=True)
+    def validate_urgency(cls, v):
+        urgency = str(v or "").strip().lower()
+        return urgency if urgency in ('low', 'medium', 'high') else "medium"
+
+    @validator('confidence', pre=True)
+    def validate_confidence(cls, v):
+        try:
+            confidence = float(str(v).rstrip('%')) / (100 if str(v).endswith('%') else 1)
+        except (TypeError, ValueError):
+            return 0.5
+        return min(max(confidence, 0.0), 1.0)
+
+class PlanStep(BaseModel):
+    step_number: int = 0
+    action: str
+    details: str = ""
+
+class ActionPlanPayload(BaseModel):
+    """Action plan fields parsed from model output"""
+    summary: str = ""
+    immediate_actions: List[str] = []
+    steps: List[PlanStep] = []
+    documents_required: List[str] = []
+    eligibility: dict = {"criteria": [], "status": "check_needed"}
+    risk_alerts: List[str] = []
+    resources: List[dict] = []
+    estimated_time: str = "Unknown"
+
+    @validator('immediate_actions', 'documents_required', 'risk_alerts', pre=True)
+    def validate_text_list(cls, v):
+        return [str(item) for item in _as_list(v) if item]
+
+    @validator('steps', pre=True)
+    def validate_steps(cls, v):
+        return _as_steps(v)
+
+    @validator('eligibility', pre=True)
+    def validate_eligibility(cls, v):
+        if not isinstance(v, dict):
+            return {"criteria": _as_list(v), "status": "check_needed"}
+        return {"criteria": _as_list(v.get("criteria")), "status": v.get("status") or "check_needed"}
+
+    @validator('resources', pre=True)
+    def validate_resources(cls, v):
+        return [{"name": item} if isinstance(item, str) else item for item in _as_list(v) if item]
+
+    @validator('summary', 'estimated_time', pre=True)
+    def validate_text(cls, v):
+        return "" if v is None else str(v)
+
+class UnderstandPayload(IntentPayload):
+    """Fused intent, reply and optional action plan parsed from model output"""
+    response_text: str
+    action_plan: Optional[ActionPlanPayload] = None
+
+    @validator('response_text')
+    def validate_response_text(cls, v):
+        if not v.strip():
+            raise ValueError('response_text is empty')
+        return v
+
+    @validator('action_plan', pre=True)
+    def validate_action_plan(cls, v):
+        return v if isinstance(v, dict) and v else None
+
+class ActionPlanPatch(BaseModel):
+    """Changes to an existing action plan parsed from model output"""
+    changed: bool = True
+    summary: Optional[str] = None
+    immediate_actions: List[str] = []
+    add_steps: List[PlanStep] = []
+    update_steps: List[PlanStep] = []
+    remove_steps: List[int] = []
+    add_documents: List[str] = []
+    remove_documents: List[str] = []
+    eligibility: Optional[dict] = None
+    add_risk_alerts: List[str] = []
+
+    @validator('immediate_actions', 'add_documents', 'remove_documents', 'add_risk_alerts', pre=True)
+    def validate_text_list(cls, v):
+        return [str(item) for item in _as_list(v) if item]
+
+    @validator('add_steps', 'update_steps', pre=True)
+    def validate_steps(cls, v):
+        return _as_steps(v)
+
+    @validator('remove_steps', pre=True)
+    def validate_remove_steps(cls, v):
+        return [int(item) for item in _as_list(v) if str(item).strip().isdigit()]
+
+    @validator('eligibility', pre=True)
+    def validate_eligibility(cls, v):
+        return v if isinstance(v, dict) and v else None
+
 def sanitize_input(text: str) -> str:
     """Sanitize user input to prevent injection attacks"""
     if not text:
@@ -156,32 +348,11 @@ def validate_message_content(text: str) -> dict:
             }
     
     # 5. Check if message is relevant (has domain-specific keywords)
-    domain_specific_keywords = [
-        # Health
-        'health', 'hospital', 'doctor', 'medical', 'medicine', 'disease', 'illness', 'treatment',
-        'insurance', 'ayushman', 'clinic', 'surgery', 'patient', 'healthcare', 'covid',
-        # Agriculture
-        'farm', 'crop', 'seed', 'fertilizer', 'agriculture', 'kisan', 'irrigation', 'harvest',
-        'soil', 'pesticide', 'tractor', 'land', 'cultivation', 'organic', 'farmer',
-        # Finance
-        'bank', 'loan', 'money', 'finance', 'saving', 'account', 'credit', 'debit',
-        'payment', 'insurance', 'investment', 'pension', 'subsidy', 'mudra', 'financial',
-        # Government schemes
-        'scheme', 'yojana', 'government', 'welfare', 'benefit', 'eligibility',
-        'registration', 'certificate', 'document', 'aadhar', 'ration', 'pension',
-        'subsidy', 'pradhan mantri', 'ayushman', 'ujjwala', 'awas',
-        # Education
-        'education', 'school', 'college', 'scholarship', 'student', 'study', 'exam',
-        'degree', 'course', 'training', 'skill', 'learning', 'admission', 'fees',
-        # Legal/Documentation
-        'legal', 'law', 'court', 'certificate', 'license', 'permit',
-        'passport', 'voter', 'pan', 'rights', 'complaint', 'ration card',
-        # Climate
-        'weather', 'rain', 'flood', 'drought', 'disaster', 'climate', 'cyclone',
-        'emergency', 'relief', 'alert'
-    ]
-    
-    has_domain_content = any(keyword in lower_text for keyword in domain_specific_keywords)
+    has_domain_content = any(
+        keyword in lower_text
+        for keywords in DOMAIN_KEYWORDS.values()
+        for keyword in keywords
+    )
     
     # If no domain-specific keywords found
     if not has_domain_content:
@@ -258,11 +258,12 @@ async function handleSendMessage() {
     const loadingId = addLoadingIndicator();
 
     try {
-        // Send message to API
-        const response = await fetch(`${API_BASE_URL}/api/v1/message/web`, {
+        // Send message to the streaming API so the reply renders as it is generated
+        const response = await fetch(`${API_BASE_URL}/api/v1/message/web/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
             },
             body: JSON.stringify({
                 message: message,
@@ -271,26 +272,11 @@ async function handleSendMessage() {
             })
         });
 
-        // Remove loading indicator
-        removeLoadingIndicator(loadingId);
-
-        if (!response.ok) {
+        if (!response.ok || !response.body) {
             throw new Error(`API Error: ${response.status}`);
         }
 
-        const data = await response.json();
-        
-        // Update conversation ID
-        if (data.conversation_id) {
-            conversationId = data.conversation_id;
-        }
-
-        // Add assistant response
-        if (data.success && data.response) {
-            addAssistantResponse(data.response);
-        } else {
-            throw new Error('Invalid response format');
-        }
+        await readResponseStream(response, loadingId);
 
     } catch (error) {
         console.error('Error sending message:', error);
@@ -308,6 +294,132 @@ async function handleSendMessage() {
     }
 }
 
+// Read Server-Sent Events from the streaming endpoint and render them as they arrive
+async function readResponseStream(response, loadingId) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let streamView = null;
+    let finished = false;
+
+    const ensureView = () => {
+        if (!streamView) {
+            removeLoadingIndicator(loadingId);
+            streamView = createStreamingMessage();
+        }
+        return streamView;
+    };
+
+    while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE frames are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = 'message';
+            let dataText = '';
+            frame.split('\n').forEach(line => {
+                if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+            });
+            const data = dataText ? JSON.parse(dataText) : {};
+
+            switch (eventName) {
+                case 'start':
+                    if (data.conversation_id) conversationId = data.conversation_id;
+                    break;
+                case 'token':
+                    ensureView().appendText(data.text);
+                    break;
+                case 'action_plan':
+                    ensureView().showActionPlan(data);
+                    break;
+                case 'audio':
+                    ensureView().showAudio(data.audio_url);
+                    break;
+                case 'done':
+                    ensureView().finish(data.response);
+                    finished = true;
+                    break;
+                case 'error':
+                    throw new Error(data.detail || 'Stream error');
+            }
+        }
+    }
+
+    if (!finished) {
+        throw new Error('Stream ended unexpectedly');
+    }
+}
+
+// Create an assistant message that fills in as streaming events arrive
+function createStreamingMessage() {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message assistant';
+    
+    const avatar = document.createElement('div');
+    avatar.className = 'message-avatar';
+    avatar.textContent = '🤖';
+    
+    const contentDiv = document.createElement('div');
+    contentDiv.className = 'message-content';
+    
+    const bubbleDiv = document.createElement('div');
+    bubbleDiv.className = 'message-bubble';
+    contentDiv.appendChild(bubbleDiv);
+    
+    messageDiv.appendChild(avatar);
+    messageDiv.appendChild(contentDiv);
+    chatMessages.appendChild(messageDiv);
+
+    let actionPlan = null;
+
+    return {
+        appendText(text) {
+            bubbleDiv.textContent += text;
+            scrollToBottom();
+        },
+        showActionPlan(plan) {
+            actionPlan = plan;
+            contentDiv.appendChild(createActionPlan(plan));
+            scrollToBottom();
+        },
+        showAudio(audioUrl) {
+            if (audioUrl && audioEnabled) {
+                contentDiv.appendChild(createAudioPlayer(audioUrl));
+                scrollToBottom();
+            }
+        },
+        finish(response) {
+            if (actionPlan) {
+                contentDiv.appendChild(createActionButtons(actionPlan));
+            }
+            
+            const timeDiv = document.createElement('div');
+            timeDiv.className = 'message-time';
+            timeDiv.textContent = new Date().toLocaleTimeString('en-US', { 
+                hour: '2-digit', 
+                minute: '2-digit'
+            });
+            contentDiv.appendChild(timeDiv);
+            scrollToBottom();
+
+            // Store in conversation history
+            conversationHistory.push({
+                timestamp: new Date(),
+                type: 'assistant',
+                response: response
+            });
+        }
+    };
+}
+
 // Add user/assistant message
 function addMessage(text, sender) {
     const messageDiv = document.createElement('div');
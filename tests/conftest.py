@@ -0,0 +1,4 @@
+import os
+
+# Run the suite against the deterministic local LLM provider instead of the live Gemini API
+os.environ.setdefault("LLM_PROVIDER", "local")
@@ -1,9 +1,42 @@
 import pytest
+import json
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from app.main import app
+from app.api.routes import messaging
+from app.database import ActionPlan, Base, Channel, Conversation, Domain, get_db
+from app.services import conversation_memory as conversation_memory_module
+from app.services.ai_service import ai_service
+from app.utils.encryption import encryption_service
+from app.services.llm_providers import LocalProvider, LLMProviderError
+from app.utils.resilience import CircuitBreaker
 
 client = TestClient(app)
 
+@pytest.fixture
+def session_factory(monkeypatch):
+    """In-memory database for routes that open their own sessions"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(messaging, "SessionLocal", factory)
+    monkeypatch.setattr(conversation_memory_module, "SessionLocal", factory)
+    return factory
+
+def stream_message(message):
+    """Post to the streaming endpoint and return its (event, data) frames"""
+    response = client.post("/api/v1/message/web/stream", json={
+        "phone_number": "+919876543210", "message": message, "channel": "web", "language": "en"
+    })
+    assert response.status_code == 200
+    frames = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        frames.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return frames
+
 def test_health_check():
     """Test health check endpoint"""
     response = client.get("/health")
@@ -25,12 +58,52 @@ def test_metrics_endpoint():
     assert response.status_code == 200
     assert "timestamp" in response.json()
 
+def test_llm_metrics_endpoint():
+    """Test LLM usage metrics endpoint"""
+    response = client.get("/metrics/llm")
+    assert response.status_code == 200
+    assert "totals" in response.json()
+    assert "series" in response.json()
+    assert "parsing" in response.json()
+
+def test_batch_endpoint_streams_results():
+    """Test that a batch upload streams one result per row and a summary"""
+    body = '{"id": "q1", "message": "How do I get a scholarship for college?"}\n'
+    response = client.post("/api/v1/batch", content=body)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["id"] == "q1"
+    assert lines[-1]["done"] is True
+    
+    progress = client.get(f"/api/v1/batch/{response.headers['x-batch-id']}")
+    assert progress.json()["finished"] is True
+
 def test_readiness_check():
     """Test readiness check"""
     response = client.get("/ready")
     assert response.status_code == 200
     assert "ready" in response.json()
     assert "checks" in response.json()
+    assert response.json()["mode"] == "normal"
+
+def test_eligibility_endpoint():
+    """Test eligibility lists likely schemes and the questions still open"""
+    response = client.post("/api/v1/eligibility", json={"age": 35, "occupation": "farmer", "owns_land": True})
+    assert response.status_code == 200
+    assert "pmkisan" in [scheme["scheme_id"] for scheme in response.json()["eligible"]]
+    assert "has_bank_account" in response.json()["questions"]
+    
+    response = client.post("/api/v1/eligibility", json={"scheme": "unknown scheme"})
+    assert response.status_code == 404
+
+def test_knowledge_search():
+    """Test knowledge search returns ranked passages"""
+    response = client.get("/api/v1/knowledge/search", params={"q": "How do I apply for PM-KISAN scheme?", "k": 3})
+    assert response.status_code == 200
+    assert response.json()["passages"][0]["id"] == "kb:pmkisan:apply"
+    
+    response = client.get("/api/v1/knowledge/search", params={"q": "pm-kisan", "mode": "sparse"})
+    assert response.status_code == 422
 
 @pytest.mark.asyncio
 async def test_sms_message():
@@ -61,6 +134,101 @@ async def test_web_message():
     assert "response" in response.json()
     assert response.json()["success"] is True
 
+def test_web_stream_sends_reply_as_it_is_generated(session_factory):
+    """Test that a streamed reply arrives in several token events and is saved whole"""
+    frames = stream_message("Which hospital should I visit for fever treatment?")
+    events = [event for event, _ in frames]
+    tokens = [data["text"] for event, data in frames if event == "token"]
+    
+    assert events[0] == "start" and events[-1] == "done"
+    assert len(tokens) > 1
+    done = frames[-1][1]["response"]
+    assert done["text"] == "".join(tokens)
+    assert "partial" not in done
+
+def test_web_stream_answers_faq_without_llm(session_factory):
+    """Test that an FAQ match is sent as one token"""
+    frames = stream_message("how to apply for pm kisan")
+    
+    assert [event for event, _ in frames].count("token") == 1
+    assert dict(frames)["intent"]["source"] == "faq"
+    assert "action_plan" in dict(frames)
+
+def test_web_stream_answers_in_degraded_mode(session_factory):
+    """Test that the stream serves a degraded answer while the circuit is open"""
+    breaker = ai_service.circuit_breaker
+    ai_service.circuit_breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    ai_service.circuit_breaker.record_failure()
+    try:
+        frames = stream_message("Is there income support money for small farmer families?")
+    finally:
+        ai_service.circuit_breaker = breaker
+    
+    assert [event for event, _ in frames].count("token") == 1
+    assert dict(frames)["intent"]["source"] == "degraded"
+    assert frames[-1][0] == "done"
+
+class BrokenStreamProvider(LocalProvider):
+    """Local provider whose stream drops after the first chunk"""
+
+    async def stream(self, prompt, task="response", route=None):
+        yield "Drink plenty of "
+        raise LLMProviderError("Connection reset")
+
+def test_web_stream_marks_cut_short_reply_partial(session_factory):
+    """Test that a reply interrupted mid-stream ends with the fallback text and is marked partial"""
+    provider = ai_service.provider
+    ai_service.provider = BrokenStreamProvider(latency_ms=0, error_rate=0, timeout_rate=0)
+    try:
+        frames = stream_message("Which clinic treats a cough that lasted two weeks?")
+    finally:
+        ai_service.provider = provider
+    
+    tokens = [data["text"] for event, data in frames if event == "token"]
+    assert tokens[0] == "Drink plenty of "
+    assert "trouble processing your request" in tokens[-1]
+    done = frames[-1][1]["response"]
+    assert done["partial"] is True
+    assert done["text"] == "".join(tokens)
+
+def test_conversation_summary_card(session_factory):
+    """Test the summary card is built from the stored summary and the latest plan"""
+    db = session_factory()
+    conversation = Conversation(user_id=1, channel=Channel.WEB)
+    empty = Conversation(user_id=1, channel=Channel.SMS)
+    db.add_all([conversation, empty])
+    db.flush()
+    conversation.summary_encrypted = encryption_service.encrypt("The user asked about PM-KISAN. They own 2 acres.")
+    conversation.summary_turns = 2
+    db.add(ActionPlan(conversation_id=conversation.id, domain=Domain.AGRICULTURE,
+                      steps=[{"action": "Register on the PM-KISAN portal"}], documents_required=["Land records"]))
+    db.commit()
+    
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+    
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        response = client.get(f"/api/v1/message/conversations/{conversation.id}/summary")
+        empty_response = client.get(f"/api/v1/message/conversations/{empty.id}/summary")
+        missing_response = client.get("/api/v1/message/conversations/9999/summary")
+    finally:
+        app.dependency_overrides.pop(get_db)
+        db.close()
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["summary_turns"] == 2
+    assert data["card"]["key_points"] == ["The user asked about PM-KISAN.", "They own 2 acres."]
+    assert data["card"]["next_steps"] == ["Register on the PM-KISAN portal"]
+    assert data["card"]["action_items"] == ["Keep ready: Land records"]
+    assert empty_response.json()["card"] is None
+    assert missing_response.status_code == 404
+
 def test_invalid_phone_number():
     """Test invalid phone number validation"""
     message_data = {
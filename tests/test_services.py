@@ -1,7 +1,35 @@
 import pytest
-from app.services.ai_service import ai_service
+import asyncio
+import numpy as np
+from types import SimpleNamespace
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import ActionPlan, Base, Channel, Conversation, DataMigration, Domain, KnowledgeBase, Message, MessageRole, User, _backfill_phone_hashes, _create_catalog_index, _create_knowledge_fts
+from app.api.routes.messaging import get_or_create_user
+from app.utils.encryption import encryption_service
+from app.services import conversation_memory as conversation_memory_module, knowledge_catalog
+from app.services.ai_service import AIService, ai_service
 from app.services.translation_service import translation_service
 from app.services.action_planner import action_planner
+from app.services.eligibility_engine import compile_rules, eligibility_engine
+from app.services.batch_service import batch_processor, parse_batch
+from app.services.scheme_library import scheme_library
+from app.services.faq_service import faq_service, entries_from_traffic
+from app.services.degraded_mode import degraded_mode
+from app.services.retrieval_service import KnowledgeRetriever, knowledge_retriever
+from app.services.vector_index import VectorIndex
+from app.services.cache_service import response_cache
+from app.services.message_pipeline import message_pipeline, predict_domain
+from app.services.intent_classifier import detect_urgency, intent_classifier
+from app.services.prompt_registry import PromptRegistry
+from app.services.llm_providers import LocalProvider, LLMProviderError
+from app.services.model_router import model_router
+from app.services.llm_metrics import check_prompt_budgets
+from app.utils.llm_json import LLMOutputParser, LLMOutputError
+from app.utils.validation import ActionPlanPayload, IntentPayload
+from app.utils.concurrency import PriorityScheduler, SchedulerOverloadedError, SingleFlight
+from app.utils.resilience import CircuitBreaker, CircuitOpenError
 
 @pytest.mark.asyncio
 async def test_language_detection():
@@ -78,6 +106,660 @@ async def test_ai_response_generation():
     assert response["success"] is True
     assert len(response["response_text"]) > 0
 
+@pytest.mark.asyncio
+async def test_understand_and_respond():
+    """Test fused intent, response and action plan generation"""
+    context = {
+        "location": "Karnataka",
+        "literacy_level": "medium",
+        "language": "en"
+    }
+    
+    result = await ai_service.understand_and_respond(
+        user_message="How do I apply for PM-KISAN scheme?",
+        context=context,
+        language="en",
+        literacy_level="medium"
+    )
+    
+    assert "domain" in result["intent"]
+    assert "confidence" in result["intent"]
+    assert len(result["response_text"]) > 0
+    assert result["action_plan"] is None or "steps" in result["action_plan"]
+
+@pytest.mark.asyncio
+async def test_response_cache_normalizes_queries():
+    """Test that repeat questions hit the response cache"""
+    key = response_cache.make_key("response", "How to get Ayushman card?", "en", "low", "health")
+    same_key = response_cache.make_key("response", "how to get  ayushman card", "en", "low", "health")
+    other_key = response_cache.make_key("response", "How to get Ayushman card?", "hi", "low", "health")
+    district_key = response_cache.make_key("response", "How to get Ayushman card?", "en", "low", "health", location="Patna, Bihar")
+    
+    assert key == same_key
+    assert key != other_key
+    assert key != district_key
+    
+    await response_cache.set(key, {"response_text": "Visit your nearest CSC", "success": True})
+    cached = await response_cache.get(same_key)
+    
+    assert cached["response_text"] == "Visit your nearest CSC"
+    assert response_cache.get_stats()["hits"] >= 1
+
+def test_local_intent_classifier():
+    """Test local domain classification and LLM fallback signalling"""
+    farming = intent_classifier.classify("What loans are available for farmers and crop seed?")
+    assert farming["domain"] == "agriculture"
+    assert farming["source"] == "local"
+    assert intent_classifier.is_confident(farming)
+    
+    # Unknown vocabulary must defer to the LLM
+    unknown = intent_classifier.classify("fever and cough what should I do")
+    assert not intent_classifier.is_confident(unknown)
+
+def test_detect_urgency_matches_whole_words():
+    """Test that urgent keywords match whole words, and Devanagari keywords anywhere"""
+    assert detect_urgency("There was a fire in our house") == "high"
+    assert detect_urgency("Floods have cut off our village") == "high"
+    assert detect_urgency("I was fired from my job, what support is there?") == "medium"
+    assert detect_urgency("Is there a scheme for accidental insurance?") == "medium"
+    assert detect_urgency("गाँव में बाढ़ आ गई है") == "high"
+
+def test_domain_pre_classifier():
+    """Test keyword pre-classification used for speculative planning"""
+    assert predict_domain("What loans are available for farmers and crop seed?") == "agriculture"
+    assert predict_domain("Which hospital accepts my insurance for surgery?") == "health"
+    assert predict_domain("Hello there") == "general"
+
+@pytest.mark.asyncio
+async def test_message_pipeline_reports_timings():
+    """Test that the pipeline answers a message and reports stage timings"""
+    context = {"location": "Karnataka", "literacy_level": "medium", "language": "en"}
+    
+    result = await message_pipeline.run(
+        user_message="How do I apply for PM-KISAN scheme?",
+        user_context=context,
+        language="en",
+        literacy_level="medium"
+    )
+    
+    assert "intent" in context
+    assert len(result["response_text"]) > 0
+    assert result["timings"]["total_ms"] >= 0
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_identical_calls():
+    """Test that concurrent identical calls share one execution"""
+    single_flight = SingleFlight()
+    calls = 0
+    
+    async def slow_call():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "shared"
+    
+    results = await asyncio.gather(*[single_flight.do("same-prompt", slow_call) for _ in range(5)])
+    
+    assert results == ["shared"] * 5
+    assert calls == 1
+    assert single_flight.get_stats()["coalesced"] == 4
+
+@pytest.mark.asyncio
+async def test_priority_scheduler_orders_and_sheds():
+    """Test that queued calls run earliest deadline first and the worst is shed when full"""
+    scheduler = PriorityScheduler(max_concurrency=1, max_queue=2)
+    order = []
+    
+    async def call(name, priority):
+        await scheduler.acquire(priority, name)
+        try:
+            order.append(name)
+            await asyncio.sleep(0.01)
+        finally:
+            scheduler.release()
+    
+    running = asyncio.create_task(call("running", 100))
+    await asyncio.sleep(0)
+    queued = [asyncio.create_task(call(name, priority)) for name, priority in [("sms", 50), ("voice", 1)]]
+    await asyncio.sleep(0)
+    late = asyncio.create_task(call("web", 10))
+    results = await asyncio.gather(running, *queued, late, return_exceptions=True)
+    
+    assert order == ["running", "voice", "web"]
+    assert isinstance(results[1], SchedulerOverloadedError)
+    assert scheduler.get_stats()["shed"] == 1
+
+@pytest.mark.asyncio
+async def test_priority_scheduler_shed_then_cancelled_holds_no_slot():
+    """Test that a waiter cancelled after being shed does not hand on a slot it never held"""
+    scheduler = PriorityScheduler(max_concurrency=1, max_queue=1)
+    await scheduler.acquire(100, "running")
+
+    shed = asyncio.create_task(scheduler.acquire(50, "sms"))
+    await asyncio.sleep(0)
+    urgent = asyncio.create_task(scheduler.acquire(1, "voice"))
+    await asyncio.sleep(0)
+    shed.cancel()
+    await asyncio.gather(shed, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert not urgent.done()
+    assert scheduler.get_stats()["in_use"] == 1
+
+    scheduler.release()
+    await asyncio.wait_for(urgent, 1)
+    scheduler.release()
+    assert scheduler.get_stats()["in_use"] == 0
+
+def test_circuit_breaker_fails_fast():
+    """Test that the breaker opens after repeated failures and rejects calls"""
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    
+    breaker.record_failure()
+    assert not breaker.is_open
+    breaker.record_failure()
+    assert breaker.is_open
+    
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.get_stats()["trips"] == 1
+
+@pytest.mark.asyncio
+async def test_queue_wait_timeouts_do_not_open_the_breaker():
+    """Test that calls timing out while queued for a slot are shed without counting as provider failures"""
+    service = AIService()
+    service.provider = LocalProvider(latency_ms=300, latency_sigma=0, error_rate=0, timeout_rate=0)
+    service.scheduler = PriorityScheduler(max_concurrency=1, max_queue=16)
+    service.channel_deadlines["voice"] = 0.2
+    service.hedge_delay_seconds = 0
+    service.circuit_breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    
+    # A web call holds the only slot past every queued voice call's deadline
+    results = await asyncio.gather(
+        service._generate("User Query: question 0", channel="web"),
+        *[service._generate(f"User Query: question {i}", channel="voice") for i in range(1, 8)],
+        return_exceptions=True
+    )
+    
+    assert isinstance(results[0], str)
+    assert all(isinstance(result, SchedulerOverloadedError) for result in results[1:])
+    assert service.circuit_breaker.get_stats()["failures"] == 0
+    assert not service.circuit_breaker.is_open
+
+@pytest.mark.asyncio
+async def test_cancelled_calls_are_not_counted_as_failures():
+    """Test that a call cancelled while holding a slot is counted apart from failed calls"""
+    service = AIService()
+    
+    async def hold_slot():
+        async with service._slot(0.0, "web"):
+            await asyncio.sleep(60)
+    
+    task = asyncio.create_task(hold_slot())
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    with pytest.raises(ValueError):
+        async with service._slot(0.0, "web"):
+            raise ValueError("bad payload")
+    
+    stats = service.get_stats()
+    assert (stats["cancelled"], stats["failed"], stats["in_flight"]) == (1, 1, 0)
+
+def test_prompt_registry_precompiles_templates(tmp_path):
+    """Test that domain prompts are compiled in and a broken reload keeps the old templates"""
+    prompts_file = tmp_path / "system_prompts.json"
+    prompts_file.write_text('{"system_prompts": {"health": {"en": "You are a healthcare assistant."}}}')
+    registry = PromptRegistry(path=prompts_file)
+    
+    prompt = registry.render("health", "en", "low", location="Patna, Bihar")
+    assert "You are a healthcare assistant." in prompt
+    assert "Patna, Bihar" in prompt
+    assert registry.get_stats()["max_tokens"] > 0
+    
+    templates = registry.get_stats()["templates"]
+    for code in ["xx", "yy", "zz"]:
+        assert registry.render(code, code, code) == registry.render("general", "en", "medium")
+    assert registry.get_stats()["templates"] == templates
+    
+    prompts_file.write_text('{"system_prompts": {}}')
+    assert not registry.reload()
+    assert "You are a healthcare assistant." in registry.render("health", "en", "low")
+
+@pytest.mark.asyncio
+async def test_local_provider_is_deterministic():
+    """Test that the local stand-in answers repeatably and injects configured errors"""
+    provider = LocalProvider(latency_ms=0, error_rate=0, timeout_rate=0)
+    prompt = "User Query: How do I apply for PM-KISAN scheme?"
+    
+    first = await provider.generate(prompt, task="understand")
+    assert first.text == (await provider.generate(prompt, task="understand")).text
+    assert "response_text" in first.text
+    assert first.prompt_tokens > 0
+    
+    failing = LocalProvider(latency_ms=0, error_rate=1.0, timeout_rate=0)
+    with pytest.raises(LLMProviderError):
+        await failing.generate(prompt)
+
+def test_model_router_budgets_by_channel():
+    """Test that short channels get smaller output budgets than the web"""
+    sms_route = model_router.route("response", "sms")
+    web_route = model_router.route("response", "web")
+    
+    assert sms_route["max_output_tokens"] < web_route["max_output_tokens"]
+    assert sms_route["instructions"]
+    assert model_router.route("intent", "sms")["json"] is True
+
+def test_llm_output_parser_repairs_payloads():
+    """Test that fenced, truncated and sloppy JSON is repaired and validated"""
+    parser = LLMOutputParser()
+    
+    intent = parser.parse(
+        'Sure! ```json\n{"intent": "apply_scheme", "domain": "Agriculture", "urgency": "HIGH", '
+        '"confidence": "0.9", "entities": {"crop": "wheat",},}\n``` Hope this helps.',
+        IntentPayload,
+        task="intent"
+    )
+    assert intent["domain"] == "agriculture"
+    assert intent["urgency"] == "high"
+    assert intent["confidence"] == 0.9
+    
+    plan = parser.parse(
+        '{"summary": "Apply for PM-KISAN", "immediate_actions": "Visit CSC", '
+        '"steps": ["Carry Aadhaar", {"action": "Fill the form"}], "documents_required": ["Aadhaar", "Land rec',
+        ActionPlanPayload,
+        task="action_plan"
+    )
+    assert plan["immediate_actions"] == ["Visit CSC"]
+    assert [step["step_number"] for step in plan["steps"]] == [1, 2]
+    assert plan["documents_required"] == ["Aadhaar", "Land rec"]
+    
+    with pytest.raises(LLMOutputError):
+        parser.parse("I cannot answer that.", IntentPayload, task="intent")
+    
+    # A broken outer object must fail, not fall back to an object nested inside it
+    with pytest.raises(LLMOutputError):
+        parser.parse(
+            '{"domain": "healthcare", "entities": {"scheme": "pmjay"}, "confidence": 0.9 oops}',
+            IntentPayload,
+            task="intent"
+        )
+    
+    stats = parser.get_stats()
+    assert stats["intent"]["repaired"] == 1
+    assert stats["intent"]["failed"] == 2
+    assert stats["action_plan"]["repairs"]["closed_truncated"] == 1
+
+@pytest.mark.asyncio
+async def test_batch_processor_resumes(tmp_path):
+    """Test that a batch writes finished rows and skips them when rerun"""
+    rows = parse_batch(
+        "id,question,language\n"
+        "a1,How do I apply for PM-KISAN scheme?,en\n"
+        "a2,What documents do I need for a crop loan?,en\n"
+    )
+    assert [row["id"] for row in rows] == ["a1", "a2"]
+    
+    results_path = tmp_path / "results.ndjson"
+    first = [result async for result in batch_processor.run(rows[:1], results_path)]
+    assert first[0]["status"] == "ok"
+    assert first[0]["response_text"]
+    
+    second = [result async for result in batch_processor.run(rows, results_path)]
+    assert second[0]["id"] == "a1" and second[0]["resumed"]
+    assert second[1]["id"] == "a2" and not second[1].get("resumed")
+    assert len(results_path.read_text().splitlines()) == 2
+
+@pytest.mark.asyncio
+async def test_batch_does_not_keep_degraded_answers(tmp_path):
+    """Test that rows answered during an outage are returned but retried on resume"""
+    rows = parse_batch('{"id": "d1", "message": "Is there income support money for small farmer families?"}\n')
+    results_path = tmp_path / "results.ndjson"
+    breaker = ai_service.circuit_breaker
+    ai_service.circuit_breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    ai_service.circuit_breaker.record_failure()
+    try:
+        results = [result async for result in batch_processor.run(rows, results_path)]
+    finally:
+        ai_service.circuit_breaker = breaker
+    
+    assert results[0]["status"] == "degraded"
+    assert results[0]["response_text"]
+    assert results_path.read_text() == ""
+
+def test_batch_rows_queue_behind_live_traffic():
+    """Test that a row cannot pick its channel and batch calls are queued after live ones"""
+    rows = parse_batch('{"id": "v1", "message": "Help with PM-KISAN", "channel": "voice"}\n')
+    assert "channel" not in rows[0]
+    
+    live = ai_service._priority(100.0, "response", "medium", "web")
+    urgent_batch = ai_service._priority(0.0, "response", "high", "batch")
+    assert urgent_batch > live
+
+def test_prompt_token_budget():
+    """Test that no prompt template grew past data/prompts/token_baseline.json"""
+    assert check_prompt_budgets() == []
+
+@pytest.mark.asyncio
+async def test_refine_action_plan_patches_existing_plan():
+    """Test that a follow-up patches the current plan and bumps its version"""
+    current_plan = {
+        "summary": "Apply for PM-KISAN",
+        "steps": [
+            {"step_number": 1, "action": "Register on the portal", "details": ""},
+            {"step_number": 2, "action": "Link bank account", "details": ""}
+        ],
+        "documents_required": ["Aadhaar Card", "Ration Card"],
+        "eligibility": {"criteria": [], "status": "check_needed"},
+        "domain": "agriculture",
+        "version": 1
+    }
+    
+    patched = action_planner.apply_plan_patch(current_plan, {
+        "remove_steps": [1],
+        "add_steps": [{"step_number": 1, "action": "Visit the CSC", "details": ""}],
+        "remove_documents": ["ration card"]
+    })
+    assert [step["action"] for step in patched["steps"]] == ["Link bank account", "Visit the CSC"]
+    assert [step["step_number"] for step in patched["steps"]] == [1, 2]
+    assert patched["documents_required"] == ["Aadhaar Card"]
+    assert patched["version"] == 2
+    
+    refined = await action_planner.refine_action_plan(
+        user_query="I have Aadhaar but no ration card",
+        current_plan=current_plan,
+        user_context={"literacy_level": "medium", "channel": "web"},
+        language="en"
+    )
+    assert refined["version"] == 2
+    assert len(refined["steps"]) == 3
+    assert refined["changes"]
+
+@pytest.mark.asyncio
+async def test_scheme_library_serves_known_schemes():
+    """Test that a query naming a known scheme gets its precomputed plan"""
+    assert scheme_library.match_scheme("how to get ayushman card") == "pmjay"
+    assert scheme_library.match_scheme("I need a crop loan") is None
+    
+    plan = await action_planner.create_action_plan(
+        user_query="How do I apply for PM-KISAN scheme?",
+        domain="agriculture",
+        user_context={"literacy_level": "low", "location": "Patna, Bihar"},
+        language="en"
+    )
+    assert plan["source"] == "scheme_library"
+    assert plan["scheme_id"] == "pmkisan"
+    assert plan["domain"] == "agriculture"
+    assert plan["documents_required"]
+    
+    # Another domain or an unbuilt language falls back to generation
+    assert action_planner.library_plan("PM-KISAN", "health", {}, "en") is None
+    assert action_planner.library_plan("PM-KISAN", None, {}, "ta") is None
+
+@pytest.mark.asyncio
+async def test_faq_answers_close_matches_without_llm():
+    """Test that near-duplicate questions are answered from the FAQ store"""
+    match = faq_service.match("how to apply for pm kisan", "en", "low")
+    assert match["scheme_id"] == "pmkisan"
+    assert match["literacy_level"] == "low"
+    
+    # Same template, but a scheme the store does not know
+    assert faq_service.match("How do I apply for PMSBY?", "en") is None
+    assert faq_service.match("I have a fever since three days", "en") is None
+    
+    result = await message_pipeline.run(
+        user_message="How can I apply for PM-KISAN?",
+        user_context={"literacy_level": "medium", "channel": "web"},
+        language="en",
+        literacy_level="medium"
+    )
+    assert result["intent"]["source"] == "faq"
+    assert "PM-KISAN" in result["response_text"]
+    assert result["action_plan"]["scheme_id"] == "pmkisan"
+    
+    pairs = [("How do I open a bank account?", "Visit a branch", "en", "low", "finance")] * 3
+    pairs.append(("how do i open bank account", "Visit a branch with Aadhaar", "en", "low", "finance"))
+    pairs.append(("Rare question about tractors", "Ask the dealer", "en", "low", "agriculture"))
+    entries = entries_from_traffic(pairs, min_count=3)
+    assert len(entries) == 1
+    assert entries[0]["count"] == 4
+    assert entries[0]["answer"] == "Visit a branch with Aadhaar"
+
+@pytest.mark.asyncio
+async def test_degraded_mode_answers_while_llm_is_down():
+    """Test that messages are answered from the knowledge base while the circuit is open"""
+    remembered = {"intent": {"domain": "general"}, "response_text": "Call 1800-180-1551", "action_plan": None}
+    await degraded_mode.remember("Kisan call centre number?", "en", "medium", remembered, location="Patna, Bihar")
+    response_cache.clear()
+    
+    breaker = ai_service.circuit_breaker
+    ai_service.circuit_breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    ai_service.circuit_breaker.record_failure()
+    try:
+        assert degraded_mode.mode == "degraded"
+        
+        # Remembered answers survive the response cache and stay with their location
+        answer = await degraded_mode.answer("Kisan call centre number?", "en", "medium", location="Patna, Bihar")
+        assert answer["source"] == "cache"
+        other = await degraded_mode.answer("Kisan call centre number?", "en", "medium", location="Pune, Maharashtra")
+        assert other is None or other["source"] != "cache"
+        
+        result = await message_pipeline.run(
+            user_message="Is there income support money for small farmer families?",
+            user_context={"literacy_level": "medium", "channel": "sms"},
+            language="en",
+            literacy_level="medium"
+        )
+        assert result["success"] is True
+        assert result["degraded"] == "knowledge_base"
+        assert result["intent"]["domain"] == "agriculture"
+        assert result["action_plan"]["scheme_id"] == "pmkisan"
+        
+        # Nothing to serve: the usual failure reply
+        result = await message_pipeline.run(
+            user_message="Can you write me a poem?",
+            user_context={"literacy_level": "medium", "channel": "sms"},
+            language="en",
+            literacy_level="medium"
+        )
+        assert result["success"] is False
+        assert "degraded" not in result
+    finally:
+        ai_service.circuit_breaker = breaker
+    
+    assert degraded_mode.mode == "normal"
+
+def test_knowledge_retrieval_indexes_schemes_and_rows():
+    """Test BM25 retrieval over schemes.json and incremental knowledge_base row updates"""
+    passages = knowledge_retriever.search("How do I apply for PM-KISAN scheme?")
+    assert passages[0]["id"] == "kb:pmkisan:apply"
+    
+    row = SimpleNamespace(
+        id=9001, domain="education", category="scholarship", title="Post-matric scholarship",
+        content={"en": "Scholarship for SC/ST students in class 11 and above"}, keywords="scholarship college", language="en"
+    )
+    knowledge_retriever.upsert_row(row)
+    assert knowledge_retriever.search("scholarship for college")[0]["id"] == "db:9001:en"
+    
+    row.content = {"en": "Merit scholarship for girls"}
+    knowledge_retriever.upsert_row(row)
+    assert "girls" in knowledge_retriever.search("scholarship for college")[0]["text"]
+    
+    knowledge_retriever.remove_row(9001)
+    assert not any(passage["id"].startswith("db:9001") for passage in knowledge_retriever.search("scholarship"))
+    
+    prompt = ai_service._response_prompt("What documents for PM-KISAN?", {}, "en", "medium")
+    assert "Land ownership documents" in prompt
+
+def test_knowledge_retrieval_applies_rows_on_commit():
+    """Test watched knowledge_base rows are indexed on commit and rolled-back rows never are"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    retriever = KnowledgeRetriever()
+    retriever.watch_database()
+    
+    row = KnowledgeBase(domain=Domain.EDUCATION, title="Post-matric scholarship", keywords="scholarship college",
+                        content={"en": "Scholarship for SC/ST students in class 11 and above"}, language="en")
+    db.add(row)
+    db.flush()
+    assert not any(passage["id"].startswith("db:") for passage in retriever.search("post-matric scholarship college"))
+    db.commit()
+    assert retriever.search("post-matric scholarship college")[0]["id"] == f"db:{row.id}:en"
+    
+    db.add(KnowledgeBase(domain=Domain.HEALTH, title="Dialysis support", content={"en": "Free dialysis"}, language="en"))
+    db.flush()
+    db.rollback()
+    assert not any(passage["id"].startswith("db:") for passage in retriever.search("free dialysis"))
+    
+    db.delete(db.get(KnowledgeBase, row.id))
+    db.commit()
+    assert not any(passage["id"].startswith("db:") for passage in retriever.search("post-matric scholarship"))
+    db.close()
+
+def test_vector_index_matches_indic_queries(tmp_path):
+    """Test the memory-mapped dense index finds English passages for Hindi queries"""
+    index = VectorIndex(tmp_path)
+    assert index.ensure_built(with_database=False)
+    assert not index.ensure_built(with_database=False)
+    
+    passages = index.search("आयुष्मान कार्ड कैसे बनेगा", limit=3)
+    assert passages and all(passage["id"].startswith("kb:pmjay") for passage in passages)
+    assert index.search("किसान सम्मान निधि")[0]["id"].startswith("kb:pmkisan")
+    assert isinstance(index._matrix, np.memmap)
+
+def test_knowledge_catalog_ingests_and_searches():
+    """Test catalog upserts skip unchanged records and rows are found through FTS5"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    _create_knowledge_fts(engine)
+    db = sessionmaker(bind=engine)()
+    
+    records = [
+        {"id": f"widow-{state}", "name": f"{state} Widow Pension", "domain": "finance", "state": state,
+         "description": {"en": f"Monthly pension for widows in {state}", "hi": "विधवा पेंशन"}}
+        for state in ["Rajasthan", "Bihar"]
+    ]
+    counts = knowledge_catalog.ingest(records + [{"name": "No id"}], batch_size=1, db=db)
+    assert counts == {"inserted": 2, "updated": 0, "unchanged": 0, "invalid": 1}
+    
+    records[1]["description"]["en"] = "Monthly pension of Rs 1000 for widows in Bihar"
+    counts = knowledge_catalog.ingest(records, db=db)
+    assert counts == {"inserted": 0, "updated": 1, "unchanged": 1, "invalid": 0}
+    
+    results = knowledge_catalog.search("widow pension rajasthan", db=db)
+    assert [result["external_id"] for result in results] == ["widow-Rajasthan", "widow-Bihar"]
+    assert "Rs 1000" in knowledge_catalog.search("bihar", db=db)[0]["text"]
+    assert len(knowledge_catalog.search("विधवा", domain="finance", db=db)) == 2
+    assert knowledge_catalog.search("widow", domain="health", db=db) == []
+    
+    passage = knowledge_retriever.search("Bihar widow pension Rs 1000")[0]
+    assert passage["id"].startswith("db:") and "Rs 1000" in passage["text"]
+    for row in db.query(KnowledgeBase):
+        knowledge_retriever.remove_row(row.id)
+    db.close()
+
+def test_catalog_index_added_to_existing_databases():
+    """Test an existing knowledge_base table gets the unique external_id index"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE knowledge_base (id INTEGER PRIMARY KEY, title VARCHAR, external_id VARCHAR)"))
+    _create_catalog_index(engine)
+    _create_catalog_index(engine)
+    
+    indexes = inspect(engine).get_indexes("knowledge_base")
+    assert [(index["name"], bool(index["unique"])) for index in indexes] == [("ix_knowledge_base_external_id", True)]
+
+@pytest.mark.asyncio
+async def test_eligibility_rules_check_all_schemes():
+    """Test compiled eligibility rules sort schemes without the LLM"""
+    rules, _ = compile_rules({"id": "pmjjby", "eligibility": {"criteria": ["Age: 18-50 years", "Must have savings bank account"]}})
+    assert rules == {"age": [18, 50], "has_bank_account": True}
+    
+    result = eligibility_engine.eligible_schemes({"age": 30, "has_bank_account": True})
+    assert [scheme["scheme_id"] for scheme in result["eligible"]] == ["pmjjby"]
+    assert {scheme["scheme_id"] for scheme in result["maybe"]} == {"pmjay", "pmkisan"}
+    assert "owns_land" in result["questions"]
+    
+    calls = ai_service.provider.calls
+    check = await action_planner.get_eligibility_check("PMJJBY insurance", {"age": 60}, explain=False)
+    assert check["status"] == "ineligible"
+    assert check["unmet"] == ["Age: 18-50 years"]
+    assert ai_service.provider.calls == calls
+
+@pytest.mark.asyncio
+async def test_phone_blind_index_merges_duplicate_users():
+    """Test users are found by phone hash and earlier duplicates are merged"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    
+    # Rows as the old lookup left them: one user per message, no hash
+    for phone in ["+919876543210", "+91 98765-43210", "whatsapp:+919876543210", "+911234567890"]:
+        user = User(phone_number_encrypted=encryption_service.encrypt(phone))
+        db.add(user)
+        db.flush()
+        conversation = Conversation(user_id=user.id, channel=Channel.SMS)
+        db.add(conversation)
+        db.flush()
+        db.add(Message(conversation_id=conversation.id, role=MessageRole.USER, content_encrypted=encryption_service.encrypt("hi")))
+    db.commit()
+    db.close()
+    
+    _backfill_phone_hashes(engine)
+    db = sessionmaker(bind=engine)()
+    assert db.query(User).count() == 2
+    assert db.query(DataMigration).count() == 1
+    
+    # Later start-ups skip the backfill
+    db.add(User(phone_number_encrypted=encryption_service.encrypt("+919876543210")))
+    db.commit()
+    _backfill_phone_hashes(engine)
+    assert db.query(User).count() == 3
+    db.delete(db.query(User).filter(User.phone_number_hash.is_(None)).one())
+    db.commit()
+    keeper = await get_or_create_user(db, "+91 98765 43210", "hi", "sms")
+    assert keeper.id == 1
+    conversations = db.query(Conversation).filter(Conversation.user_id == keeper.id).all()
+    assert len(conversations) == 1
+    assert db.query(Message).filter(Message.conversation_id == conversations[0].id).count() == 3
+    
+    user = await get_or_create_user(db, "+15550001111", "en", "sms")
+    assert (await get_or_create_user(db, "+1 555 000 1111", "en", "sms")).id == user.id
+    assert db.query(User).count() == 3
+    db.close()
+
+@pytest.mark.asyncio
+async def test_conversation_summary_folds_each_turn(monkeypatch):
+    """Test that every finished turn is folded into the encrypted rolling summary"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(conversation_memory_module, "SessionLocal", sessionmaker(bind=engine))
+    db = sessionmaker(bind=engine)()
+    conversation = Conversation(user_id=1, channel=Channel.WEB)
+    db.add(conversation)
+    db.commit()
+    memory = conversation_memory_module.ConversationMemory()
+    
+    await memory.update_summary(conversation.id, "How do I apply for PM-KISAN?", "Visit your CSC.")
+    await memory.update_summary(conversation.id, "Which documents do I need?", "Aadhaar and land records.")
+    
+    db.refresh(conversation)
+    summary = memory.get_summary(conversation)
+    assert "PM-KISAN" in summary and "documents" in summary
+    assert "PM-KISAN" not in conversation.summary_encrypted
+    assert conversation.summary_turns == 2 and conversation.summary_updated_at
+    assert memory.get_stats()["updated"] == 2
+    
+    db.add(ActionPlan(conversation_id=conversation.id, domain=Domain.AGRICULTURE,
+                      steps=[{"action": "Visit the CSC"}], documents_required=["Aadhaar card"]))
+    db.commit()
+    card = await memory.get_summary_card(db, conversation)
+    assert card["next_steps"] == ["Visit the CSC"]
+    assert card["action_items"] == ["Keep ready: Aadhaar card"]
+    db.close()
+
 def test_action_plan_formatting_sms():
     """Test formatting action plan for SMS"""
     sample_plan = {